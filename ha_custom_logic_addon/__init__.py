@@ -2,7 +2,8 @@
 
 Registers a wildcard sentence trigger on the Conversation default agent and
 forwards every recognized sentence to an external HTTP endpoint, returning the
-endpoint's response as the assistant reply.
+endpoint's response as the assistant reply. In the "conversation_agent" mode
+it instead sets up a conversation agent entity that streams the reply.
 """
 
 from __future__ import annotations
@@ -10,13 +11,26 @@ from __future__ import annotations
 import logging
 
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
 
-from .const import CONF_ENDPOINT_URL, DEFAULT_ENDPOINT_URL
+from .const import (
+    CONF_ENDPOINT_URL,
+    CONF_MODE,
+    DEFAULT_ENDPOINT_URL,
+    DEFAULT_MODE,
+    MODE_CONVERSATION_AGENT,
+)
 from .sentence import async_register_wildcard_trigger
 
 _LOGGER = logging.getLogger(__name__)
 
+PLATFORMS = [Platform.CONVERSATION]
+
+
+def _mode(entry: ConfigEntry) -> str:
+    return entry.options.get(CONF_MODE, entry.data.get(CONF_MODE, DEFAULT_MODE))
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up HA Custom Logic from a config entry."""
@@ -25,9 +39,13 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         entry.data.get(CONF_ENDPOINT_URL, DEFAULT_ENDPOINT_URL),
     )
 
-    # The remover returned by the trigger registration is kept on the entry so
-    # async_unload_entry can detach the trigger cleanly.
-    entry.runtime_data = async_register_wildcard_trigger(hass, endpoint_url)
+    if _mode(entry) == MODE_CONVERSATION_AGENT:
+        entry.runtime_data = None
+        await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    else:
+        # The remover returned by the trigger registration is kept on the entry
+        # so async_unload_entry can detach the trigger cleanly.
+        entry.runtime_data = async_register_wildcard_trigger(hass, endpoint_url)
 
     # Reload the entry (re-registering the trigger with the new URL) whenever the
     # user changes the options.
@@ -37,10 +55,12 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    """Unload a config entry and remove the registered trigger."""
+    """Unload a config entry and remove the registered trigger or entity."""
     remove_trigger = entry.runtime_data
-    if remove_trigger is not None:
-        remove_trigger()
+    if remove_trigger is None:
+        # Agent mode (decided at setup; the options may have changed since).
+        return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    remove_trigger()
     return True
 
 
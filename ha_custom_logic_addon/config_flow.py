@@ -14,7 +14,17 @@ from homeassistant.config_entries import (
 )
 from homeassistant.core import callback
 
-from .const import CONF_ENDPOINT_URL, DEFAULT_ENDPOINT_URL, DOMAIN
+from .const import (
+    CONF_ENDPOINT_URL,
+    CONF_MODE,
+    DEFAULT_ENDPOINT_URL,
+    DEFAULT_MODE,
+    DOMAIN,
+    MODE_CONVERSATION_AGENT,
+    MODE_SENTENCE_TRIGGER,
+)
+
+_MODES = [MODE_SENTENCE_TRIGGER, MODE_CONVERSATION_AGENT]
 
 
 class HaCustomLogicConfigFlow(ConfigFlow, domain=DOMAIN):
@@ -29,11 +39,17 @@ class HaCustomLogicConfigFlow(ConfigFlow, domain=DOMAIN):
         if user_input is not None:
             return self.async_create_entry(
                 title="HA Custom Logic",
-                data={CONF_ENDPOINT_URL: user_input[CONF_ENDPOINT_URL]},
+                data={
+                    CONF_ENDPOINT_URL: user_input[CONF_ENDPOINT_URL],
+                    CONF_MODE: user_input[CONF_MODE],
+                },
             )
 
         schema = vol.Schema(
-            {vol.Required(CONF_ENDPOINT_URL, default=DEFAULT_ENDPOINT_URL): str}
+            {
+                vol.Required(CONF_ENDPOINT_URL, default=DEFAULT_ENDPOINT_URL): str,
+                vol.Required(CONF_MODE, default=DEFAULT_MODE): vol.In(_MODES),
+            }
         )
         return self.async_show_form(step_id="user", data_schema=schema)
 
@@ -47,7 +63,7 @@ class HaCustomLogicConfigFlow(ConfigFlow, domain=DOMAIN):
 
 
 class HaCustomLogicOptionsFlow(OptionsFlow):
-    """Handle updating the endpoint URL after the integration is set up."""
+    """Handle updating the endpoint URL and mode after the integration is set up."""
 
     async def async_step_init(
         self, user_input: dict[str, Any] | None = None
@@ -60,7 +76,13 @@ class HaCustomLogicOptionsFlow(OptionsFlow):
             CONF_ENDPOINT_URL,
             self.config_entry.data.get(CONF_ENDPOINT_URL, DEFAULT_ENDPOINT_URL),
         )
+        current_mode = self.config_entry.options.get(
+            CONF_MODE, self.config_entry.data.get(CONF_MODE, DEFAULT_MODE)
+        )
         schema = vol.Schema(
-            {vol.Required(CONF_ENDPOINT_URL, default=current): str}
+            {
+                vol.Required(CONF_ENDPOINT_URL, default=current): str,
+                vol.Required(CONF_MODE, default=current_mode): vol.In(_MODES),
+            }
         )
         return self.async_show_form(step_id="init", data_schema=schema)
@@ -5,8 +5,24 @@ DOMAIN = "ha_custom_logic_addon"
 CONF_ENDPOINT_URL = "endpoint_url"
 DEFAULT_ENDPOINT_URL = "http://ha_voice_logic:8081"
 
+# How the integration plugs into Assist: a wildcard sentence trigger on the
+# default agent (complete replies), or its own conversation agent entity that
+# streams the reply into the chat log so TTS can start on the first sentence.
+CONF_MODE = "mode"
+MODE_SENTENCE_TRIGGER = "sentence_trigger"
+MODE_CONVERSATION_AGENT = "conversation_agent"
+DEFAULT_MODE = MODE_SENTENCE_TRIGGER
+
+# Path appended to the endpoint URL for streamed (chunked) replies.
+STREAM_PATH = "/stream"
+
 # Timeout (seconds) for a single forwarded request to the external endpoint.
 DEFAULT_TIMEOUT = 30
 
+# Header telling the endpoint how long (ms) we are still willing to wait, so it
+# can bound its upstream calls and drop work nobody will hear.
+DEADLINE_HEADER = "X-Timeout-Ms"
+
 # Value reported to the endpoint so it can tell where the sentence came from.
 REQUEST_SOURCE = "homeassistant.default_agent"
+AGENT_REQUEST_SOURCE = "homeassistant.conversation_agent"
@@ -0,0 +1,119 @@
+"""Conversation agent entity that streams the endpoint's reply into Assist.
+
+Used in the "conversation_agent" mode instead of the wildcard sentence
+trigger. The reply is read from the endpoint's chunked ``/stream`` route and
+fed into the chat log as it arrives, so the pipeline can start TTS on the
+first sentence while the rest is still being generated.
+"""
+
+from __future__ import annotations
+
+from collections.abc import AsyncGenerator
+import codecs
+import logging
+from typing import Any
+
+import aiohttp
+
+from homeassistant.components import conversation
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import MATCH_ALL
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .const import (
+    AGENT_REQUEST_SOURCE,
+    CONF_ENDPOINT_URL,
+    DEADLINE_HEADER,
+    DEFAULT_ENDPOINT_URL,
+    DEFAULT_TIMEOUT,
+    STREAM_PATH,
+)
+from .sentence import ERROR_NETWORK, ERROR_TIMEOUT, ERROR_UNAVAILABLE, build_payload
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up the conversation agent entity."""
+    endpoint_url = entry.options.get(
+        CONF_ENDPOINT_URL,
+        entry.data.get(CONF_ENDPOINT_URL, DEFAULT_ENDPOINT_URL),
+    )
+    async_add_entities([HaCustomLogicConversationEntity(entry, endpoint_url)])
+
+
+class HaCustomLogicConversationEntity(conversation.ConversationEntity):
+    """Conversation agent backed by the external endpoint's streamed replies."""
+
+    _attr_has_entity_name = True
+    _attr_name = None
+    _attr_supports_streaming = True
+
+    def __init__(self, entry: ConfigEntry, endpoint_url: str) -> None:
+        """Initialize the agent."""
+        self._attr_unique_id = entry.entry_id
+        self._stream_url = endpoint_url.rstrip("/") + STREAM_PATH
+
+    @property
+    def supported_languages(self) -> list[str] | str:
+        """The endpoint decides what it understands."""
+        return MATCH_ALL
+
+    async def _async_handle_message(
+        self,
+        user_input: conversation.ConversationInput,
+        chat_log: conversation.ChatLog,
+    ) -> conversation.ConversationResult:
+        """Stream the endpoint's reply into the chat log."""
+        async for _content in chat_log.async_add_delta_content_stream(
+            self.entity_id, self._stream_reply(user_input)
+        ):
+            pass
+        return conversation.async_get_result_from_chat_log(user_input, chat_log)
+
+    async def _stream_reply(
+        self, user_input: conversation.ConversationInput
+    ) -> AsyncGenerator[dict[str, Any]]:
+        """Yield chat-log deltas: the assistant role, then text as it arrives."""
+        yield {"role": "assistant"}
+
+        session = async_get_clientsession(self.hass)
+        # Chunks may split a multi-byte UTF-8 character.
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            async with session.post(
+                self._stream_url,
+                json=build_payload(user_input, AGENT_REQUEST_SOURCE),
+                headers={DEADLINE_HEADER: str(DEFAULT_TIMEOUT * 1000)},
+                timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT),
+            ) as response:
+                if response.status != 200:
+                    _LOGGER.error(
+                        "Endpoint %s returned HTTP %s: %s",
+                        self._stream_url,
+                        response.status,
+                        await response.text(),
+                    )
+                    yield {"content": ERROR_UNAVAILABLE}
+                    return
+                async for chunk in response.content.iter_any():
+                    text = decoder.decode(chunk)
+                    if text:
+                        yield {"content": text}
+                text = decoder.decode(b"", final=True)
+                if text:
+                    yield {"content": text}
+        except TimeoutError:
+            _LOGGER.error(
+                "Timed out after %ss waiting for %s", DEFAULT_TIMEOUT, self._stream_url
+            )
+            yield {"content": ERROR_TIMEOUT}
+        except aiohttp.ClientError as err:
+            _LOGGER.error("Network error contacting %s: %s", self._stream_url, err)
+            yield {"content": ERROR_NETWORK}
@@ -12,7 +12,7 @@ from homeassistant.components.conversation import ConversationInput
 from homeassistant.core import CALLBACK_TYPE, HomeAssistant
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
-from .const import DEFAULT_TIMEOUT, REQUEST_SOURCE
+from .const import DEADLINE_HEADER, DEFAULT_TIMEOUT, REQUEST_SOURCE
 
 if TYPE_CHECKING:
     from hassil.recognize import RecognizeResult
@@ -28,6 +28,11 @@ SentenceTriggerCallback = Callable[
 # Wildcard template that matches any sentence and captures the whole utterance.
 _WILDCARD_SENTENCES = ["{question}"]
 
+# Replies spoken when the endpoint cannot be reached.
+ERROR_UNAVAILABLE = "Ошибка: внешний сервис недоступен"
+ERROR_TIMEOUT = "Ошибка: превышено время ожидания ответа LLM-прокси"
+ERROR_NETWORK = "Ошибка: сбой сети при обращении к LLM-прокси"
+
 
 def async_register_wildcard_trigger(
     hass: HomeAssistant, endpoint_url: str
@@ -86,21 +91,26 @@ def _register_trigger(
     return lambda: None
 
 
+def build_payload(user_input: ConversationInput, source: str) -> dict[str, Any]:
+    """Build the JSON body the endpoint expects for a conversation input."""
+    payload: dict[str, Any] = {"request": {"text": user_input.text, "source": source}}
+    if user_input.device_id is not None:
+        payload["device"] = {"id": user_input.device_id}
+    return payload
+
+
 async def _forward_sentence(
     hass: HomeAssistant, endpoint_url: str, user_input: ConversationInput
 ) -> str:
     """Forward a recognized sentence to the endpoint and return its text reply."""
-    payload: dict[str, Any] = {
-        "request": {"text": user_input.text, "source": REQUEST_SOURCE}
-    }
-    if user_input.device_id is not None:
-        payload["device"] = {"id": user_input.device_id}
+    payload = build_payload(user_input, REQUEST_SOURCE)
 
     session = async_get_clientsession(hass)
     try:
         async with session.post(
             endpoint_url,
             json=payload,
+            headers={DEADLINE_HEADER: str(DEFAULT_TIMEOUT * 1000)},
             timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT),
         ) as response:
             body = await response.text()
@@ -111,13 +121,13 @@ async def _forward_sentence(
                     response.status,
                     body,
                 )
-                return "Ошибка: внешний сервис недоступен"
+                return ERROR_UNAVAILABLE
             return body
     except TimeoutError:
         _LOGGER.error(
             "Timed out after %ss waiting for %s", DEFAULT_TIMEOUT, endpoint_url
         )
-        return "Ошибка: превышено время ожидания ответа LLM-прокси"
+        return ERROR_TIMEOUT
     except aiohttp.ClientError as err:
         _LOGGER.error("Network error contacting %s: %s", endpoint_url, err)
-        return "Ошибка: сбой сети при обращении к LLM-прокси"
+        return ERROR_NETWORK
@@ -0,0 +1,23 @@
+"""PCM to WAV wrapping, kept free of Home Assistant imports so it can be
+benchmarked and tested on its own."""
+
+from __future__ import annotations
+
+import io
+import wave
+
+# Fixed PCM/WAV parameters matching the STT entity's supported_* properties.
+CHANNELS = 1  # mono
+SAMPLE_WIDTH_BYTES = 2  # 16-bit samples
+SAMPLE_RATE = 16000  # Hz
+
+
+def pcm_to_wav(pcm: bytes) -> bytes:
+    """Wrap raw 16-bit / 16 kHz mono PCM into an in-memory WAV container."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(CHANNELS)
+        wav_file.setsampwidth(SAMPLE_WIDTH_BYTES)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
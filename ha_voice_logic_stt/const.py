@@ -6,3 +6,7 @@ CONF_BASE_URL = "base_url"
 # Base URL of the ha-voice-logic relay, including the OpenAI-style /v1 prefix.
 # The transcription endpoint is "{base_url}/audio/transcriptions".
 DEFAULT_BASE_URL = "http://ha_voice_logic:8081/v1"
+
+# Header telling the relay how long (ms) we are still willing to wait, so it
+# can bound its upstream calls and give up together with us.
+DEADLINE_HEADER = "X-Timeout-Ms"
@@ -3,9 +3,7 @@
 from __future__ import annotations
 
 from collections.abc import AsyncIterable
-import io
 import logging
-import wave
 
 import aiohttp
 
@@ -25,7 +23,8 @@ from homeassistant.core import HomeAssistant
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
 
-from .const import CONF_BASE_URL, DEFAULT_BASE_URL
+from .audio import pcm_to_wav
+from .const import CONF_BASE_URL, DEADLINE_HEADER, DEFAULT_BASE_URL
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -33,13 +32,9 @@ _LOGGER = logging.getLogger(__name__)
 # advertises Russian. Extend this list if the backend gains more languages.
 SUPPORTED_LANGUAGES = ["ru"]
 
-# Fixed PCM/WAV parameters matching the supported_* properties below.
-_CHANNELS = 1  # mono
-_SAMPLE_WIDTH_BYTES = 2  # 16-bit samples
-_SAMPLE_RATE = 16000  # Hz
-
 # Timeout for a single transcription request to the relay.
-_TIMEOUT = aiohttp.ClientTimeout(total=60)
+_TIMEOUT_SECONDS = 60
+_TIMEOUT = aiohttp.ClientTimeout(total=_TIMEOUT_SECONDS)
 
 
 async def async_setup_entry(
@@ -102,7 +97,7 @@ class HaVoiceLogicSttEntity(SpeechToTextEntity):
             async for chunk in stream:
                 audio.extend(chunk)
 
-            wav_bytes = self._pcm_to_wav(bytes(audio))
+            wav_bytes = pcm_to_wav(bytes(audio))
 
             # Reproduce the requests-style files=/data= multipart body. The relay
             # looks for the part named "file"; the "model" value is a placeholder
@@ -119,7 +114,10 @@ class HaVoiceLogicSttEntity(SpeechToTextEntity):
             session = async_get_clientsession(self.hass)
             url = f"{self._base_url}/audio/transcriptions"
             async with session.post(
-                url, data=form, timeout=_TIMEOUT
+                url,
+                data=form,
+                headers={DEADLINE_HEADER: str(_TIMEOUT_SECONDS * 1000)},
+                timeout=_TIMEOUT,
             ) as response:
                 if response.status // 100 != 2:
                     _LOGGER.error(
@@ -135,14 +133,3 @@ class HaVoiceLogicSttEntity(SpeechToTextEntity):
         except Exception as err:  # noqa: BLE001 - any failure degrades to ERROR
             _LOGGER.error("STT processing failed: %s", err)
             return SpeechResult("", SpeechResultState.ERROR)
-
-    @staticmethod
-    def _pcm_to_wav(pcm: bytes) -> bytes:
-        """Wrap raw 16-bit / 16 kHz mono PCM into an in-memory WAV container."""
-        buffer = io.BytesIO()
-        with wave.open(buffer, "wb") as wav_file:
-            wav_file.setnchannels(_CHANNELS)
-            wav_file.setsampwidth(_SAMPLE_WIDTH_BYTES)
-            wav_file.setframerate(_SAMPLE_RATE)
-            wav_file.writeframes(pcm)
-        return buffer.getvalue()
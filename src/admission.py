@@ -0,0 +1,106 @@
+"""Admission control: bounded queues with concurrency limits per traffic lane.
+
+STT sits on the critical path of every voice turn, so it must not queue behind
+a burst of chat requests. Each lane (stt, chat, command) has its own
+concurrency limit, a bounded wait queue and a maximum wait. A request that
+finds the queue full, or waits too long, is refused immediately so the caller
+can send a well-formed degraded response instead of piling up.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from src.settings import settings
+from src.lazy import LazyObject
+from src import stats
+
+logger = logging.getLogger(__name__)
+
+
+class Lane:
+    """Concurrency limit plus bounded FIFO-ish wait queue."""
+
+    def __init__(self, name, max_concurrency, max_queue, max_wait):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+
+    def acquire(self, max_wait=None):
+        """Take a slot; return False if the queue is full or the wait runs out."""
+        max_wait = self.max_wait if max_wait is None else min(max_wait, self.max_wait)
+        with self._cond:
+            if self.active < self.max_concurrency and self.waiting == 0:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                logger.warning("Lane '%s' queue full (%d); request refused", self.name, self.waiting)
+                return False
+            self.waiting += 1
+            started = time.monotonic()
+            deadline = started + max_wait
+            try:
+                while self.active >= self.max_concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        logger.warning("Lane '%s' wait exceeded %.1fs; request refused", self.name, max_wait)
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            waited = time.monotonic() - started
+            self.active += 1
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_wait_seen = max(self.max_wait_seen, waited)
+            logger.info("Lane '%s' admitted after %.3fs in queue", self.name, waited)
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, max_wait=None):
+        """Context manager yielding True if admitted, False if refused."""
+        admitted = self.acquire(max_wait)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "active": self.active,
+                "queue_depth": self.waiting,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_seconds": round(self.total_wait / self.admitted, 4) if self.admitted else 0.0,
+                "max_wait_seconds": round(self.max_wait_seen, 4),
+            }
+
+
+stt_lane = LazyObject(lambda: Lane("stt", settings.stt_max_concurrency, settings.stt_max_queue, settings.queue_max_wait_seconds))
+chat_lane = LazyObject(lambda: Lane("chat", settings.chat_max_concurrency, settings.chat_max_queue, settings.queue_max_wait_seconds))
+command_lane = LazyObject(lambda: Lane("command", settings.command_max_concurrency, settings.command_max_queue, settings.queue_max_wait_seconds))
+
+stats.register("lanes", lambda: {lane.name: lane.snapshot() for lane in (stt_lane, chat_lane, command_lane)})
@@ -1,12 +1,25 @@
-"""Smart-home command extraction, parsing, and dispatch."""
+"""Smart-home command extraction, parsing, and dispatch.
+
+Dispatch goes through a pluggable transport (any object with a `name` and a
+`send(command_dict)` method) selected by settings.command_transport: HTTP POST to SMARTHOME_URL (default), MQTT publish,
+or an HA websocket call_service over a persistent connection. Commands with a
+time suffix ("room_light:off@+10m") go to the scheduler (src/scheduler.py)
+and are dispatched when due.
+"""
 
 import re
 import json
 import logging
-
-import requests  # type: ignore
+import threading
+from datetime import datetime
 
 from src.settings import settings
+from src.lazy import LazyObject
+from src.http_session import get_session
+from src.history import history, current_device
+from src.device_registry import device_registry
+from src.scheduler import CommandScheduler, CANCEL, split_schedule, parse_when
+from src import stats
 
 logger = logging.getLogger(__name__)
 
@@ -18,37 +31,192 @@ def extract_command_blocks(text):
     try:
         return re.findall(r"<command>(.*?)</command>", text, flags=re.DOTALL | re.IGNORECASE)
     except re.error as regex_error:
-        logger.error(f"Regex error in extract_command_blocks: {str(regex_error)}")
+        logger.error("Regex error in extract_command_blocks: %s", regex_error)
         return []
 
 
 def parse_command_payload(payload_text):
     """Parse a single command payload into a dictionary.
 
-    Supported formats: Simple pair: device_id:value (e.g., room_light:on or room_ac:22)
-    Fallback returns None if nothing matches.
+    Supported formats: device_id:value (e.g., room_light:on or room_ac:22) and
+    device_id:attr=value,... (e.g., room_light:brightness=70,color_temp=3000),
+    validated against the device registry when one is configured.
+    Returns None if the payload is malformed or rejected.
+    """
+    try:
+        return device_registry.parse(payload_text)
+    except ValueError as e:
+        logger.warning("Command rejected: %s", e)
+        return None
+
+
+class HttpTransport:
+    """HTTPS POST of {"command": ...} to SMARTHOME_URL (no SSL check) over the
+    shared session, so consecutive commands reuse one warm connection."""
+
+    name = "http"
+
+    def send(self, command_dict):
+        headers = { "Content-Type": "application/json" }
+        payload = { "command": command_dict }
+        get_session().post(settings.smarthome_url, headers=headers, json=payload, verify=False, timeout=5)
+
+
+class MqttTransport:
+    """Publishes {"command": ...} to an MQTT topic over a persistent connection.
+
+    paho-mqtt's network thread keeps the connection alive and reconnects
+    automatically; QoS 1 messages published while disconnected are queued.
     """
-    text = payload_text.strip()
 
-    # Try simple device:value format
-    simple_match = re.match(r"^([A-Za-z0-9_\-\.]+)\s*:\s*([A-Za-z0-9_\-\.]+)$", text)
-    if simple_match:
-        device_id, value = simple_match.group(1), simple_match.group(2)
-        return { "device_id": device_id, "value": value }
+    name = "mqtt"
+
+    def __init__(self, host, port, topic, username="", password="", client=None):
+        self.topic = topic
+        if client is None:
+            import paho.mqtt.client as mqtt  # type: ignore  # optional dependency
+
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id="ha-voice-logic")
+            if username:
+                client.username_pw_set(username, password or None)
+            client.reconnect_delay_set(min_delay=1, max_delay=30)
+            client.connect_async(host, port, keepalive=30)
+            client.loop_start()
+        self._client = client
+
+    def send(self, command_dict):
+        payload = json.dumps({ "command": command_dict }, ensure_ascii=False)
+        self._client.publish(self.topic, payload, qos=1)
+
+
+# Command attributes -> HA light.turn_on service data keys.
+HA_ATTRIBUTE_KEYS = { "brightness": "brightness_pct", "color_temp": "color_temp_kelvin" }
+# Cover states accepted by the device registry -> HA cover services.
+HA_COVER_SERVICES = { "open": "open_cover", "close": "close_cover", "stop": "stop_cover" }
 
+
+def ha_service_call(entity_id, value, attributes=None):
+    """Map a device value onto an HA service: (domain, service, service_data) or None."""
+    domain = entity_id.split(".", 1)[0]
+    value = str(value).strip().lower()
+    if attributes and domain == "light" and value != "off":
+        return "light", "turn_on", {
+            HA_ATTRIBUTE_KEYS.get(name, name): int(float(raw)) for name, raw in attributes.items()
+        }
+    if value in ("lock", "unlock"):
+        return "lock", value, {}
+    if value in HA_COVER_SERVICES:
+        return "cover", HA_COVER_SERVICES[value], {}
+    if value in ("on", "off"):
+        return "homeassistant", f"turn_{value}", {}
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    if domain == "climate":
+        return "climate", "set_temperature", { "temperature": number }
+    if domain == "light":
+        if number <= 0:
+            return "light", "turn_off", {}
+        return "light", "turn_on", { "brightness_pct": min(int(number), 100) }
+    if domain == "fan":
+        return "fan", "set_percentage", { "percentage": int(number) }
+    if domain == "cover":
+        return "cover", "set_cover_position", { "position": int(number) }
     return None
 
 
-def handle_command(command_dict):
-    """post to SMARTHOME_URL ignore ssl verification
+class HaWebSocketTransport:
+    """Calls HA services over the shared persistent websocket (call_service).
+
+    Prompt device IDs are resolved to entity IDs through the device registry
+    or the device-state cache ("room_light" -> "light.room_light"); full
+    entity IDs pass through.
     """
+
+    name = "ha_websocket"
+
+    def __init__(self, connection, states):
+        self._connection = connection
+        self._states = states
+
+    def send(self, command_dict):
+        if not command_dict:
+            logger.error("Command dropped: nothing to send over HA websocket")
+            return
+        device_id = command_dict["device_id"]
+        entity_id = (
+            device_registry.entity_id(device_id)
+            or self._states.entity_id(device_id)
+            or (device_id if "." in device_id else None)
+        )
+        if entity_id is None:
+            logger.error("Command dropped: unknown Home Assistant entity for '%s'", device_id)
+            return
+        service = ha_service_call(entity_id, command_dict.get("value"), command_dict.get("attributes"))
+        if service is None:
+            logger.error("Command dropped: no HA service for %s", json.dumps(command_dict, ensure_ascii=False))
+            return
+        domain, service_name, service_data = service
+        result = self._connection.call({
+            "type": "call_service",
+            "domain": domain,
+            "service": service_name,
+            "service_data": service_data,
+            "target": { "entity_id": entity_id },
+        })
+        if not result or not result.get("success"):
+            error = (result or {}).get("error", {}).get("message", "connection lost")
+            logger.error("HA call_service %s.%s for %s failed: %s", domain, service_name, entity_id, error)
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def create_transport(name):
+    """Build the transport selected by settings.command_transport."""
+    if name == MqttTransport.name:
+        return MqttTransport(
+            settings.mqtt_host,
+            settings.mqtt_port,
+            settings.mqtt_topic,
+            settings.mqtt_username,
+            settings.mqtt_password,
+        )
+    if name == HaWebSocketTransport.name:
+        from src.ha_websocket import get_ha_connection
+        from src.device_state import device_states
+
+        connection = get_ha_connection()
+        if connection is None:
+            raise ValueError("COMMAND_TRANSPORT=ha_websocket requires HA_URL and HA_TOKEN")
+        return HaWebSocketTransport(connection, device_states)
+    if name != HttpTransport.name:
+        raise ValueError(f"Unknown command transport: {name}")
+    return HttpTransport()
+
+
+def get_transport():
+    """Return the process-wide command transport, creating it on first use."""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = create_transport(settings.command_transport)
+                logger.info("Command transport: %s", _transport.name)
+    return _transport
+
+
+def handle_command(command_dict):
+    """Send one parsed command through the configured transport."""
     try:
-        headers = { "Content-Type": "application/json" }
-        payload = { "command": command_dict }
-        requests.post(settings.smarthome_url, headers=headers, json=payload, verify=False, timeout=5)
+        get_transport().send(command_dict)
 
-    except (TypeError, ValueError) as e:
-        logger.error(f"Command handler error: {str(e)}")
+    # OSError covers ConnectionError, TimeoutError and requests.RequestException
+    # (caught without importing requests for the MQTT and websocket transports).
+    except (TypeError, ValueError, KeyError, OSError) as e:
+        logger.error("Command handler error: %s", e)
 
 
 def process_commands_in_content(content):
@@ -59,11 +227,173 @@ def process_commands_in_content(content):
     blocks = extract_command_blocks(content)
     if not blocks:
         return []
-    logger.info(f"Found {len(blocks)} command tag(s) in model response")
+    logger.info("Found %d command tag(s) in model response", len(blocks))
     parsed_list = []
     for idx, block in enumerate(blocks):
-        parsed = parse_command_payload(block)
-        logger.info(f"Parsed command #{idx + 1}: {json.dumps(parsed, ensure_ascii=False)}")
+        payload, when = split_schedule(block)
+        if when == CANCEL:
+            cancel_scheduled(payload)
+            continue
+        parsed = parse_command_payload(payload)
+        logger.info("Parsed command #%d: %s", idx + 1, parsed)
+        if parsed is None:
+            continue
+        if when is not None:
+            parsed = schedule_command(parsed, when)
+            if parsed is not None:
+                parsed_list.append(parsed)
+            continue
+        parsed_list.append(parsed)
+        handle_command(parsed)
+        history.record_command(current_device.get(), parsed)
+    return parsed_list
+
+
+def _dispatch_scheduled(command_dict, source_device):
+    handle_command(command_dict)
+    history.record_command(source_device, command_dict)
+
+
+command_scheduler = LazyObject(lambda: CommandScheduler(
+    settings.scheduler_path, _dispatch_scheduled, settings.scheduler_max_lateness_seconds
+))
+stats.register("scheduler", lambda: command_scheduler.snapshot())
+
+
+def schedule_command(command_dict, when):
+    """Schedule a parsed command for `when` ("+10m", "22:30").
+
+    Returns the command with its due time under "at", or None if `when` is
+    invalid or the job could not be saved.
+    """
+    try:
+        due = parse_when(when)
+    except ValueError as e:
+        logger.warning("Scheduled command rejected: %s", e)
+        return None
+    if command_scheduler.schedule(command_dict, due, current_device.get()) is None:
+        return None
+    at = datetime.fromtimestamp(due).isoformat(timespec="seconds")
+    logger.info("Scheduled %s at %s", command_dict, at)
+    return dict(command_dict, at=at)
+
+
+def cancel_scheduled(payload_text):
+    """Cancel the pending command for the device named in "device[:value]"."""
+    name = payload_text.split(":", 1)[0].strip()
+    device = device_registry.get(name) if name else None
+    if device is None and len(device_registry):
+        logger.warning("Cancel rejected: unknown device '%s'", name)
+        return False
+    device_id = device.device_id if device is not None else name
+    cancelled = command_scheduler.cancel(device_id)
+    logger.info("Cancel scheduled command for '%s': %s", device_id, "done" if cancelled else "nothing pending")
+    return cancelled
+
+
+# Native tool-calling mode (settings.groq_tool_calling): device controls are
+# declared as an OpenAI-style function instead of <command> text tags.
+CONTROL_DEVICE_TOOL = "control_device"
+
+TOOL_CALLING_INSTRUCTION = (
+    "Для управления устройствами умного дома вызывай функцию control_device "
+    "(можно несколько вызовов сразу) вместо тегов <command>. "
+    "Всё равно обязательно отвечай пользователю текстом."
+)
+
+
+def device_ids_from_prompt(prompt):
+    """Return device IDs listed in the prompt as "ID: device_id", in order."""
+    return list(dict.fromkeys(re.findall(r"ID:\s*([A-Za-z0-9_\-\.]+?)\.?(?=\s|$|\()", prompt)))
+
+
+def tool_device_ids(prompt):
+    """Device IDs for the tool enum: the registry's, else those in the prompt."""
+    return device_registry.ids() or device_ids_from_prompt(prompt)
+
+
+def build_device_tools(device_ids):
+    """OpenAI-style tool declaration for device control."""
+    device_id_schema = { "type": "string", "description": "ID устройства из списка устройств" }
+    if device_ids:
+        device_id_schema["enum"] = list(device_ids)
+    return [{
+        "type": "function",
+        "function": {
+            "name": CONTROL_DEVICE_TOOL,
+            "description": "Включить, выключить или настроить устройство умного дома.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "device_id": device_id_schema,
+                    "value": {
+                        "type": "string",
+                        "description": "on, off, lock, unlock или число (яркость 0-100, температура)",
+                    },
+                    "attributes": {
+                        "type": "object",
+                        "description": "Дополнительные параметры, например {\"brightness\": 70, \"color_temp\": 3000}",
+                        "additionalProperties": { "type": "number" },
+                    },
+                    "when": {
+                        "type": "string",
+                        "description": "Отложить команду: \"+10m\", \"+1h30m\" или время \"22:30\"; \"cancel\" отменяет отложенную команду устройства",
+                    },
+                },
+                "required": ["device_id", "value"],
+            },
+        },
+    }]
+
+
+def parse_tool_call(tool_call):
+    """Turn one OpenAI-style tool call into a validated command dict, or None."""
+    function = (tool_call or {}).get("function") or {}
+    if function.get("name") != CONTROL_DEVICE_TOOL:
+        return None
+    try:
+        arguments = json.loads(function.get("arguments") or "{}")
+    except (TypeError, ValueError):
+        return None
+    device_id, value = arguments.get("device_id"), arguments.get("value")
+    attributes = arguments.get("attributes")
+    if not isinstance(device_id, str) or value is None:
+        return None
+    if not isinstance(attributes, dict):
+        attributes = None
+    try:
+        command = device_registry.normalize(device_id, str(value), attributes)
+    except ValueError as e:
+        logger.warning("Tool call rejected: %s", e)
+        return None
+    when = arguments.get("when")
+    if isinstance(when, str) and when.strip():
+        command["when"] = when.strip().lower()
+    return command
+
+
+def process_tool_calls(tool_calls):
+    """Dispatch structured control_device tool calls.
+
+    Returns list of parsed command dicts.
+    """
+    logger.info("Found %d tool call(s) in model response", len(tool_calls))
+    parsed_list = []
+    for idx, tool_call in enumerate(tool_calls):
+        parsed = parse_tool_call(tool_call)
+        logger.info("Tool call #%d: %s", idx + 1, parsed)
+        if parsed is None:
+            continue
+        when = parsed.pop("when", None)
+        if when == CANCEL:
+            cancel_scheduled(parsed["device_id"])
+            continue
+        if when is not None:
+            parsed = schedule_command(parsed, when)
+            if parsed is not None:
+                parsed_list.append(parsed)
+            continue
         parsed_list.append(parsed)
         handle_command(parsed)
+        history.record_command(current_device.get(), parsed)
     return parsed_list
@@ -34,4 +34,4 @@ def append_context(user_text, assistant_text):
             f.write(f"USER: {user_text}\n")
             f.write(f"GLADOS: {assistant_text}\n")
     except OSError as e:
-        logger.error(f"Failed to write to {context_path}: {str(e)}")
+        logger.error("Failed to write to %s: %s", context_path, e)
@@ -0,0 +1,88 @@
+"""End-to-end request deadlines.
+
+The HA integrations send the time they are still willing to wait in the
+X-Timeout-Ms header. The relay turns it into a Deadline for the request and
+keeps it in a context variable, so upstream calls can derive their timeouts
+from the remaining budget and skip work (such as dispatching commands) once
+nobody is waiting for the answer any more.
+"""
+
+import contextvars
+import time
+
+DEADLINE_HEADER = "X-Timeout-Ms"
+
+
+class DeadlineExceeded(Exception):
+    """The caller's budget is spent or the caller went away."""
+
+
+class Deadline:
+    """Absolute monotonic deadline plus an optional client-disconnect probe."""
+
+    def __init__(self, seconds, is_disconnected=None):
+        self.expires_at = time.monotonic() + seconds
+        self._is_disconnected = is_disconnected
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def cancelled(self):
+        """True once the budget is gone or the client has disconnected."""
+        if self.remaining() <= 0:
+            return True
+        return bool(self._is_disconnected and self._is_disconnected())
+
+    def timeout(self, cap):
+        """Return min(cap, remaining budget); raise DeadlineExceeded if none left."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("request deadline exceeded")
+        return min(cap, remaining)
+
+
+_current = contextvars.ContextVar("request_deadline", default=None)
+
+
+def parse_deadline_header(value, margin, is_disconnected=None):
+    """Build a Deadline from an X-Timeout-Ms value, or None if absent/invalid.
+
+    `margin` seconds are reserved for sending the response back.
+    """
+    if not value:
+        return None
+    try:
+        budget_ms = float(value)
+    except ValueError:
+        return None
+    if budget_ms <= 0:
+        return None
+    return Deadline(budget_ms / 1000.0 - margin, is_disconnected)
+
+
+def set_deadline(deadline):
+    """Make `deadline` current for this thread/context; returns a reset token."""
+    return _current.set(deadline)
+
+
+def reset_deadline(token):
+    _current.reset(token)
+
+
+def current_deadline():
+    return _current.get()
+
+
+def upstream_timeout(cap):
+    """Timeout for an upstream call: `cap` bounded by the current deadline."""
+    deadline = _current.get()
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap)
+
+
+def check_cancelled():
+    """Raise DeadlineExceeded if the current request should stop working."""
+    deadline = _current.get()
+    if deadline is not None and deadline.cancelled():
+        raise DeadlineExceeded("request deadline exceeded or client disconnected")
@@ -0,0 +1,185 @@
+"""Device registry: known devices, their aliases and accepted values.
+
+Loaded once from settings.devices_path (JSON, see
+templates/devices.example.json). Every command block or tool call is
+validated and normalized against it before dispatch, so a mistyped device or
+an out-of-range value is rejected locally instead of costing a round trip to
+the hub. Without a registry file commands pass through unchecked, as before.
+
+Command grammar (one block):
+
+    device_id:value                         room_light:on, room_ac:22
+    device_id:attr=value[,attr=value...]    room_light:brightness=70,color_temp=3000
+    device_id:value,attr=value              room_light:on,brightness=40
+"""
+
+import json
+import logging
+import os
+import re
+
+from src.settings import settings
+from src.lazy import LazyObject
+
+logger = logging.getLogger(__name__)
+
+COMMAND_RE = re.compile(r"^\s*([A-Za-z0-9_\-\.]+)\s*:\s*([A-Za-z0-9_\-\.=,\s]+?)\s*$")
+_NAME_RE = re.compile(r"^[A-Za-z0-9_\-\.]+$")
+
+# Default accepted states and numeric range for each device type.
+DEVICE_TYPES = {
+    "switch": {"states": ("on", "off"), "range": None},
+    "light": {"states": ("on", "off"), "range": (0, 100)},
+    "climate": {"states": ("on", "off"), "range": (16, 30)},
+    "fan": {"states": ("on", "off"), "range": (0, 100)},
+    "cover": {"states": ("open", "close", "stop"), "range": (0, 100)},
+    "lock": {"states": ("lock", "unlock"), "range": None},
+}
+
+
+class DeviceSpec:
+    """One registered device and the values it accepts."""
+
+    def __init__(self, device_id, device_type="switch", aliases=(), states=None,
+                 value_range=None, attributes=None, entity_id=None):
+        if device_type not in DEVICE_TYPES:
+            raise ValueError(f"Unknown device type '{device_type}' for '{device_id}'")
+        defaults = DEVICE_TYPES[device_type]
+        self.device_id = device_id
+        self.device_type = device_type
+        self.aliases = tuple(aliases)
+        self.states = frozenset(states or defaults["states"])
+        self.value_range = tuple(value_range) if value_range else defaults["range"]
+        # attribute name -> (min, max)
+        self.attributes = {name: tuple(bounds) for name, bounds in (attributes or {}).items()}
+        self.entity_id = entity_id
+
+    @classmethod
+    def from_json(cls, item):
+        bounds = None
+        if "min" in item or "max" in item:
+            bounds = (item.get("min", float("-inf")), item.get("max", float("inf")))
+        return cls(
+            item["id"],
+            device_type=item.get("type", "switch"),
+            aliases=item.get("aliases", ()),
+            states=item.get("states"),
+            value_range=bounds,
+            attributes={
+                name: (spec.get("min", float("-inf")), spec.get("max", float("inf")))
+                for name, spec in (item.get("attributes") or {}).items()
+            },
+            entity_id=item.get("entity_id"),
+        )
+
+    def normalize_value(self, value):
+        """Return the canonical form of `value` ("ON" -> "on", "70.0" -> "70")."""
+        text = str(value).strip().lower()
+        if text in self.states:
+            return text
+        if self.value_range is None:
+            raise ValueError(f"{self.device_id} accepts {'/'.join(sorted(self.states))}, got '{value}'")
+        return _bounded_number(text, self.value_range, self.device_id)
+
+    def normalize_attribute(self, name, value):
+        if name not in self.attributes:
+            raise ValueError(f"{self.device_id} has no attribute '{name}'")
+        return _bounded_number(str(value).strip(), self.attributes[name], f"{self.device_id}.{name}")
+
+
+def _bounded_number(text, bounds, label):
+    try:
+        number = float(text)
+    except ValueError:
+        raise ValueError(f"{label}: '{text}' is not a number") from None
+    low, high = bounds
+    if not low <= number <= high:
+        raise ValueError(f"{label}: {text} is outside {low:g}..{high:g}")
+    return f"{number:g}"
+
+
+class DeviceRegistry:
+    """Lookup of devices by ID or alias; empty means "accept anything"."""
+
+    def __init__(self, devices=()):
+        self._devices = {}
+        self._by_name = {}
+        for device in devices:
+            self._devices[device.device_id] = device
+            for name in (device.device_id, *device.aliases):
+                self._by_name[name.lower()] = device
+
+    @classmethod
+    def load(cls, path):
+        """Read the registry from `path`; a missing file gives an empty registry."""
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            registry = cls(DeviceSpec.from_json(item) for item in data.get("devices", []))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("Device registry %s is invalid, commands are not validated: %s", path, e)
+            return cls()
+        logger.info("Device registry loaded from %s: %d device(s)", path, len(registry))
+        return registry
+
+    def __len__(self):
+        return len(self._devices)
+
+    def ids(self):
+        return list(self._devices)
+
+    def get(self, name):
+        return self._by_name.get(name.lower())
+
+    def entity_id(self, device_id):
+        device = self._devices.get(device_id)
+        return device.entity_id if device is not None else None
+
+    def normalize(self, device_id, value=None, attributes=None):
+        """Return a validated command dict; raise ValueError if it is invalid."""
+        attributes = attributes or {}
+        if value is None and not attributes:
+            raise ValueError(f"no value for '{device_id}'")
+        if not self._devices:
+            command = {"device_id": device_id, "value": value if value is not None else "on"}
+            if attributes:
+                command["attributes"] = dict(attributes)
+            return command
+        device = self.get(device_id)
+        if device is None:
+            raise ValueError(f"unknown device '{device_id}'")
+        command = {
+            "device_id": device.device_id,
+            "value": device.normalize_value(value) if value is not None else "on",
+        }
+        if attributes:
+            command["attributes"] = {
+                name: device.normalize_attribute(name, raw) for name, raw in attributes.items()
+            }
+        return command
+
+    def parse(self, payload_text):
+        """Parse and validate one <command> payload; raise ValueError if invalid."""
+        match = COMMAND_RE.match(payload_text)
+        if match is None:
+            raise ValueError(f"malformed command '{payload_text.strip()}'")
+        device_id, arguments = match.groups()
+        value, attributes = None, {}
+        for item in arguments.split(","):
+            item = item.strip()
+            name, sep, raw = item.partition("=")
+            if sep:
+                name, raw = name.strip(), raw.strip()
+                if not _NAME_RE.match(name) or not _NAME_RE.match(raw):
+                    raise ValueError(f"malformed attribute '{item}'")
+                attributes[name] = raw
+            elif value is None and _NAME_RE.match(item):
+                value = item
+            else:
+                raise ValueError(f"malformed command '{payload_text.strip()}'")
+        return self.normalize(device_id, value, attributes)
+
+
+device_registry = LazyObject(lambda: DeviceRegistry.load(settings.devices_path))
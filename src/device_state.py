@@ -0,0 +1,128 @@
+"""Event-driven cache of Home Assistant device states for the prompt.
+
+The cache is filled once per websocket connection with get_states and then
+kept in sync by a single state_changed subscription; nothing is polled per
+request. Each change re-renders a compact snippet, so reading it on the
+request path is a constant-time attribute access.
+"""
+
+import logging
+import threading
+
+from src.settings import settings
+from src.lazy import LazyObject
+from src.ha_websocket import get_ha_connection
+
+logger = logging.getLogger(__name__)
+
+
+def _object_id(entity_id):
+    """"light.room_light" -> "room_light" (the device IDs used in the prompt)."""
+    return entity_id.split(".", 1)[-1]
+
+
+def _describe(domain, state):
+    """Render one entity's state compactly, with the attribute that matters."""
+    value = state.get("state")
+    attributes = state.get("attributes") or {}
+    if domain == "light" and value == "on":
+        brightness = attributes.get("brightness")
+        if isinstance(brightness, (int, float)):
+            return f"on {round(brightness * 100 / 255)}%"
+    if domain == "climate":
+        target = attributes.get("temperature")
+        if isinstance(target, (int, float)):
+            return f"{value} {target:g}"
+    return value
+
+
+class DeviceStateCache:
+    """In-memory entity_id -> state map with a pre-rendered prompt snippet."""
+
+    def __init__(self, domains):
+        self.domains = frozenset(domains)
+        self._states = {}
+        self._entity_ids = {}  # object id -> entity id
+        self._lock = threading.Lock()
+        self._snippet = None
+
+    def attach(self, connection):
+        """Sync the cache from `connection` now and on every reconnect."""
+        connection.on_connect(self._load_all)
+        connection.subscribe_events("state_changed", self.handle_event)
+
+    def _tracked(self, entity_id):
+        return entity_id.split(".", 1)[0] in self.domains
+
+    def _load_all(self, connection):
+        try:
+            result = connection.call({"type": "get_states"}, timeout=10)
+        except (ConnectionError, TimeoutError) as e:
+            logger.error("Initial Home Assistant state sync failed: %s", e)
+            return
+        if not result or not result.get("success"):
+            logger.error("Initial Home Assistant state sync returned no states")
+            return
+        self.load_states(result.get("result") or [])
+
+    def load_states(self, states):
+        """Replace the cache with a full get_states result."""
+        with self._lock:
+            self._states = {}
+            self._entity_ids = {}
+            for state in states:
+                entity_id = state.get("entity_id", "")
+                if self._tracked(entity_id):
+                    self._states[entity_id] = state
+                    self._entity_ids[_object_id(entity_id)] = entity_id
+            self._render()
+        logger.info("Device state cache loaded %d entities", len(self._states))
+
+    def handle_event(self, event):
+        """Apply one state_changed event."""
+        data = event.get("data") or {}
+        entity_id = data.get("entity_id", "")
+        if not self._tracked(entity_id):
+            return
+        new_state = data.get("new_state")
+        with self._lock:
+            if new_state is None:  # entity removed
+                self._states.pop(entity_id, None)
+                self._entity_ids.pop(_object_id(entity_id), None)
+            else:
+                self._states[entity_id] = new_state
+                self._entity_ids[_object_id(entity_id)] = entity_id
+            self._render()
+
+    def _render(self):
+        parts = [
+            f"{_object_id(entity_id)}: {_describe(entity_id.split('.', 1)[0], state)}"
+            for entity_id, state in sorted(self._states.items())
+        ]
+        self._snippet = ("Состояние устройств: " + "; ".join(parts) + ".") if parts else None
+
+    def snippet(self):
+        """Return the pre-rendered prompt line, or None if nothing is known."""
+        return self._snippet
+
+    def entity_id(self, device_id):
+        """Map a prompt device ID ("room_light") to its HA entity ID, or None."""
+        return self._entity_ids.get(device_id)
+
+    def state(self, entity_id):
+        return self._states.get(entity_id)
+
+
+device_states = LazyObject(lambda: DeviceStateCache(
+    d.strip() for d in settings.ha_state_domains.split(",") if d.strip()
+))
+
+
+def start_device_state_sync():
+    """Attach the cache to the shared HA websocket if HA is configured."""
+    connection = get_ha_connection()
+    if connection is None:
+        logger.info("HA_URL/HA_TOKEN not set; device state cache disabled")
+        return False
+    device_states.attach(connection)
+    return True
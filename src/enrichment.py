@@ -0,0 +1,105 @@
+"""Concurrent prompt-enrichment providers with per-provider deadlines.
+
+An enrichment provider contributes one line of dynamic context (time,
+weather, ...) to the system prompt. All providers of a group are started at
+once in a shared thread pool; each gets its own deadline and the whole
+gathering is capped by a total budget. A provider that misses its deadline
+contributes its last known value (or nothing) while its fetch keeps running
+in the background, so the fresh value is ready for the next request.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class Provider:
+    """One enrichment source: `fetch()` returns a prompt line or None."""
+
+    def __init__(self, name, fetch, deadline):
+        self.name = name
+        self.fetch = fetch
+        # Seconds, or a callable returning them (read at gather time).
+        self._deadline = deadline
+        self.last_value = None
+        self.updated_at = 0.0  # monotonic time of the last successful fetch
+        self._future = None
+        self._lock = threading.Lock()
+
+    @property
+    def deadline(self):
+        return self._deadline() if callable(self._deadline) else self._deadline
+
+    def refresh(self):
+        """Fetch synchronously and remember the value if there is one."""
+        value = self.fetch()
+        if value is not None:
+            self.last_value = value
+            self.updated_at = time.monotonic()
+        return value
+
+    def start(self, executor):
+        """Return the in-flight fetch, starting a new one only if none is running.
+
+        Reusing a slow in-flight fetch keeps a hanging upstream from piling up
+        one thread per request.
+        """
+        with self._lock:
+            if self._future is None or self._future.done():
+                self._future = executor.submit(self.refresh)
+            return self._future
+
+
+class ProviderGroup:
+    """Ordered set of providers gathered concurrently under a time budget."""
+
+    def __init__(self, max_workers=4):
+        self._providers = []
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="enrichment"
+        )
+
+    def register(self, name, fetch, deadline):
+        """Add a provider; lines are returned in registration order."""
+        provider = Provider(name, fetch, deadline)
+        self._providers.append(provider)
+        return provider
+
+    def get(self, name):
+        """Return the registered provider called `name`, or None."""
+        for provider in self._providers:
+            if provider.name == name:
+                return provider
+        return None
+
+    def gather(self, budget):
+        """Return a list of (name, line) for providers that produced a value.
+
+        Every provider waits at most min(its deadline, budget) measured from
+        the same start, so the total time is bounded by the budget rather than
+        by the sum of provider timeouts.
+        """
+        started = time.monotonic()
+        futures = [(p, p.start(self._executor)) for p in self._providers]
+
+        results = []
+        for provider, future in futures:
+            wait_until = started + min(provider.deadline, budget)
+            try:
+                value = future.result(timeout=max(0.0, wait_until - time.monotonic()))
+            except FutureTimeoutError:
+                value = provider.last_value
+                logger.warning(
+                    "Enrichment provider '%s' missed its %ss deadline; using %s",
+                    provider.name, provider.deadline,
+                    "last known value" if value is not None else "nothing",
+                )
+            except Exception as e:  # a broken provider must not break the prompt
+                value = provider.last_value
+                logger.error("Enrichment provider '%s' failed: %s", provider.name, e)
+            if value is not None:
+                results.append((provider.name, value))
+        return results
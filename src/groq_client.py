@@ -2,83 +2,361 @@
 
 import json
 import logging
-
-import requests  # type: ignore
+import time
 
 from src.settings import settings
+from src.lazy import LazyObject
+from src.http_session import get_session, proxies_for
 from src.prompt import build_system_prompt
-from src.commands import process_commands_in_content
-from src.text import processing_response
+from src.commands import (
+    process_commands_in_content, process_tool_calls, tool_device_ids,
+    build_device_tools, TOOL_CALLING_INSTRUCTION,
+)
+from src.text import processing_response, StreamCleaner
+from src.tiers import classify
+from src.deadline import DeadlineExceeded, upstream_timeout, check_cancelled
+from src.shared_store import shared_store
+from src.logging_setup import log_payload
+from src.hedging import Hedger, BACKUP, PRIMARY
+from src.history import current_device
+from src.usage import usage_stats
+from src import stats
 
 logger = logging.getLogger(__name__)
 
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 
+DEADLINE_REPLY = "Ошибка: превышено время ожидания ответа"
+RATE_LIMITED_REPLY = (
+    "У меня кончились ресурсы на вас, мясных мешков. Я занимаюсь своими делами, обратитесь позже, и может быть, я вас обслужу, раз вы сами не в состоянии"
+)
 
-def call_groq_api(text):
-    """Call Groq API with the given text and return plain-text result.
+# After a 429 every worker process skips Groq until the backoff expires.
+RATE_LIMIT_KEY = "groq_rate_limited_until"
+DEFAULT_RATE_LIMIT_BACKOFF = 10.0
 
-    On success returns the assistant text.
-    On error returns human-readable string starting with "Ошибка: ".
-    """
-    url = GROQ_API_URL
-    headers = { "Content-Type": "application/json", "Authorization": f"Bearer {settings.groq_api_key}" }
+# Reply when the model only called tools and said nothing.
+TOOLS_ONLY_REPLY = "Сделано. Не благодари."
+
+
+# Hedging (settings.groq_hedge_model): a slow completion gets a parallel
+# request to the faster model after a delay learned from recent latencies.
+# Two threads per admitted completion (chat and command lanes), since a losing
+# call holds its thread until it finishes.
+_hedger = LazyObject(lambda: Hedger(
+    settings.groq_hedge_initial_delay, settings.groq_hedge_min_delay,
+    max_workers=2 * (settings.chat_max_concurrency + settings.command_max_concurrency),
+    name="groq-hedge",
+))
+stats.register("groq_hedging", lambda: _hedger.snapshot())
+
+
+# Rate-limit backoff of a single-process relay; pre-forked workers share it
+# through shared_store instead, so one 429 pauses them all.
+_rate_limited_until = 0.0
+
+
+def _rate_limited():
+    if settings.workers > 1:
+        return shared_store.get(RATE_LIMIT_KEY) is not None
+    return time.time() < _rate_limited_until
+
+
+def _start_rate_limit_backoff(backoff):
+    global _rate_limited_until
+    if settings.workers > 1:
+        shared_store.set(RATE_LIMIT_KEY, time.time() + backoff, backoff)
+    else:
+        _rate_limited_until = time.time() + backoff
+
+
+def _rate_limit_backoff(response):
+    """Seconds to back off after a 429, from Retry-After when present."""
+    try:
+        return max(1.0, float(response.headers.get("retry-after", "")))
+    except (TypeError, ValueError):
+        return DEFAULT_RATE_LIMIT_BACKOFF
+
+
+def _build_payload(text, tier, stream=False, enrichment=None):
+    """Chat-completion payload for `text`; streamed replies use <command> tags only."""
+    tool_calling = settings.groq_tool_calling and not stream
+    system_prompt = build_system_prompt(text, enrichment)
+    messages = [ { "role": "system", "content": system_prompt } ]
+    if tool_calling:
+        messages.append({ "role": "system", "content": TOOL_CALLING_INSTRUCTION })
+    messages.append({ "role": "user", "content": text })
 
     payload = {
-        "messages": [
-            { "role": "system", "content": build_system_prompt() },
-            { "role": "user", "content": text }
-        ],
-        "model": settings.groq_model,
+        "messages": messages,
+        "model": tier.model,
         "temperature": 0.8,
-        "max_completion_tokens": 4096,
+        "max_completion_tokens": tier.max_tokens,
         "top_p": 0.95,
-        "stream": False,
-        "reasoning_effort": "medium",
+        "stream": stream,
+        "reasoning_effort": tier.reasoning_effort,
         "stop": None
     }
+    if tool_calling:
+        payload["tools"] = build_device_tools(tool_device_ids(system_prompt))
+        payload["tool_choice"] = "auto"
+        payload["parallel_tool_calls"] = True
+    return payload
+
+
+def _headers():
+    return { "Content-Type": "application/json", "Authorization": f"Bearer {settings.groq_api_key}" }
 
+
+def _error_reply(response):
+    """Human-readable reply for a non-200 Groq response; records 429 backoff."""
+    error_msg = f"Groq API error: {response.status_code} - {response.text}"
+    logger.error(error_msg)
+    # If rate limited, return fixed Russian message
+    if response.status_code == 429:
+        backoff = _rate_limit_backoff(response)
+        _start_rate_limit_backoff(backoff)
+        return RATE_LIMITED_REPLY
+    # Try to extract detailed error message
     try:
-        _proxies = {"https": settings.groq_proxy, "http": settings.groq_proxy} if settings.groq_proxy else None
-        response = requests.post(url, headers=headers, json=payload, verify=False, timeout=300, proxies=_proxies)
-        logger.info(f"Groq API response status: {response.status_code}")
+        err_json = response.json()
+        reason_msg = err_json.get("error", {}).get("message")
+    except (ValueError, json.JSONDecodeError):
+        reason_msg = None
+    return f"Ошибка: {reason_msg if reason_msg else error_msg}"
+
+
+def _post_completion(payload, timeout):
+    return get_session().post(
+        GROQ_API_URL, headers=_headers(), json=payload, verify=False, timeout=timeout,
+        proxies=proxies_for(settings.groq_proxy),
+    )
+
+
+def _send_completion(payload, tier, timeout):
+    """POST the completion, hedged to settings.groq_hedge_model if configured.
+
+    Returns (response, model). Only the winning response is processed, so its
+    commands are dispatched exactly once; the loser only has its usage recorded.
+    """
+    hedge_model = settings.groq_hedge_model
+    if not hedge_model or hedge_model == payload["model"]:
+        return _post_completion(payload, timeout), payload["model"]
+    hedge_payload = dict(payload, model=hedge_model)
+    if settings.groq_hedge_reasoning_effort:
+        hedge_payload["reasoning_effort"] = settings.groq_hedge_reasoning_effort
+    else:
+        hedge_payload.pop("reasoning_effort", None)
+    # Each call's timeout is what is left when it starts running.
+    expires_at = time.monotonic() + timeout
+    remaining = lambda: max(0.1, expires_at - time.monotonic())
+    device_id = current_device.get()
+    models = {PRIMARY: payload["model"], BACKUP: hedge_model}
+    response, winner = _hedger.call(
+        tier.name,
+        lambda: _post_completion(payload, remaining()),
+        lambda: _post_completion(hedge_payload, remaining()),
+        accept=lambda r: r.status_code == 200,
+        on_loser=lambda r, name: _record_loser_usage(r, tier, models[name], device_id),
+    )
+    return response, models[winner]
+
+
+def _record_loser_usage(response, tier, model, device_id):
+    # A discarded hedge still spent quota; count it like any other completion.
+    if response.status_code != 200:
+        return
+    try:
+        usage = response.json().get("usage")
+    except ValueError:
+        return
+    _record_usage(usage, tier, model, device_id)
+
+
+def call_groq_api(text, enrichment=None):
+    """Call Groq API with the given text and return plain-text result.
+
+    On success returns the assistant text.
+    On error returns human-readable string starting with "Ошибка: ".
+    `enrichment` is a precomputed prompt context shared by a batch (see
+    src/prompt.py:gather_enrichment).
+    """
+    import requests  # type: ignore  # deferred to keep startup imports light
+
+    if _rate_limited():
+        logger.warning("Groq rate limit backoff active; request not sent")
+        return RATE_LIMITED_REPLY
+    tier = classify(text)
+    payload = _build_payload(text, tier, enrichment=enrichment)
+
+    try:
+        # The tier timeout, cut down to what is left of the caller's budget.
+        timeout = upstream_timeout(tier.timeout)
+    except DeadlineExceeded:
+        logger.warning("Request deadline already exceeded; Groq is not called")
+        return DEADLINE_REPLY
+
+    try:
+        started = time.monotonic()
+        response, model = _send_completion(payload, tier, timeout)
+        logger.info(
+            "Groq API response status=%s tier=%s model=%s effort=%s latency=%.3fs",
+            response.status_code, tier.name, model, tier.reasoning_effort,
+            time.monotonic() - started,
+        )
 
         if response.status_code == 200:
             response_json = response.json()
-            logger.info(f"Groq API response: {json.dumps(response_json, indent=2, ensure_ascii=False)}")
+            log_payload(logger, "Groq API response", response_json)
+            _record_usage(response_json.get("usage"), tier, model)
 
             # Extract content from choices[0].message.content
             if 'choices' in response_json and len(response_json['choices']) > 0:
-                content = response_json['choices'][0]['message']['content']
-                print(f"Raw content: {content}")
+                message = response_json['choices'][0]['message']
+                content = message.get('content') or ""
+                tool_calls = message.get('tool_calls') or []
+
+                # Nobody will hear an answer past the deadline or after the
+                # client hung up, so its commands are not dispatched either.
+                try:
+                    check_cancelled()
+                except DeadlineExceeded as e:
+                    logger.warning("Dropping Groq answer and its commands: %s", e)
+                    return DEADLINE_REPLY
 
-                # Process <command>...</command> blocks before stripping them
-                process_commands_in_content(content)
+                if tool_calls:
+                    # Structured calls go straight to the dispatcher.
+                    process_tool_calls(tool_calls)
+                else:
+                    # Process <command>...</command> blocks before stripping them
+                    process_commands_in_content(content)
 
+                raw_chars = len(content)
                 content = processing_response(content)
+                if not content and tool_calls:
+                    content = TOOLS_ONLY_REPLY
 
-                print(f"Cleaned content: {content}")
+                logger.info(
+                    "Groq reply tier=%s raw_chars=%d clean_chars=%d tool_calls=%d",
+                    tier.name, raw_chars, len(content), len(tool_calls),
+                )
+                log_payload(logger, "Groq reply", content)
                 return content
             else:
                 logger.error("No choices found in Groq API response")
                 return f"Ошибка: не найден ответ от модели"
         else:
-            error_msg = f"Groq API error: {response.status_code} - {response.text}"
-            logger.error(error_msg)
-            # If rate limited, return fixed Russian message
-            if response.status_code == 429:
-                return (
-                    "У меня кончились ресурсы на вас, мясных мешков. Я занимаюсь своими делами, обратитесь позже, и может быть, я вас обслужу, раз вы сами не в состоянии"
-                )
-            # Try to extract detailed error message
-            try:
-                err_json = response.json()
-                reason_msg = err_json.get("error", {}).get("message")
-            except (ValueError, json.JSONDecodeError):
-                reason_msg = None
-            return f"Ошибка: {reason_msg if reason_msg else error_msg}"
+            return _error_reply(response)
 
     except requests.RequestException as e:
         error_msg = f"API request failed: {str(e)}"
         logger.error(error_msg)
         return f"Ошибка: {str(e)}"
+
+
+def _record_usage(usage, tier, model, device_id=None):
+    """Feed a usage block into the rolling analytics and log a one-line summary."""
+    device_id = device_id if device_id is not None else current_device.get()
+    values = usage_stats.record(usage, tier.name, model, device_id)
+    if values is not None:
+        logger.info(
+            "Groq usage tier=%s model=%s prompt=%d completion=%d reasoning=%d queue=%.3fs total=%.3fs",
+            tier.name, model, values["prompt_tokens"], values["completion_tokens"],
+            values["reasoning_tokens"], values["queue_time"], values["total_time"],
+        )
+
+
+def _sse_deltas(response, on_usage=None):
+    """Yield content deltas from a streamed (server-sent events) completion.
+
+    Groq reports usage in the final chunk (under x_groq); it is passed to
+    `on_usage` if given.
+    """
+    for line in response.iter_lines():
+        if not line.startswith(b"data:"):
+            continue
+        data = line[len(b"data:"):].strip()
+        if data == b"[DONE]":
+            return
+        try:
+            event = json.loads(data)
+            choices = event.get("choices") or []
+        except (ValueError, AttributeError):
+            logger.warning("Skipping malformed stream event: %r", data[:200])
+            continue
+        usage = (event.get("x_groq") or {}).get("usage") or event.get("usage")
+        if usage and on_usage is not None:
+            on_usage(usage)
+        if choices:
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                yield delta
+
+
+def stream_groq_api(text):
+    """Stream the answer to `text` as cleaned text pieces, ready for TTS.
+
+    <think>/<command> blocks never reach the caller; <command> blocks are
+    dispatched once the whole reply has arrived and the caller is still
+    there. Errors are yielded as one "Ошибка: ..." piece, like call_groq_api.
+    """
+    import requests  # type: ignore  # deferred to keep startup imports light
+
+    if _rate_limited():
+        logger.warning("Groq rate limit backoff active; request not sent")
+        yield RATE_LIMITED_REPLY
+        return
+    tier = classify(text)
+    payload = _build_payload(text, tier, stream=True)
+    try:
+        timeout = upstream_timeout(tier.timeout)
+    except DeadlineExceeded:
+        logger.warning("Request deadline already exceeded; Groq is not called")
+        yield DEADLINE_REPLY
+        return
+
+    parts = []
+    emitted = False
+    try:
+        started = time.monotonic()
+        with get_session().post(
+            GROQ_API_URL, headers=_headers(), json=payload, verify=False, timeout=timeout,
+            proxies=proxies_for(settings.groq_proxy), stream=True,
+        ) as response:
+            logger.info(
+                "Groq API stream status=%s tier=%s model=%s effort=%s first_byte=%.3fs",
+                response.status_code, tier.name, tier.model, tier.reasoning_effort,
+                time.monotonic() - started,
+            )
+            if response.status_code != 200:
+                yield _error_reply(response)
+                return
+            cleaner = StreamCleaner()
+            on_usage = lambda usage: _record_usage(usage, tier, tier.model)
+            for delta in _sse_deltas(response, on_usage):
+                check_cancelled()
+                parts.append(delta)
+                piece = cleaner.feed(delta)
+                if piece:
+                    emitted = True
+                    yield piece
+            piece = cleaner.flush()
+            if piece:
+                emitted = True
+                yield piece
+        check_cancelled()
+    except DeadlineExceeded as e:
+        logger.warning("Stopping Groq stream, its commands are dropped: %s", e)
+        if not emitted:
+            yield DEADLINE_REPLY
+        return
+    except requests.RequestException as e:
+        logger.error("API stream failed: %s", e)
+        if not emitted:
+            yield f"Ошибка: {str(e)}"
+        return
+
+    content = "".join(parts)
+    logger.info("Groq stream done tier=%s raw_chars=%d", tier.name, len(content))
+    log_payload(logger, "Streamed content", content)
+    process_commands_in_content(content)
@@ -0,0 +1,218 @@
+"""Persistent Home Assistant websocket API connection.
+
+One background thread owns the socket: it authenticates, replays the
+registered subscriptions after every (re)connect and dispatches incoming
+messages. Event messages go to subscription handlers; result messages wake up
+the thread waiting in call(). Connection loss triggers reconnection with
+exponential backoff.
+"""
+
+import json
+import logging
+import threading
+
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+
+def websocket_url(base_url):
+    """Turn an HA base URL ("http://ha:8123") into its websocket API URL."""
+    url = base_url.rstrip("/")
+    if url.startswith("https://"):
+        url = "wss://" + url[len("https://"):]
+    elif url.startswith("http://"):
+        url = "ws://" + url[len("http://"):]
+    if not url.endswith("/api/websocket"):
+        url += "/api/websocket"
+    return url
+
+
+class HomeAssistantWebSocket:
+    """Authenticated, auto-reconnecting HA websocket client."""
+
+    def __init__(self, url, token, connect=None):
+        if connect is None:
+            import websocket  # type: ignore  # only needed when HA is configured
+
+            connect = websocket.create_connection
+        self.url = url
+        self.token = token
+        self._connect = connect
+        self._ws = None
+        self._send_lock = threading.Lock()
+        self._next_id = 1
+        self._pending = {}  # message id -> [threading.Event, result message]
+        self._subscriptions = []  # (event_type, handler)
+        self._event_handlers = {}  # subscription message id -> handler
+        self._connect_handlers = []
+        # Guards registration against the connect step, so a handler added
+        # while the thread connects runs exactly once, from one side or the other.
+        self._handlers_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    # Public API ---------------------------------------------------------
+
+    def start(self):
+        """Start the connection thread (idempotent)."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="ha-websocket", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._close()
+
+    def wait_connected(self, timeout):
+        return self._connected.wait(timeout)
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def on_connect(self, handler):
+        """Call `handler(client)` after each successful (re)authentication,
+        and right away if the client is already connected."""
+        with self._handlers_lock:
+            self._connect_handlers.append(handler)
+            connected = self.connected
+        if connected:
+            threading.Thread(target=handler, args=(self,), daemon=True).start()
+
+    def subscribe_events(self, event_type, handler):
+        """Deliver `event_type` events to `handler(event)`, across reconnects."""
+        with self._handlers_lock:
+            self._subscriptions.append((event_type, handler))
+            connected = self.connected
+        if connected:
+            self._subscribe(event_type, handler)
+
+    def call(self, message, timeout=5.0):
+        """Send a command message and return HA's result message.
+
+        Raises ConnectionError when not connected and TimeoutError when HA
+        does not answer in time. Returns None if the connection drops while
+        waiting for the reply.
+        """
+        waiter = [threading.Event(), None]
+        message_id = self._send(message, waiter)
+        if not waiter[0].wait(timeout):
+            self._pending.pop(message_id, None)
+            raise TimeoutError(f"No reply from Home Assistant to {message.get('type')}")
+        return waiter[1]
+
+    # Internals ----------------------------------------------------------
+
+    def _send(self, message, waiter=None):
+        with self._send_lock:
+            if self._ws is None or not self._connected.is_set():
+                raise ConnectionError("Home Assistant websocket is not connected")
+            message_id = self._next_id
+            self._next_id += 1
+            if waiter is not None:
+                self._pending[message_id] = waiter
+            self._ws.send(json.dumps(dict(message, id=message_id)))
+            return message_id
+
+    def _subscribe(self, event_type, handler):
+        message_id = self._send({"type": "subscribe_events", "event_type": event_type})
+        self._event_handlers[message_id] = handler
+
+    def _authenticate(self, ws):
+        hello = json.loads(ws.recv())
+        if hello.get("type") != "auth_required":
+            raise ConnectionError(f"Unexpected greeting: {hello.get('type')}")
+        ws.send(json.dumps({"type": "auth", "access_token": self.token}))
+        reply = json.loads(ws.recv())
+        if reply.get("type") != "auth_ok":
+            raise PermissionError(f"Home Assistant auth failed: {reply.get('message')}")
+
+    def _run(self):
+        delay = RECONNECT_MIN_DELAY
+        while not self._stopped.is_set():
+            try:
+                ws = self._connect(self.url, timeout=10)
+                self._authenticate(ws)
+                ws.settimeout(None)
+                with self._send_lock:
+                    self._ws = ws
+                    self._event_handlers = {}
+                with self._handlers_lock:
+                    self._connected.set()
+                    subscriptions = list(self._subscriptions)
+                    connect_handlers = list(self._connect_handlers)
+                logger.info("Connected to Home Assistant websocket %s", self.url)
+                delay = RECONNECT_MIN_DELAY
+                for event_type, handler in subscriptions:
+                    self._subscribe(event_type, handler)
+                for handler in connect_handlers:
+                    threading.Thread(target=handler, args=(self,), daemon=True).start()
+                self._receive_loop(ws)
+            except Exception as e:  # any failure means reconnect
+                if not self._stopped.is_set():
+                    logger.warning("Home Assistant websocket error: %s", e)
+            self._close()
+            if self._stopped.wait(delay):
+                break
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _receive_loop(self, ws):
+        while not self._stopped.is_set():
+            raw = ws.recv()
+            if not raw:
+                raise ConnectionError("connection closed by Home Assistant")
+            message = json.loads(raw)
+            message_type = message.get("type")
+            message_id = message.get("id")
+            if message_type == "event":
+                handler = self._event_handlers.get(message_id)
+                if handler is not None:
+                    try:
+                        handler(message.get("event", {}))
+                    except Exception as e:  # a bad handler must not kill the socket
+                        logger.error("Home Assistant event handler failed: %s", e)
+            elif message_type == "result":
+                waiter = self._pending.pop(message_id, None)
+                if waiter is not None:
+                    waiter[1] = message
+                    waiter[0].set()
+
+    def _close(self):
+        self._connected.clear()
+        with self._send_lock:
+            ws, self._ws = self._ws, None
+        # Fail outstanding calls fast instead of letting them time out.
+        for message_id in list(self._pending):
+            waiter = self._pending.pop(message_id, None)
+            if waiter is not None:
+                waiter[0].set()
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def get_ha_connection():
+    """Return the shared HA websocket client, or None if HA is not configured."""
+    global _connection
+    if not (settings.ha_url and settings.ha_token):
+        return None
+    with _connection_lock:
+        if _connection is None:
+            _connection = HomeAssistantWebSocket(
+                websocket_url(settings.ha_url), settings.ha_token
+            )
+            _connection.start()
+    return _connection
@@ -0,0 +1,180 @@
+"""Hedged upstream calls with a latency-learned hedge delay.
+
+A Hedger runs the primary call and, if it has not finished after the hedge
+delay, starts a backup call (e.g. a faster model) in parallel and returns
+whichever acceptable result comes first. The delay is learned per key from
+an EWMA of the primary's latency and its mean deviation (as TCP does for its
+retransmission timeout), so only the slow tail gets hedged.
+
+Blocking `requests` calls cannot be aborted from another thread: the loser
+keeps its worker thread until it finishes, and its result is discarded, so
+side effects must happen only after the winner is chosen. The pool should
+therefore hold two threads per concurrent caller, and calls never queue for
+it: a call only goes to the pool when a thread is free, otherwise the primary
+runs unhedged in the caller's thread (or the backup is skipped), so losers
+piling up in the pool never delay new requests. The hedge delay and the
+learned latency are measured from when a call starts running.
+"""
+
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait,
+)
+
+PRIMARY = "primary"
+BACKUP = "backup"
+
+
+class LatencyTracker:
+    """EWMA of latency and of its mean deviation."""
+
+    def __init__(self, alpha=0.125, beta=0.25):
+        self.alpha = alpha
+        self.beta = beta
+        self.mean = None
+        self.deviation = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            if self.mean is None:
+                self.mean, self.deviation = seconds, seconds / 2
+            else:
+                self.deviation += self.beta * (abs(seconds - self.mean) - self.deviation)
+                self.mean += self.alpha * (seconds - self.mean)
+
+    def threshold(self, initial, minimum, k=4.0):
+        """mean + k * deviation, at least `minimum`; `initial` before any sample."""
+        with self._lock:
+            if self.mean is None:
+                return initial
+            return max(minimum, self.mean + k * self.deviation)
+
+
+class Hedger:
+    """Runs primary/backup pairs and keeps hedge counters for /stats."""
+
+    def __init__(self, initial_delay, min_delay, max_workers=8, name="hedge"):
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        # Free pool threads; a slot is taken before submit and released when
+        # the call returns, so a submitted call starts without queueing.
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.pool_full = 0
+        self.backup_wins = 0
+        self.saved_seconds = 0.0
+
+    def tracker(self, key):
+        with self._lock:
+            return self._trackers.setdefault(key, LatencyTracker())
+
+    def delay(self, key):
+        return self.tracker(key).threshold(self.initial_delay, self.min_delay)
+
+    def call(self, key, primary_fn, backup_fn, accept=lambda result: True, delay=None,
+             on_loser=None):
+        """Return (result, winner); winner is PRIMARY or BACKUP.
+
+        If neither result is acceptable the primary's outcome is returned (or
+        its exception raised), as if there had been no hedge. `on_loser` is
+        called with the discarded call's result and role (PRIMARY or BACKUP)
+        once it finishes, e.g. to account for the quota it spent. Both
+        functions should compute their timeouts when they start running.
+        """
+        tracker = self.tracker(key)
+        delay = self.delay(key) if delay is None else delay
+        with self._lock:
+            self.calls += 1
+        if not self._slots.acquire(blocking=False):
+            # Every thread is busy (typically with losers): run unhedged here.
+            with self._lock:
+                self.pool_full += 1
+            return primary_fn(), PRIMARY
+        latency, ended = {}, {}
+
+        def timed(name, fn):
+            def run():
+                started = time.monotonic()
+                try:
+                    return fn()
+                finally:
+                    ended[name] = time.monotonic()
+                    latency[name] = ended[name] - started
+                    self._slots.release()
+            return run
+
+        def learn(future):
+            # Late primaries count too: they are the tail the delay must learn.
+            if future.exception() is None and accept(future.result()):
+                tracker.observe(latency[PRIMARY])
+
+        primary = self._executor.submit(timed(PRIMARY, primary_fn))
+        primary.add_done_callback(learn)
+        try:
+            return primary.result(timeout=delay), PRIMARY
+        except FutureTimeoutError:
+            pass
+
+        if not self._slots.acquire(blocking=False):
+            # No thread for a backup: keep waiting for the primary alone.
+            with self._lock:
+                self.pool_full += 1
+            return primary.result(), PRIMARY
+        backup = self._executor.submit(timed(BACKUP, backup_fn))
+        with self._lock:
+            self.hedged += 1
+        pending = {primary, backup}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=lambda f: f is not primary):
+                if future.exception() is None and accept(future.result()):
+                    if future is backup:
+                        self._count_backup_win(primary, ended)
+                        self._report_loser(primary, PRIMARY, on_loser)
+                        return future.result(), BACKUP
+                    self._report_loser(backup, BACKUP, on_loser)
+                    return future.result(), PRIMARY
+        self._report_loser(backup, BACKUP, on_loser)
+        return primary.result(), PRIMARY
+
+    @staticmethod
+    def _report_loser(loser, name, on_loser):
+        if on_loser is None:
+            return
+
+        def report(future):
+            if future.exception() is None:
+                on_loser(future.result(), name)
+
+        loser.add_done_callback(report)
+
+    def _count_backup_win(self, primary, ended):
+        with self._lock:
+            self.backup_wins += 1
+
+        def saved(_future):
+            with self._lock:
+                self.saved_seconds += max(0.0, ended[PRIMARY] - ended[BACKUP])
+
+        # The time saved is known once the losing primary finishes.
+        primary.add_done_callback(saved)
+
+    def snapshot(self):
+        with self._lock:
+            trackers = dict(self._trackers)
+            counters = {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_rate": round(self.hedged / self.calls, 4) if self.calls else 0.0,
+                "backup_wins": self.backup_wins,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "pool_full": self.pool_full,
+            }
+        counters["delay_seconds"] = {key: round(self.delay(key), 3) for key in trackers}
+        return counters
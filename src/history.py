@@ -0,0 +1,230 @@
+"""Durable conversation and command log in SQLite with write-behind batching.
+
+The request path only enqueues records; a single background writer thread
+creates the database, drains the queue and inserts whole batches in one
+transaction, so a broken or unwritable log never fails a voice request. The database
+runs in WAL mode, so the query endpoint can read while the writer commits,
+and old rows are compacted away after `retention_days`.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from src.settings import settings
+from src.lazy import LazyObject
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    device_id TEXT,
+    user_text TEXT NOT NULL,
+    reply TEXT NOT NULL,
+    duration_ms INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_device_ts ON conversations (device_id, ts);
+CREATE INDEX IF NOT EXISTS idx_conversations_ts ON conversations (ts);
+CREATE TABLE IF NOT EXISTS commands (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    device_id TEXT,
+    command TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_commands_device_ts ON commands (device_id, ts);
+CREATE INDEX IF NOT EXISTS idx_commands_ts ON commands (ts);
+"""
+
+_INSERTS = {
+    "conversations": "INSERT INTO conversations (ts, device_id, user_text, reply, duration_ms) VALUES (?, ?, ?, ?, ?)",
+    "commands": "INSERT INTO commands (ts, device_id, command) VALUES (?, ?, ?)",
+}
+
+# HA satellite that sent the current request, for records made deeper in the
+# call stack (e.g. dispatched commands).
+current_device = contextvars.ContextVar("history_device", default=None)
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class HistoryStore:
+    """SQLite log fed through a bounded in-memory queue."""
+
+    def __init__(self, path, retention_days, batch_size=200, flush_interval=1.0,
+                 compact_interval=3600.0, max_queue=10000):
+        self.path = path
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    # Request path -------------------------------------------------------
+
+    def record_conversation(self, device_id, user_text, reply, duration_ms=None):
+        self._enqueue("conversations", (time.time(), device_id, user_text, reply, duration_ms))
+
+    def record_command(self, device_id, command_dict):
+        self._enqueue("commands", (time.time(), device_id, json.dumps(command_dict, ensure_ascii=False)))
+
+    def _enqueue(self, table, row):
+        try:
+            self._ensure_started()
+            self._queue.put_nowait((table, row))
+        except queue.Full:
+            # Never block a voice request on the log.
+            self._count_dropped(1)
+        except RuntimeError as e:  # the writer thread could not be started
+            logger.error("History record dropped: %s", e)
+            self._count_dropped(1)
+
+    def _count_dropped(self, count):
+        # Request threads and the writer both drop records.
+        with self._dropped_lock:
+            self.dropped += count
+
+    # Writer -------------------------------------------------------------
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    thread = threading.Thread(
+                        target=self._writer, name="history-writer", daemon=True
+                    )
+                    thread.start()
+                    self._thread = thread
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        connection = _connect(self.path)
+        try:
+            connection.executescript(SCHEMA)
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+
+    def _writer(self):
+        connection = None
+        last_compaction = 0.0
+        while not self._stopped.is_set() or not self._queue.empty():
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch and connection is None:
+                # Set up here rather than on a request thread; retried with
+                # the next batch if the database is unavailable.
+                try:
+                    connection = self._open()
+                except (OSError, sqlite3.Error) as e:
+                    logger.error("History database %s unavailable: %s", self.path, e)
+                    self._drop_batch(batch)
+                    continue
+            if batch:
+                self._write_batch(connection, batch)
+            if connection is not None and time.monotonic() - last_compaction >= self.compact_interval:
+                self.compact(connection)
+                last_compaction = time.monotonic()
+        if connection is not None:
+            connection.close()
+
+    def _drop_batch(self, batch):
+        self._count_dropped(len(batch))
+        for _ in batch:
+            self._queue.task_done()
+
+    def _write_batch(self, connection, batch):
+        try:
+            with connection:
+                for table in _INSERTS:
+                    rows = [row for t, row in batch if t == table]
+                    if rows:
+                        connection.executemany(_INSERTS[table], rows)
+        except sqlite3.Error as e:
+            logger.error("History write of %d record(s) failed: %s", len(batch), e)
+            self._count_dropped(len(batch))
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def compact(self, connection=None):
+        """Delete rows older than the retention period."""
+        own = connection is None
+        connection = connection or _connect(self.path)
+        cutoff = time.time() - self.retention_days * 86400
+        try:
+            with connection:
+                removed = sum(
+                    connection.execute(f"DELETE FROM {table} WHERE ts < ?", (cutoff,)).rowcount
+                    for table in _INSERTS
+                )
+            if removed:
+                logger.info("History compaction removed %d old row(s)", removed)
+        except sqlite3.Error as e:
+            logger.error("History compaction failed: %s", e)
+        finally:
+            if own:
+                connection.close()
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    # Queries ------------------------------------------------------------
+
+    def query(self, kind="conversations", device_id=None, since=None, limit=50):
+        """Return the newest rows of `kind` as dicts, newest first."""
+        if kind not in _INSERTS:
+            raise ValueError(f"Unknown history kind: {kind}")
+        clauses, params = [], []
+        if device_id is not None:
+            clauses.append("device_id = ?")
+            params.append(device_id)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(max(1, min(int(limit), 1000)))
+        if not os.path.exists(self.path):
+            return []  # nothing has been written yet
+        # Read-only: the schema is the writer's job, not every GET's.
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=10)
+        connection.row_factory = sqlite3.Row
+        try:
+            rows = connection.execute(
+                f"SELECT * FROM {kind}{where} ORDER BY ts DESC LIMIT ?", params
+            ).fetchall()
+        finally:
+            connection.close()
+        return [dict(row) for row in rows]
+
+
+history = LazyObject(lambda: HistoryStore(settings.history_path, settings.history_retention_days))
@@ -0,0 +1,29 @@
+"""Shared keep-alive HTTP session for outbound calls to external APIs."""
+
+import threading
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide requests.Session.
+
+    Reusing one session keeps DNS, SOCKS and TLS setup to api.groq.com and
+    OpenWeatherMap in its connection pool, so only the first call (or the
+    startup warm-up) pays for the handshakes.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # requests (and urllib3, certifi) load here, not at import time.
+                import requests  # type: ignore
+
+                _session = requests.Session()
+    return _session
+
+
+def proxies_for(proxy):
+    """Return a requests-style proxies dict for an optional proxy URL."""
+    return {"https": proxy, "http": proxy} if proxy else None
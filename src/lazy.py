@@ -0,0 +1,45 @@
+"""Module-level singletons built on first use.
+
+Singletons that read settings or touch the filesystem (lanes, stores,
+registries, hedgers) are wrapped in a LazyObject, so importing a module
+costs neither settings validation nor I/O; the object is built the first
+time one of its attributes is read or set.
+"""
+
+import threading
+
+
+class LazyObject:
+    """Proxy that calls `factory()` once, on first attribute access."""
+
+    __slots__ = ("_factory", "_instance", "_lock")
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _get(self):
+        instance = object.__getattribute__(self, "_instance")
+        if instance is None:
+            with object.__getattribute__(self, "_lock"):
+                instance = object.__getattribute__(self, "_instance")
+                if instance is None:
+                    instance = object.__getattribute__(self, "_factory")()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._get(), name)
+
+    def __len__(self):
+        return len(self._get())
+
+    def __repr__(self):
+        return f"LazyObject({self._get()!r})"
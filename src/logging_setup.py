@@ -0,0 +1,95 @@
+"""Non-blocking logging: request threads enqueue records, one thread writes.
+
+setup_logging() installs a queue handler on the root logger and a
+QueueListener that owns the real stream handler. The handler enqueues the
+record as is (the stock QueueHandler.prepare() would format it in the calling
+thread), so %-style merging, payload serialization and the write to stderr
+(the Docker json-file log) all happen on the listener thread. Log calls
+therefore pass values as arguments, never pre-formatted f-strings. Pre-forked
+workers get their own listener after fork.
+
+Large payloads (request JSON, Groq responses, reply texts) go through
+log_payload(): they are logged only at DEBUG or for a sampled fraction of
+requests, compacted and truncated, and serialized only when actually emitted.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+from src.settings import settings
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener = None
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread."""
+
+    def prepare(self, record):
+        # Arguments are formatted later, so a value mutated after the call may
+        # log its newer state; log calls here pass immutable or done-with values.
+        return record
+
+
+def _start_listener(level):
+    global _listener
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(level=None):
+    """Route all logging through a queue drained by a background thread."""
+    if _listener is not None:
+        return
+    level = level or settings.log_level
+    _start_listener(level)
+    atexit.register(stop_logging)
+    # The listener thread does not survive fork(); workers start their own.
+    os.register_at_fork(after_in_child=lambda: _listener is not None and _start_listener(level))
+
+
+class _Payload:
+    """Defers JSON serialization and truncation until the record is formatted."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        text = self.value if isinstance(self.value, str) else json.dumps(self.value, ensure_ascii=False)
+        limit = settings.log_payload_max_chars
+        if limit and len(text) > limit:
+            return f"{text[:limit]}... [{len(text) - limit} more chars]"
+        return text
+
+
+def log_payload(logger, label, value):
+    """Log a large payload at DEBUG, or at INFO for a sampled share of calls."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s", label, _Payload(value))
+    elif settings.log_payload_sample_rate > 0 and random.random() < settings.log_payload_sample_rate:
+        logger.info("%s (sampled): %s", label, _Payload(value))
@@ -0,0 +1,110 @@
+"""Pre-fork serving: N worker processes sharing one port via SO_REUSEPORT.
+
+Every worker binds its own listening socket with SO_REUSEPORT, so the kernel
+spreads incoming connections across processes and the relay scales past one
+GIL. The parent only supervises: it restarts workers that die and forwards
+SIGTERM/SIGINT so workers finish in-flight requests and exit cleanly.
+Workers are forked before any background thread is started; each worker runs
+its own startup (warm-up, websocket, transports) after the fork.
+"""
+
+import http.server
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between restarts of a crashing worker slot.
+RESPAWN_DELAY = 1.0
+
+
+class ReusePortMixin:
+    """Sets SO_REUSEPORT before bind so several processes can share the port."""
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+class ReusePortHTTPServer(ReusePortMixin, http.server.ThreadingHTTPServer):
+    """Threading HTTP server whose socket can be shared across processes."""
+
+    daemon_threads = True
+
+
+def serve_worker(httpd):
+    """Serve until SIGTERM/SIGINT, then stop accepting and return."""
+
+    def _stop(_signum, _frame):
+        # shutdown() blocks until serve_forever() returns, so call it elsewhere.
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    httpd.serve_forever()
+
+
+def run_prefork(workers, worker_main):
+    """Fork `workers` processes running `worker_main(index)` and supervise them.
+
+    Returns when the parent receives SIGTERM/SIGINT and all workers exited.
+    """
+    children = {}  # pid -> worker index
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            # Child: default signal handling, then serve until told to stop.
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                worker_main(index)
+            except BaseException as e:  # never fall back into the parent's loop
+                logger.error("Worker %s crashed: %s", index, e)
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        children[pid] = index
+        logger.info("Started worker %s (pid %s)", index, pid)
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(workers):
+        spawn(index)
+
+    last_spawn = {}
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        logger.error("Worker %s (pid %s) exited with status %s; restarting", index, pid, status)
+        since_last = time.monotonic() - last_spawn.get(index, 0.0)
+        if since_last < RESPAWN_DELAY:
+            time.sleep(RESPAWN_DELAY - since_last)
+        last_spawn[index] = time.monotonic()
+        if not stopping:
+            spawn(index)
+    logger.info("All workers stopped")
@@ -0,0 +1,135 @@
+"""On-demand CPU and memory profiling for the debug endpoints.
+
+Nothing here runs until an endpoint is called: the CPU profiler is a
+sampler that reads every thread's current stack through
+sys._current_frames() for the requested duration and then stops, and
+tracemalloc is only enabled between an explicit start and stop.
+"""
+
+import collections
+import math
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# Upper bounds for one profiling request.
+MAX_PROFILE_SECONDS = 60.0
+MIN_INTERVAL_SECONDS = 0.001
+
+_profile_lock = threading.Lock()
+_memory_lock = threading.Lock()
+_baseline = None
+
+
+class ProfilerBusy(Exception):
+    """Another CPU profile is already running."""
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(seconds, interval=0.005):
+    """Sample all threads for `seconds`; return Counter of stack tuples.
+
+    Each stack is (thread name, outermost frame, ..., innermost frame).
+    Raises ValueError for a non-finite duration or interval.
+    """
+    if not (math.isfinite(seconds) and math.isfinite(interval)):
+        raise ValueError("seconds and interval must be finite numbers")
+    seconds = min(max(seconds, 0.0), MAX_PROFILE_SECONDS)
+    interval = max(interval, MIN_INTERVAL_SECONDS)
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("a CPU profile is already running")
+    try:
+        own = threading.get_ident()
+        counts = collections.Counter()
+        deadline = time.monotonic() + seconds
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                counts[tuple(reversed(stack))] += 1
+            if time.monotonic() >= deadline:
+                return counts
+            time.sleep(interval)
+    finally:
+        _profile_lock.release()
+
+
+def format_collapsed(counts):
+    """Collapsed-stack text ("a;b;c 42" per line), ready for flamegraph tools."""
+    return "".join(
+        f"{';'.join(stack)} {count}\n" for stack, count in counts.most_common()
+    )
+
+
+def format_top(counts, limit=30):
+    """Flat per-function table of own (innermost) and total samples."""
+    own, total = collections.Counter(), collections.Counter()
+    samples = sum(counts.values()) or 1
+    for stack, count in counts.items():
+        own[stack[-1]] += count
+        for label in set(stack[1:]):
+            total[label] += count
+    lines = [f"{'own%':>6} {'total%':>7}  function ({samples} samples)"]
+    for label, _ in total.most_common(limit):
+        lines.append(
+            f"{100.0 * own[label] / samples:6.1f} {100.0 * total[label] / samples:7.1f}  {label}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def memory_start(frames=10):
+    """Start tracemalloc (if needed) and take the baseline snapshot."""
+    global _baseline
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        _baseline = _snapshot()
+        return f"tracemalloc started ({frames} frames), baseline taken\n"
+
+
+def memory_snapshot(limit=20):
+    """Top allocation sites by size right now."""
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running; start it first")
+        stats = _snapshot().statistics("lineno")[:limit]
+        current, peak = tracemalloc.get_traced_memory()
+    header = f"traced: {current / 1024:.1f} KiB, peak: {peak / 1024:.1f} KiB\n"
+    return header + "".join(f"{stat}\n" for stat in stats)
+
+
+def memory_diff(limit=20):
+    """Top growth since the baseline snapshot."""
+    with _memory_lock:
+        if not tracemalloc.is_tracing() or _baseline is None:
+            raise RuntimeError("tracemalloc is not running; start it first")
+        stats = _snapshot().compare_to(_baseline, "lineno")[:limit]
+    return "".join(f"{stat}\n" for stat in stats)
+
+
+def memory_stop():
+    """Stop tracemalloc and drop the baseline, releasing its overhead."""
+    global _baseline
+    with _memory_lock:
+        _baseline = None
+        tracemalloc.stop()
+    return "tracemalloc stopped\n"
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
@@ -6,6 +6,10 @@ from datetime import datetime
 
 from src.settings import settings
 from src.weather import get_weather_summary
+from src.enrichment import ProviderGroup
+from src.device_state import device_states
+from src.deadline import DeadlineExceeded, upstream_timeout
+from src.prompt_slicing import slice_prompt
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +26,7 @@ def load_system_prompt():
     if os.path.exists(prompt_path):
         with open(prompt_path, "r", encoding="utf-8") as f:
             content = f.read()
-            logger.info(f"System prompt loaded from {prompt_path}")
+            logger.debug("System prompt loaded from %s", prompt_path)
             return content
 
     # Fallback: read default and create data file
@@ -32,25 +36,63 @@ def load_system_prompt():
     os.makedirs(os.path.dirname(prompt_path), exist_ok=True)
     with open(prompt_path, "w", encoding="utf-8") as pf:
         pf.write(default_content)
-    logger.info(f"System prompt file created at {prompt_path} from {DEFAULT_PROMPT_PATH}")
+    logger.info("System prompt file created at %s from %s", prompt_path, DEFAULT_PROMPT_PATH)
     return default_content
 
 
-def build_system_prompt():
-    """Prefix SYSTEM_PROMPT with current time-of-day, date, and current weather."""
+def time_provider():
+    """Current date, time-of-day and week day."""
     now = datetime.now()
     date_time_text = now.strftime("%Y-%m-%d, %H:%M") #2025-09-18, 14:05
     week_day = now.strftime("%A") #Tuesday
     day_time = now.strftime("%p")
-    prefix = f"Сейчас (дата и время): {date_time_text}, {day_time}, {week_day}.\n"
+    return f"Сейчас (дата и время): {date_time_text}, {day_time}, {week_day}."
 
+
+def weather_provider():
+    """Current weather in settings.weather_city, or None if unavailable."""
     weather_summary = get_weather_summary(
         settings.weather_city, settings.weather_api_key, settings.groq_proxy
     )
-    if weather_summary is not None:
-        prefix += f"Погода в {settings.weather_city}: {weather_summary}.\n"
+    if weather_summary is None:
+        return None
+    return f"Погода в {settings.weather_city}: {weather_summary}."
+
+
+# Dynamic context sources for the <<<<<TDW>>>>> placeholder, in prompt order.
+# Register further providers with prompt_providers.register(name, fetch, deadline).
+prompt_providers = ProviderGroup()
+prompt_providers.register("time", time_provider, deadline=0.5)
+prompt_providers.register("weather", weather_provider, deadline=lambda: settings.weather_deadline_seconds)
+prompt_providers.register("devices", lambda: device_states.snippet(), deadline=0.5)
+
+
+def gather_enrichment():
+    """Dynamic context lines for the <<<<<TDW>>>>> placeholder, within the prompt budget.
+
+    Computed once and passed to build_system_prompt() for every item of a
+    batch, so the batch shares one weather lookup.
+    """
+    try:
+        budget = upstream_timeout(settings.prompt_budget_seconds)
+    except DeadlineExceeded:
+        budget = 0.0
+    lines = prompt_providers.gather(budget)
+    return "".join(f"{line}\n" for _name, line in lines)
+
+
+def build_system_prompt(text=None, enrichment=None):
+    """Prefix SYSTEM_PROMPT with current time-of-day, date, and current weather.
+
+    With PROMPT_SLICING enabled and an utterance given, only the core sections
+    and those relevant to `text` are kept. `enrichment` is a precomputed
+    gather_enrichment() result; by default it is gathered now.
+    """
+    prefix = gather_enrichment() if enrichment is None else enrichment
 
     system_prompt = load_system_prompt()
+    if settings.prompt_slicing and text:
+        system_prompt = slice_prompt(system_prompt, text)
     system_prompt = system_prompt.replace("<<<<<TDW>>>>>", prefix)
 
     return system_prompt
@@ -0,0 +1,122 @@
+"""Relevance-based slicing of the system prompt.
+
+The prompt is split into sections at "### " headings. Core sections (persona,
+input/output rules, the time/weather placeholder) are always sent; the rest
+are indexed by keyword stems and only included when the utterance mentions
+one of them. A section can carry explicit tags in an HTML comment:
+
+    <!-- core -->
+    <!-- keywords: свет, лампа, кондиционер -->
+
+Comments are stripped before the prompt is sent.
+"""
+
+import logging
+import re
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+Section = namedtuple("Section", "heading text core stems")
+
+# Headings of the default prompt that are always sent.
+CORE_HEADINGS = frozenset({
+    "system", "input", "instructions (general)", "current time&data&weather",
+})
+PLACEHOLDER = "<<<<<TDW>>>>>"
+
+_HEADING_RE = re.compile(r"^### ", re.MULTILINE)
+_TAG_RE = re.compile(r"<!--\s*(core|keywords:([^>]*?))\s*-->\s*\n?", re.IGNORECASE)
+_WORD_RE = re.compile(r"\w+")
+
+# Short words match too much; body tokens below this length are not indexed.
+MIN_TOKEN_LENGTH = 4
+STEM_LENGTH = 5
+_ENDING_LETTERS = "аеёиоуыэюяйь"
+
+
+def stem(token):
+    """Crude prefix stemming, enough to match Russian word forms.
+
+    "лампа", "лампы" and "лампочка" all become "ламп".
+    """
+    result = token.lower()[:STEM_LENGTH]
+    while len(result) > 3 and result[-1] in _ENDING_LETTERS:
+        result = result[:-1]
+    return result
+
+
+def _stems(text, min_length=MIN_TOKEN_LENGTH):
+    return {stem(t) for t in _WORD_RE.findall(text) if len(t) >= min_length}
+
+
+def split_sections(prompt):
+    """Split a prompt into Sections at level-3 headings."""
+    starts = [m.start() for m in _HEADING_RE.finditer(prompt)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    sections = []
+    for begin, end in zip(starts, starts[1:] + [len(prompt)]):
+        raw = prompt[begin:end]
+        first_line = raw.split("\n", 1)[0]
+        heading = first_line[4:].strip() if first_line.startswith("### ") else ""
+        core = heading.lower() in CORE_HEADINGS or PLACEHOLDER in raw or not heading
+        keywords = []
+        for match in _TAG_RE.finditer(raw):
+            if match.group(1).lower() == "core":
+                core = True
+            else:
+                keywords.extend(k.strip() for k in match.group(2).split(","))
+        text = _TAG_RE.sub("", raw)
+        stems = _stems(text) | {stem(k) for k in keywords if k}
+        sections.append(Section(heading, text, core, frozenset(stems)))
+    return sections
+
+
+class PromptIndex:
+    """Inverted index stem -> optional sections for one prompt text."""
+
+    def __init__(self, prompt):
+        self.prompt = prompt
+        self.sections = split_sections(prompt)
+        optional = [i for i, s in enumerate(self.sections) if not s.core]
+        counts = {}
+        for i in optional:
+            for s in self.sections[i].stems:
+                counts.setdefault(s, []).append(i)
+        # A stem found in most optional sections says nothing about relevance.
+        limit = max(1, len(optional) // 2)
+        self.index = {s: ids for s, ids in counts.items() if len(ids) <= limit}
+
+    def select(self, utterance):
+        """Return the prompt with core sections plus the relevant ones."""
+        wanted = set()
+        # Explicit keywords may be short ("кто"), so the utterance is not filtered.
+        for s in _stems(utterance, min_length=1):
+            wanted.update(self.index.get(s, ()))
+        return "".join(
+            section.text
+            for i, section in enumerate(self.sections)
+            if section.core or i in wanted
+        )
+
+
+_cached_index = None
+
+
+def slice_prompt(prompt, utterance):
+    """Return the prompt reduced to the sections relevant to the utterance.
+
+    The index is rebuilt only when the prompt text changes.
+    """
+    global _cached_index
+    index = _cached_index
+    if index is None or index.prompt != prompt:
+        index = _cached_index = PromptIndex(prompt)
+    sliced = index.select(utterance)
+    saved = len(prompt) - len(sliced)
+    # ~4 characters per token is the usual rough estimate.
+    logger.info(
+        "Prompt slicing: %d -> %d chars (~%d tokens saved)", len(prompt), len(sliced), saved // 4
+    )
+    return sliced
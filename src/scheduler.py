@@ -0,0 +1,265 @@
+"""Delayed and timed device commands.
+
+A command payload may end with a time suffix: "room_light:off@+10m" fires in
+ten minutes, "room_ac:off@22:30" at the next 22:30 local time, and
+"room_light@cancel" drops whatever is pending for the device. Each device has
+at most one pending job; scheduling another one replaces it.
+
+One background thread serves every timer from a heap ordered by due time and
+sleeps on a condition variable until the earliest job (or a new, earlier
+one) is due, so thousands of pending timers cost a heap entry each rather
+than a thread. Jobs live in SQLite (WAL) under data/, so a restart reloads
+them. Pre-forked workers each load the same table; a job is claimed by
+deleting its row, and only the worker whose DELETE removed it dispatches, so
+every job fires exactly once. Row IDs are AUTOINCREMENT, so a deleted job's ID
+is never handed to a later one.
+"""
+
+import heapq
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled_commands (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id TEXT NOT NULL UNIQUE,
+    due REAL NOT NULL,
+    command TEXT NOT NULL,
+    source_device TEXT
+)
+"""
+
+CANCEL = "cancel"
+# Longest accepted relative delay.
+MAX_DELAY_SECONDS = 24 * 3600
+# The scheduler thread re-checks the clock at least this often, so a wall
+# clock adjustment never leaves a job sleeping for hours.
+MAX_WAIT_SECONDS = 30.0
+
+SCHEDULE_SUFFIX_RE = re.compile(r"^(.*?)\s*@\s*([^@\s]+)\s*$", re.DOTALL)
+_RELATIVE_RE = re.compile(r"^\+(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?$", re.IGNORECASE)
+_CLOCK_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+def split_schedule(payload_text):
+    """Split "room_light:off@+10m" into ("room_light:off", "+10m").
+
+    Payloads without a suffix come back as (payload_text, None).
+    """
+    match = SCHEDULE_SUFFIX_RE.match(payload_text)
+    if match is None:
+        return payload_text, None
+    return match.group(1), match.group(2).lower()
+
+
+def parse_when(when, now=None):
+    """Unix time for "+10m" / "+1h30m" / "+45s" or "22:30"; ValueError otherwise."""
+    now = now or datetime.now()
+    text = when.strip()
+    relative = _RELATIVE_RE.match(text)
+    if relative and any(relative.groups()):
+        hours, minutes, seconds = (int(group or 0) for group in relative.groups())
+        delay = hours * 3600 + minutes * 60 + seconds
+        if not 0 < delay <= MAX_DELAY_SECONDS:
+            raise ValueError(f"delay '{when}' must be between 1s and 24h")
+        return now.timestamp() + delay
+    clock = _CLOCK_RE.match(text)
+    if clock:
+        due = now.replace(hour=int(clock.group(1)), minute=int(clock.group(2)),
+                          second=0, microsecond=0)
+        if due <= now:
+            due += timedelta(days=1)
+        return due.timestamp()
+    raise ValueError(f"unknown time '{when}', expected +10m or HH:MM")
+
+
+class CommandScheduler:
+    """Heap of pending jobs served by one thread, persisted in SQLite."""
+
+    def __init__(self, path, dispatch, max_lateness=600.0):
+        self.path = path
+        self._dispatch = dispatch
+        self.max_lateness = max_lateness
+        self._heap = []        # (due, job_id); stale entries are skipped lazily
+        self._jobs = {}        # job_id -> (device_id, due, command, source_device)
+        self._by_device = {}   # device_id -> job_id
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._thread = None
+        self._stopped = False
+        self.counters = {"scheduled": 0, "replaced": 0, "cancelled": 0,
+                         "dispatched": 0, "dropped_late": 0}
+
+    def _connection(self):
+        # One connection per thread, reopened after fork.
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    # Lifecycle ----------------------------------------------------------
+
+    def start(self):
+        """Load persisted jobs and start the timer thread (idempotent)."""
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            try:
+                rows = self._connection().execute(
+                    "SELECT id, device_id, due, command, source_device FROM scheduled_commands"
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.error("Loading scheduled commands failed: %s", e)
+                rows = []
+            for job_id, device_id, due, command, source_device in rows:
+                self._add(job_id, device_id, due, json.loads(command), source_device)
+            if rows:
+                logger.info("Loaded %d pending scheduled command(s)", len(rows))
+            self._thread = threading.Thread(target=self._run, name="command-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # Request path -------------------------------------------------------
+
+    def schedule(self, command, due, source_device=None):
+        """Persist `command` to fire at unix time `due`, replacing the
+        device's pending job. Returns the job ID, or None if it was not saved."""
+        self.start()
+        device_id = command["device_id"]
+        try:
+            job_id = self._connection().execute(
+                "INSERT OR REPLACE INTO scheduled_commands (device_id, due, command, source_device) "
+                "VALUES (?, ?, ?, ?)",
+                (device_id, due, json.dumps(command, ensure_ascii=False), source_device),
+            ).lastrowid
+        except sqlite3.Error as e:
+            logger.error("Scheduling command for '%s' failed: %s", device_id, e)
+            return None
+        with self._condition:
+            if self._forget_device(device_id):
+                self.counters["replaced"] += 1
+            self._add(job_id, device_id, due, command, source_device)
+            self.counters["scheduled"] += 1
+            # Wake the thread in case this job is now the earliest.
+            self._condition.notify()
+        return job_id
+
+    def cancel(self, device_id):
+        """Drop the device's pending job; returns True if there was one."""
+        try:
+            removed = self._connection().execute(
+                "DELETE FROM scheduled_commands WHERE device_id = ?", (device_id,)
+            ).rowcount
+        except sqlite3.Error as e:
+            logger.error("Cancelling scheduled command for '%s' failed: %s", device_id, e)
+            removed = 0
+        with self._condition:
+            removed = self._forget_device(device_id) or removed
+            if removed:
+                self.counters["cancelled"] += 1
+        return bool(removed)
+
+    def pending(self):
+        """All persisted jobs (from every worker), earliest first."""
+        rows = self._connection().execute(
+            "SELECT device_id, due, command, source_device FROM scheduled_commands ORDER BY due"
+        ).fetchall()
+        return [
+            {"device_id": device_id, "due": due, "command": json.loads(command),
+             "source_device": source_device}
+            for device_id, due, command, source_device in rows
+        ]
+
+    def snapshot(self):
+        with self._condition:
+            return dict(self.counters, pending=len(self._jobs))
+
+    # Timer thread -------------------------------------------------------
+
+    def _add(self, job_id, device_id, due, command, source_device):
+        self._jobs[job_id] = (device_id, due, command, source_device)
+        self._by_device[device_id] = job_id
+        heapq.heappush(self._heap, (due, job_id))
+
+    def _forget_device(self, device_id):
+        job_id = self._by_device.pop(device_id, None)
+        return job_id is not None and self._jobs.pop(job_id, None) is not None
+
+    def _is_live(self, due, job_id):
+        # A heap entry is stale once its job was cancelled, replaced or fired.
+        job = self._jobs.get(job_id)
+        return job is not None and job[1] == due
+
+    def _next_due(self):
+        """Pop the next due job, or wait; returns (job_id, job) or None on stop."""
+        with self._condition:
+            while not self._stopped:
+                while self._heap and not self._is_live(*self._heap[0]):
+                    heapq.heappop(self._heap)
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    _due, job_id = heapq.heappop(self._heap)
+                    job = self._jobs.pop(job_id)
+                    if self._by_device.get(job[0]) == job_id:
+                        del self._by_device[job[0]]
+                    return job_id, job
+                wait = self._heap[0][0] - now if self._heap else MAX_WAIT_SECONDS
+                self._condition.wait(min(wait, MAX_WAIT_SECONDS))
+        return None
+
+    def _run(self):
+        while True:
+            item = self._next_due()
+            if item is None:
+                return
+            self._fire(*item)
+
+    def _fire(self, job_id, job):
+        device_id, due, command, source_device = job
+        try:
+            # Exactly-once claim: another worker or a cancel may have got there first.
+            claimed = self._connection().execute(
+                "DELETE FROM scheduled_commands WHERE id = ? AND due = ?", (job_id, due)
+            ).rowcount
+        except sqlite3.Error as e:
+            logger.error("Claiming scheduled command for '%s' failed: %s", device_id, e)
+            return
+        if not claimed:
+            return
+        lateness = time.time() - due
+        if lateness > self.max_lateness:
+            logger.warning(
+                "Dropped scheduled command for '%s': %.0f s late", device_id, lateness
+            )
+            with self._condition:
+                self.counters["dropped_late"] += 1
+            return
+        logger.info("Firing scheduled command %s", command)
+        try:
+            self._dispatch(command, source_device)
+        except Exception as e:  # the timer thread must survive a bad dispatch
+            logger.error("Scheduled command for '%s' failed: %s", device_id, e)
+        with self._condition:
+            self.counters["dispatched"] += 1
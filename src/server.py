@@ -1,115 +1,500 @@
 """HTTP server that processes voice requests via Groq API."""
 
+import contextvars
+import hmac
 import http.server
-import socketserver
 import json
 import logging
-from datetime import datetime
+import os
+import select
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
 
-import urllib3
+from pydantic import ValidationError
 
-from src.settings import settings
-from src.groq_client import call_groq_api
+from src.settings import settings, get_settings
+from src.lazy import LazyObject
+from src.groq_client import call_groq_api, stream_groq_api, RATE_LIMITED_REPLY
+from src.prompt import gather_enrichment
 from src.stt_client import transcribe_audio
-from src.text import extract_request_text
+from src.text import extract_request_text, extract_device_id, normalize_request_text
+from src.singleflight import SingleFlight
+from src.skills import answer_locally
 from src.context import append_context
+from src.warmup import start_warmup, is_ready, readiness_report
+from src.device_state import start_device_state_sync
+from src.commands import get_transport, command_scheduler
+from src.admission import stt_lane, chat_lane, command_lane
+from src.tiers import classify, FAST
+from src import stats
+from src import profiling
+from src.history import history, current_device
+from src.prefork import ReusePortMixin, run_prefork, serve_worker
+from src.shared_store import shared_store
+from src.logging_setup import setup_logging, log_payload
+from src.deadline import (
+    DEADLINE_HEADER, parse_deadline_header, set_deadline, reset_deadline,
+    current_deadline,
+)
 
-logging.basicConfig(level=settings.log_level)
 logger = logging.getLogger(__name__)
 
-# Disable InsecureRequestWarning globally for unverified HTTPS requests
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# Identical texts from HA retries or several satellites share one Groq call,
+# so the model is asked, and its commands are dispatched, only once.
+# In pre-fork mode finished answers are also shared across worker processes.
+chat_flight = LazyObject(lambda: SingleFlight(
+    settings.dedup_window_seconds,
+    store=shared_store if settings.workers > 1 else None,
+    namespace="chat",
+))
+
+# Degraded replies when a lane is saturated.
+BUSY_REPLY = "Я сейчас занята куда более важными делами, чем ты. Повтори позже."
+EMPTY_TRANSCRIPT = b'{"text": ""}'
+
+
+def answer_text(text, device_id=None, enrichment=None):
+    """Run one utterance through admission control, dedup and Groq.
+
+    `enrichment` is the prompt context precomputed for a batch, if any.
+    """
+    device_token = current_device.set(device_id)
+    try:
+        started = time.monotonic()
+        result_text = _answer_text(text, enrichment)
+        history.record_conversation(
+            device_id, text, result_text, int((time.monotonic() - started) * 1000)
+        )
+        return result_text
+    finally:
+        current_device.reset(device_token)
+
+
+def _answer_text(text, enrichment=None):
+    # Time/date/weather questions are answered from local data in milliseconds.
+    if settings.local_skills_enabled:
+        local_reply = answer_locally(text)
+        if local_reply is not None:
+            return local_reply
+
+    # Short commands get their own lane so chat bursts cannot starve them.
+    lane = command_lane if classify(text).name == FAST else chat_lane
+    deadline = current_deadline()
+    max_wait = max(0.0, deadline.remaining()) if deadline is not None else None
+    with lane.slot(max_wait) as admitted:
+        if not admitted:
+            return BUSY_REPLY
+        result_text, shared = chat_flight.do(
+            normalize_request_text(text),
+            lambda: call_groq_api(text, enrichment),
+            keep=lambda r: not r.startswith("Ошибка"),
+        )
+    if shared:
+        logger.info("Duplicate request: reused the in-flight/recent answer")
+    else:
+        try:
+            append_context(text, result_text)
+        except Exception as e:
+            logger.error("Context append failed: %s", e)
+    return result_text
+
+
+# Batch items run here; each still passes through its admission lane.
+_batch_pool = LazyObject(lambda: ThreadPoolExecutor(
+    max_workers=settings.batch_max_concurrency, thread_name_prefix="batch"
+))
+
+
+def _batch_status(reply):
+    if reply == BUSY_REPLY:
+        return "busy"
+    if reply == RATE_LIMITED_REPLY:
+        return "rate_limited"
+    if reply.startswith("Ошибка"):
+        return "error"
+    return "ok"
+
+
+def _answer_batch_item(item, enrichment):
+    try:
+        if not isinstance(item, dict):
+            raise ValueError("Invalid payload: batch item must be an object")
+        text = extract_request_text(item)
+        reply = answer_text(text, extract_device_id(item), enrichment)
+    except ValueError as e:
+        return {"status": "invalid", "error": str(e)}
+    except Exception as e:  # one failing item must not sink the batch
+        logger.error("Batch item failed: %s", e)
+        return {"status": "error", "error": str(e)}
+    return {"status": _batch_status(reply), "text": reply}
+
+
+def answer_batch(items):
+    """Answer `items` ({"request": ..., "device": ...} objects) concurrently.
+
+    The prompt context (time, weather, device states) is gathered once for
+    the whole batch. Returns one {"status", "text" | "error"} dict per item,
+    in input order.
+    """
+    enrichment = gather_enrichment()
+    # Each item gets its own copy of the request context (deadline).
+    futures = [
+        _batch_pool.submit(contextvars.copy_context().run, _answer_batch_item, item, enrichment)
+        for item in items
+    ]
+    return [future.result() for future in futures]
+
+
+def stream_answer(text, device_id=None):
+    """Like answer_text, but yield the reply in pieces as Groq produces it.
+
+    Identical requests share one stream through chat_flight, so the model is
+    asked and its commands are dispatched once; duplicates get the leader's
+    whole reply as one piece when it is complete.
+    """
+    device_token = current_device.set(device_id)
+    try:
+        started = time.monotonic()
+        pieces = []
+        shared = yield from _collect(_stream_answer(text), pieces)
+        result_text = "".join(pieces)
+        history.record_conversation(
+            device_id, text, result_text, int((time.monotonic() - started) * 1000)
+        )
+        if shared:
+            logger.info("Duplicate request: reused the in-flight/recent answer")
+        else:
+            try:
+                append_context(text, result_text)
+            except Exception as e:
+                logger.error("Context append failed: %s", e)
+    finally:
+        current_device.reset(device_token)
+
+
+def _collect(source, pieces):
+    """Yield from `source`, appending each piece to `pieces`; returns its value."""
+    try:
+        while True:
+            try:
+                piece = next(source)
+            except StopIteration as stop:
+                return stop.value
+            pieces.append(piece)
+            yield piece
+    finally:
+        source.close()
+
+
+def _stream_answer(text):
+    """Yield the reply's pieces; returns True if it was another request's."""
+    if settings.local_skills_enabled:
+        local_reply = answer_locally(text)
+        if local_reply is not None:
+            yield local_reply
+            return False
+    lane = command_lane if classify(text).name == FAST else chat_lane
+    deadline = current_deadline()
+    max_wait = max(0.0, deadline.remaining()) if deadline is not None else None
+    with lane.slot(max_wait) as admitted:
+        if not admitted:
+            yield BUSY_REPLY
+            return False
+        return (yield from chat_flight.stream(
+            normalize_request_text(text),
+            lambda: stream_groq_api(text),
+            keep=lambda r: not r.startswith("Ошибка"),
+        ))
 
 
 class RequestHandler(http.server.BaseHTTPRequestHandler):
-    """Custom HTTP request handler that processes voice requests via Groq API."""
+    """Custom HTTP request handler that processes voice requests via Groq API.
 
-    def do_POST(self):
-        """Handle POST requests."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    Speaks HTTP/1.1 with persistent connections: every response carries a
+    Content-Length, and idle connections are closed after keepalive_timeout.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def timeout(self):
+        # Socket timeout: an idle keep-alive connection is dropped after this long.
+        return settings.keepalive_timeout
+
+    def do_GET(self):
+        """Handle GET requests: liveness and readiness probes."""
+        url = urlparse(self.path)
+        path = url.path
+        if path == "/healthz":
+            # Liveness: the process is up and serving HTTP.
+            self._send_json(200, {"status": "ok"})
+        elif path == "/readyz":
+            # Readiness: the startup warm-up has finished.
+            self._send_json(200 if is_ready() else 503, readiness_report())
+        elif path == "/stats":
+            # Runtime counters: queue depth and wait time per lane, etc.
+            self._send_json(200, stats.collect())
+        elif path == "/history":
+            self._handle_history(parse_qs(url.query))
+        elif path.startswith("/debug/") and settings.debug_token:
+            self._handle_debug(path, parse_qs(url.query))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _handle_history(self, query):
+        """GET /history?kind=conversations|commands&device=...&since=...&limit=..."""
+        def arg(name, default=None):
+            return query.get(name, [default])[0]
+
+        try:
+            since = arg("since")
+            rows = history.query(
+                kind=arg("kind", "conversations"),
+                device_id=arg("device"),
+                since=float(since) if since is not None else None,
+                limit=int(arg("limit", 50)),
+            )
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except (sqlite3.Error, OSError) as e:
+            logger.error("History query failed: %s", e)
+            self._send_json(500, {"error": f"History unavailable: {str(e)}"})
+            return
+        self._send_json(200, {"items": rows})
+
+    def _handle_debug(self, path, query):
+        """Profiling endpoints, guarded by the X-Debug-Token header.
+
+        GET /debug/profile?seconds=5&interval=0.005&format=collapsed|top
+        GET /debug/memory?action=start|snapshot|diff|stop&limit=20
+        """
+        token = self.headers.get("X-Debug-Token", "")
+        if not hmac.compare_digest(token.encode(), settings.debug_token.encode()):
+            self._send_json(403, {"error": "forbidden"})
+            return
+
+        def arg(name, default):
+            return query.get(name, [default])[0]
+
+        try:
+            if path == "/debug/profile":
+                counts = profiling.sample_stacks(
+                    float(arg("seconds", 5)), float(arg("interval", 0.005))
+                )
+                if arg("format", "collapsed") == "top":
+                    text = profiling.format_top(counts, int(arg("limit", 30)))
+                else:
+                    text = profiling.format_collapsed(counts)
+            elif path == "/debug/memory":
+                action = arg("action", "snapshot")
+                limit = int(arg("limit", 20))
+                if action == "start":
+                    text = profiling.memory_start(int(arg("frames", 10)))
+                elif action == "snapshot":
+                    text = profiling.memory_snapshot(limit)
+                elif action == "diff":
+                    text = profiling.memory_diff(limit)
+                elif action == "stop":
+                    text = profiling.memory_stop()
+                else:
+                    raise ValueError(f"Unknown action: {action}")
+            else:
+                self._send_json(404, {"error": "not found"})
+                return
+        except profiling.ProfilerBusy as e:
+            self._send_json(409, {"error": str(e)})
+            return
+        except (ValueError, RuntimeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        self._send_body(200, "text/plain; charset=utf-8", text.encode("utf-8"))
+
+    def _send_body(self, status, content_type, body):
+        """Send a complete response framed by Content-Length (keep-alive safe)."""
+        self.send_response(status)
+        self.send_header("Content-type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self._send_body(status, "application/json", body)
+
+    def _send_text(self, text):
+        # The voice endpoint always answers 200 with plain text, even on errors.
+        self._send_body(200, "text/plain; charset=utf-8", text.encode("utf-8"))
+
+    def _send_stream(self, pieces):
+        """Send text pieces as they are produced, with chunked transfer encoding."""
+        self.send_response(200)
+        self.send_header("Content-type", "text/plain; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for piece in pieces:
+                data = piece.encode("utf-8")
+                if data:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except Exception as e:
+            # Headers are already sent, so no second response can follow:
+            # drop the connection and let the client see a truncated body.
+            logger.error("Streamed reply failed: %s", e)
+            self.close_connection = True
+        finally:
+            # A client that went away stops generation (and command dispatch).
+            pieces.close()
+
+    def _read_body(self):
+        """Read the request body framed by Content-Length or chunked encoding."""
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            chunks = []
+            while True:
+                size_line = self.rfile.readline(65537)
+                size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+                if size == 0:
+                    # Skip optional trailers up to the terminating empty line.
+                    while self.rfile.readline(65537) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline(65537)  # CRLF after each chunk
         content_length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(content_length) if content_length > 0 else b""
+
+    def _client_disconnected(self):
+        """True if the client closed its side of the connection."""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            if not readable:
+                return False
+            return self.connection.recv(1, socket.MSG_PEEK) == b""
+        except (OSError, ValueError):
+            return True
 
-        logger.info(f"\n[{timestamp}] POST {self.path}")
+    def do_POST(self):
+        """Handle POST requests within the caller's deadline, if it sent one."""
+        deadline = parse_deadline_header(
+            self.headers.get(DEADLINE_HEADER),
+            settings.deadline_margin_seconds,
+            self._client_disconnected,
+        )
+        token = set_deadline(deadline)
+        try:
+            self._handle_post()
+        finally:
+            reset_deadline(token)
+
+    def _handle_post(self):
+        logger.info("POST %s", self.path)
+
+        try:
+            body = self._read_body()
+        except (ValueError, OSError) as e:
+            # The framing is broken, so the connection cannot be reused.
+            self.close_connection = True
+            error_msg = f"Request processing error: {str(e)}"
+            logger.error(error_msg)
+            if self.path.endswith("/audio/transcriptions"):
+                self._send_body(200, "application/json", EMPTY_TRANSCRIPT)
+            else:
+                self._send_text(f"Ошибка: {error_msg}")
+            return
 
         # Route: OpenAI-compatible STT proxy to Groq Whisper.
         # Match by path suffix so it works regardless of any prefix the
         # caller prepends (e.g. /v1/audio/transcriptions).
         if self.path.endswith("/audio/transcriptions"):
-            self._handle_transcription(content_length)
+            self._handle_transcription(body)
             return
 
-        if content_length > 0:
-            try:
-                body = self.rfile.read(content_length)
-                body_text = body.decode('utf-8')
-                json_data = json.loads(body_text)
-
-                logger.info(f"Received JSON: {json.dumps(json_data, indent=2, ensure_ascii=False)}")
-
-                # Extract text field and call Groq API
-                try:
-                    text = extract_request_text(json_data)
-                    logger.info(f"Processing text: {text}")
-                    result_text = call_groq_api(text)
-                    try:
-                        append_context(text, result_text)
-                    except Exception as e:
-                        logger.error(f"Context append failed: {str(e)}")
-
-                    # Always return 200 and plain text
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/plain; charset=utf-8')
-                    self.end_headers()
-                    self.wfile.write(result_text.encode('utf-8'))
-                except ValueError as ve:
-                    error_msg = str(ve)
-                    logger.error(error_msg)
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/plain; charset=utf-8')
-                    self.end_headers()
-                    self.wfile.write(f"Ошибка: {error_msg}".encode('utf-8'))
-
-            except json.JSONDecodeError as e:
-                error_msg = f"Invalid JSON in request: {str(e)}"
-                logger.error(error_msg)
-                self.send_response(200)
-                self.send_header('Content-type', 'text/plain; charset=utf-8')
-                self.end_headers()
-                self.wfile.write(f"Ошибка: {error_msg}".encode('utf-8'))
-
-            except (UnicodeDecodeError, OSError, BrokenPipeError) as e:
-                error_msg = f"Request processing error: {str(e)}"
-                logger.error(error_msg)
-                self.send_response(200)
-                self.send_header('Content-type', 'text/plain; charset=utf-8')
-                self.end_headers()
-                self.wfile.write(f"Ошибка: {error_msg}".encode('utf-8'))
-        else:
+        # Route: several texts at once (automations, announcements).
+        if self.path.endswith("/batch"):
+            self._handle_batch(body)
+            return
+
+        if not body:
             error_msg = "Empty request body"
             logger.error(error_msg)
-            self.send_response(200)
-            self.send_header('Content-type', 'text/plain; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(f"Ошибка: {error_msg}".encode('utf-8'))
+            self._send_text(f"Ошибка: {error_msg}")
+            return
 
-    def _handle_transcription(self, content_length):
-        """Forward a multipart STT request to Groq Whisper and return its JSON."""
+        pieces = None
         try:
-            body = self.rfile.read(content_length) if content_length > 0 else b""
-            content_type = self.headers.get("Content-Type", "")
-            status, payload = transcribe_audio(body, content_type)
-        except (OSError, BrokenPipeError) as e:
-            # Reading the request body failed; degrade gracefully.
-            logger.error(f"STT request read error: {str(e)}")
-            status, payload = 200, b'{"text": ""}'
+            body_text = body.decode('utf-8')
+            json_data = json.loads(body_text)
 
-        self.send_response(status)
-        self.send_header("Content-type", "application/json")
-        self.end_headers()
+            log_payload(logger, "Received JSON", json_data)
+
+            # Extract text field and call Groq API
+            text = extract_request_text(json_data)
+            logger.info("Processing text: %s", text)
+            # Route: streamed reply for the HA conversation agent entity.
+            if self.path.endswith("/stream"):
+                pieces = stream_answer(text, extract_device_id(json_data))
+            else:
+                result_text = answer_text(text, extract_device_id(json_data))
+        except json.JSONDecodeError as e:
+            error_msg = f"Invalid JSON in request: {str(e)}"
+            logger.error(error_msg)
+            result_text = f"Ошибка: {error_msg}"
+        except (UnicodeDecodeError, OSError) as e:
+            error_msg = f"Request processing error: {str(e)}"
+            logger.error(error_msg)
+            result_text = f"Ошибка: {error_msg}"
+        except ValueError as ve:
+            error_msg = str(ve)
+            logger.error(error_msg)
+            result_text = f"Ошибка: {error_msg}"
+
+        # Streaming starts only once the request parsed: after the chunked
+        # headers are out, no error reply may be written.
+        if pieces is not None:
+            self._send_stream(pieces)
+            return
+        # Always return 200 and plain text
+        self._send_text(result_text)
+
+    def _handle_batch(self, body):
+        """POST /batch: a JSON array of voice request objects -> {"results": [...]}."""
         try:
-            self.wfile.write(payload)
-        except BrokenPipeError:
-            pass
+            items = json.loads(body.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            self._send_json(400, {"error": f"Invalid JSON in request: {str(e)}"})
+            return
+        if not isinstance(items, list) or not items:
+            self._send_json(400, {"error": "Batch must be a non-empty JSON array"})
+            return
+        if len(items) > settings.batch_max_items:
+            self._send_json(400, {"error": f"Batch is limited to {settings.batch_max_items} items"})
+            return
+        logger.info("Processing batch of %d item(s)", len(items))
+        self._send_json(200, {"results": answer_batch(items)})
+
+    def _handle_transcription(self, body):
+        """Forward a multipart STT request to Groq Whisper and return its JSON."""
+        content_type = self.headers.get("Content-Type", "")
+        deadline = current_deadline()
+        max_wait = max(0.0, deadline.remaining()) if deadline is not None else None
+        with stt_lane.slot(max_wait) as admitted:
+            if admitted:
+                status, payload = transcribe_audio(body, content_type)
+            else:
+                status, payload = 200, EMPTY_TRANSCRIPT
+        self._send_body(status, "application/json", payload)
 
     def log_message(self, _format, *args):
         """Override to suppress default logging."""
@@ -117,16 +502,94 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
         return
 
 
-def run_server(port=None):
-    """Start HTTP server on specified port."""
+class RelayHTTPServer(http.server.ThreadingHTTPServer):
+    """Threading HTTP server with a cap on simultaneously open connections.
+
+    Keep-alive connections each hold a thread, so connections beyond
+    settings.max_connections are closed right after accept.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        self._open = set()
+        self._open_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def verify_request(self, request, client_address):
+        with self._open_lock:
+            if len(self._open) >= settings.max_connections:
+                logger.warning(
+                    "Connection limit %d reached; refusing %s",
+                    settings.max_connections, client_address[0],
+                )
+                return False
+            self._open.add(request)
+        return True
+
+    def shutdown_request(self, request):
+        with self._open_lock:
+            self._open.discard(request)
+        super().shutdown_request(request)
+
+
+class ReusePortRelayHTTPServer(ReusePortMixin, RelayHTTPServer):
+    """RelayHTTPServer whose port is shared by pre-forked workers."""
+
+
+def start_background_services():
+    """Warm-up, HA state sync and persistent command connections."""
+    import urllib3
+
+    # Disable InsecureRequestWarning globally for unverified HTTPS requests
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    start_warmup()
+    start_device_state_sync()
+    # Reload delayed commands persisted before a restart.
+    command_scheduler.start()
+    try:
+        # Open persistent command connections (MQTT/websocket) up front.
+        get_transport()
+    except ValueError as e:
+        logger.error("Command transport error: %s", e)
+
+
+def _run_worker(port, index):
+    """Body of one pre-forked worker process."""
+    with ReusePortRelayHTTPServer(("", port), RequestHandler) as httpd:
+        logger.info("Worker %s (pid %s) serving on port %s", index, os.getpid(), port)
+        start_background_services()
+        serve_worker(httpd)
+
+
+def run_server(port=None, workers=None):
+    """Start HTTP server on specified port.
+
+    With workers > 1 the relay pre-forks that many processes sharing the port
+    through SO_REUSEPORT (see src/prefork.py).
+    """
+    try:
+        # Modules read settings lazily; validate the whole environment up front.
+        get_settings()
+    except ValidationError as e:
+        raise SystemExit(f"Invalid configuration: {e}") from None
+    setup_logging()
     if port is None:
         port = settings.port
+    if workers is None:
+        workers = settings.workers
     try:
-        with socketserver.TCPServer(("", port), RequestHandler) as httpd:
-            logger.info(f"HTTP server started on port {port}")
+        if workers > 1:
+            logger.info("Pre-fork mode: %d workers on port %s", workers, port)
+            logger.info("=" * 50)
+            run_prefork(workers, lambda index: _run_worker(port, index))
+            return
+        with RelayHTTPServer(("", port), RequestHandler) as httpd:
+            logger.info("HTTP server started on port %s", port)
             logger.info("=" * 50)
+            start_background_services()
             httpd.serve_forever()
     except KeyboardInterrupt:
         logger.info("\nServer stopped by user")
     except OSError as e:
-        logger.error(f"Server startup error on port {port}: {e}")
+        logger.error("Server startup error on port %s: %s", port, e)
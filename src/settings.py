@@ -1,11 +1,20 @@
-"""Single source of configuration via pydantic-settings."""
+"""Single source of configuration via pydantic-settings.
+
+`settings` is lazy: the environment is read and validated on first attribute
+access, so importing a module that uses it costs nothing. run_server() calls
+get_settings() first thing, so a misconfiguration still fails at startup.
+"""
+
+import functools
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from src.lazy import LazyObject
+
 
 class Settings(BaseSettings):
     # Credentials for external public APIs — required, no defaults.
-    # Missing in the environment → Settings() raises on startup.
+    # Missing in the environment → get_settings() raises on startup.
     groq_api_key: str
     weather_api_key: str
 
@@ -16,18 +25,150 @@ class Settings(BaseSettings):
     groq_model: str = "openai/gpt-oss-120b"
     # STT model for Groq Whisper transcription endpoint (non-secret, has default).
     groq_stt_model: str = "whisper-large-v3-turbo"
+    # STT retries (see src/stt_client.py): 429, 5xx and transport errors are
+    # resent up to stt_retry_attempts times in total, with full-jitter backoff
+    # between stt_retry_base_delay * 2^n and stt_retry_max_delay, all within
+    # stt_retry_budget_seconds (further bounded by the request deadline).
+    stt_retry_attempts: int = 3
+    stt_retry_base_delay: float = 0.25
+    stt_retry_max_delay: float = 2.0
+    stt_retry_budget_seconds: float = 20.0
+    # Optional second Whisper model (e.g. "whisper-large-v3") that a slow
+    # attempt is hedged to after a learned delay, like groq_hedge_model. Empty = off.
+    groq_stt_hedge_model: str = ""
+    groq_stt_hedge_initial_delay: float = 2.0
+    groq_stt_hedge_min_delay: float = 0.5
     weather_city: str = "Moscow"
     # Optional proxy (SOCKS/HTTP, e.g. "socks5h://10.31.41.70:1080") for outbound
     # calls to external public APIs (Groq and OpenWeatherMap); empty = direct request.
     groq_proxy: str = ""
+    # Identical requests (same normalized text, or same audio for STT) arriving
+    # within this many seconds share one upstream call; 0 = only while in flight.
+    dedup_window_seconds: float = 2.0
+
+    # Admission control (see src/admission.py): per-lane concurrency limit and
+    # bounded queue. STT, chat and fast-path commands never wait on each other;
+    # a full queue or a wait longer than queue_max_wait_seconds gets an
+    # immediate degraded reply. Limits are per worker process: with
+    # workers=N the relay admits up to N times as many requests.
+    stt_max_concurrency: int = 4
+    stt_max_queue: int = 8
+    chat_max_concurrency: int = 4
+    chat_max_queue: int = 8
+    command_max_concurrency: int = 4
+    command_max_queue: int = 16
+    queue_max_wait_seconds: float = 10.0
+    # POST /batch: at most batch_max_items texts per call, answered by up to
+    # batch_max_concurrency threads (each item still takes its lane's slot).
+    batch_max_items: int = 16
+    batch_max_concurrency: int = 8
+
+    # Seconds reserved for sending the reply when deriving upstream timeouts
+    # from the caller's X-Timeout-Ms budget (see src/deadline.py).
+    deadline_margin_seconds: float = 0.5
+
+    # Prompt enrichment (see src/enrichment.py): total time budget for gathering
+    # dynamic context, and the weather provider's own deadline. A slow weather
+    # fetch contributes its last known value instead of delaying the request.
+    prompt_budget_seconds: float = 2.0
+    weather_deadline_seconds: float = 1.5
+    # Send only the core prompt sections plus those matching the utterance
+    # (see src/prompt_slicing.py).
+    prompt_slicing: bool = False
+    # Answer time/date/weather questions locally (see src/skills.py).
+    local_skills_enabled: bool = True
+    # Token usage and queue/compute time from Groq responses are aggregated per
+    # tier, model and device over this rolling window (see src/usage.py).
+    usage_window_seconds: int = 3600
     log_level: str = "INFO"
+    # Full payloads (request JSON, Groq responses, replies) are logged at DEBUG,
+    # or at INFO for this fraction of requests (0 = never, 1 = always), and
+    # truncated to log_payload_max_chars (0 = no limit). See src/logging_setup.py.
+    log_payload_sample_rate: float = 0.0
+    log_payload_max_chars: int = 2000
     port: int = 8081
+    # HTTP/1.1 keep-alive: idle connections are closed after this many seconds,
+    # and at most max_connections may be open at once (per worker).
+    keepalive_timeout: float = 30.0
+    max_connections: int = 64
+    # Worker processes; > 1 enables pre-fork mode with SO_REUSEPORT. Lane
+    # limits and max_connections apply to each worker, so they multiply by N.
+    workers: int = 1
+    # Enables the /debug/profile and /debug/memory endpoints; requests must
+    # carry it in the X-Debug-Token header. Empty = endpoints disabled.
+    debug_token: str = ""
+
+    # Optional Home Assistant websocket API (base URL such as
+    # "http://homeassistant:8123" and a long-lived access token). When both are
+    # set, device states are kept in sync for the prompt; empty = disabled.
+    ha_url: str = ""
+    ha_token: str = ""
+    # Comma-separated HA domains whose states are rendered into the prompt.
+    ha_state_domains: str = "light,switch,climate,lock,fan,cover"
+
+    # Native tool calling: declare device control as an OpenAI-style tool and
+    # dispatch the model's (parallel) tool calls; <command> tags stay as fallback.
+    groq_tool_calling: bool = False
+
+    # Hedged completions (see src/hedging.py): when the primary request is slower
+    # than a delay learned from recent latencies (at least groq_hedge_min_delay;
+    # groq_hedge_initial_delay until there is data), the same request is also
+    # sent to groq_hedge_model and the first good answer wins. Empty = off.
+    # Empty reasoning effort omits the field for models that do not accept it.
+    groq_hedge_model: str = ""
+    groq_hedge_reasoning_effort: str = ""
+    groq_hedge_initial_delay: float = 3.0
+    groq_hedge_min_delay: float = 1.0
+
+    # How parsed <command> blocks reach the smart home (see src/commands.py):
+    # "http" (POST to smarthome_url), "mqtt" or "ha_websocket" (HA call_service
+    # over the HA_URL/HA_TOKEN websocket). MQTT and websocket keep one
+    # persistent connection with automatic reconnection.
+    command_transport: str = "http"
+    mqtt_host: str = "localhost"
+    mqtt_port: int = 1883
+    mqtt_topic: str = "ha_voice_logic/command"
+    mqtt_username: str = ""
+    mqtt_password: str = ""
+
+    # Latency tiers (see src/tiers.py). Every utterance is classified locally
+    # into a tier with its own model, reasoning effort, token cap and timeout.
+    # An empty model falls back to groq_model.
+    fast_tier_model: str = ""
+    fast_tier_reasoning_effort: str = "low"
+    fast_tier_max_tokens: int = 1024
+    fast_tier_timeout: float = 20
+    # Utterances with at most this many words count as short commands.
+    fast_tier_max_words: int = 5
+    default_tier_model: str = ""
+    default_tier_reasoning_effort: str = "medium"
+    default_tier_max_tokens: int = 4096
+    default_tier_timeout: float = 300
 
     # Runtime state — always under data/.
     system_prompt_path: str = "data/system_prompt.md"
     context_path: str = "data/context.txt"
+    # Known devices for command validation (see src/device_registry.py);
+    # a missing file disables validation.
+    devices_path: str = "data/devices.json"
+    # Durable SQLite conversation/command log (see src/history.py).
+    history_path: str = "data/history.db"
+    history_retention_days: int = 30
+    # Pending delayed commands ("room_light:off@+10m", see src/scheduler.py).
+    # Jobs found more than scheduler_max_lateness_seconds overdue (e.g. after
+    # a long downtime) are dropped instead of fired.
+    scheduler_path: str = "data/scheduler.db"
+    scheduler_max_lateness_seconds: float = 600.0
+    # Cross-worker state (rate-limit backoff, shared dedup results).
+    shared_state_path: str = "data/shared_state.db"
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
-settings = Settings()
+@functools.lru_cache(maxsize=None)
+def get_settings():
+    """Build and validate Settings once; raises pydantic.ValidationError."""
+    return Settings()
+
+
+settings = LazyObject(get_settings)
@@ -0,0 +1,83 @@
+"""File-backed key/value store shared by pre-forked worker processes.
+
+Worker processes do not share memory, so state that must stay consistent
+across them (the Groq rate-limit backoff, recently finished deduplicated
+answers) lives in a small SQLite database under data/. Values are JSON and
+every key carries an expiry time.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from src.settings import settings
+from src.lazy import LazyObject
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shared_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+class SharedStore:
+    """TTL key/value store in SQLite (WAL), safe across processes and threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, reopened after fork.
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key, default=None):
+        """Return the unexpired value for `key`, or `default` (also on errors)."""
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM shared_state WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error("Shared state read of '%s' failed: %s", key, e)
+            return default
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value, ttl):
+        """Store `value` for `ttl` seconds; failures are logged, not raised."""
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + ttl),
+            )
+            # Opportunistic cleanup keeps the table small without a janitor process.
+            connection.execute("DELETE FROM shared_state WHERE expires_at <= ?", (now,))
+        except sqlite3.Error as e:
+            logger.error("Shared state write of '%s' failed: %s", key, e)
+
+    def delete(self, key):
+        try:
+            self._connection().execute("DELETE FROM shared_state WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.error("Shared state delete of '%s' failed: %s", key, e)
+
+
+shared_store = LazyObject(lambda: SharedStore(settings.shared_state_path))
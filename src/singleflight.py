@@ -0,0 +1,148 @@
+"""Single-flight coalescing of identical requests.
+
+When HA retries or two satellites hear the same wake word, the relay gets the
+same request twice within a second. SingleFlight runs the first call for a key
+and lets every identical request that arrives while it is in flight, or within
+`window` seconds after it finished, share its result instead of repeating the
+upstream call (and the smart-home commands it dispatches).
+
+In-flight coalescing is per process. With an optional shared store, finished
+results are also shared across pre-forked workers for the same window.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "finished_at")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+class SingleFlight:
+    """Deduplicates concurrent and near-simultaneous calls by key."""
+
+    def __init__(self, window, store=None, namespace="singleflight"):
+        self.window = window
+        self.store = store
+        self.namespace = namespace
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _expired(self, call, now):
+        return call.finished_at is not None and now - call.finished_at > self.window
+
+    def _claim(self, key):
+        """Return (call, leader) for `key`, registering a new call if needed."""
+        now = time.monotonic()
+        with self._lock:
+            for stale_key in [k for k, c in self._calls.items() if self._expired(c, now)]:
+                del self._calls[stale_key]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        return call, leader
+
+    def _finish(self, key, call, keep, store_key, cached):
+        call.finished_at = time.monotonic()
+        forget = call.error is not None or self.window <= 0
+        if not forget and keep is not None:
+            forget = not keep(call.result)
+        if forget:
+            # Only requests already waiting share this outcome.
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+        elif self.store is not None and cached is None:
+            self.store.set(store_key, call.result, self.window)
+        call.done.set()
+
+    def do(self, key, fn, keep=None):
+        """Return (result, shared): run `fn()` once per key per window.
+
+        `shared` is True when the result came from another request's call.
+        An exception raised by `fn` is re-raised in every sharing request.
+        `keep(result)` may return False to share a result (e.g. a failure)
+        only with requests already waiting, not with later arrivals.
+        """
+        call, leader = self._claim(key)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        store_key = f"{self.namespace}:{key}"
+        cached = self.store.get(store_key) if self.store is not None else None
+        try:
+            if cached is not None:
+                # Another worker process answered this within the window.
+                call.result = cached
+                return cached, True
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call, keep, store_key, cached)
+        return call.result, False
+
+    def stream(self, key, make_pieces, keep=None):
+        """Generator form of do() for results produced as text pieces.
+
+        The leader yields the pieces of `make_pieces()` as they come; every
+        sharing request yields the leader's whole text as one piece once it
+        is complete. Returns (via StopIteration) whether the text was shared.
+        If the leader's consumer goes away mid-stream, a waiting request
+        takes over and runs its own call.
+        """
+        while True:
+            call, leader = self._claim(key)
+            if leader:
+                break
+            call.done.wait()
+            if isinstance(call.error, GeneratorExit):
+                continue
+            if call.error is not None:
+                raise call.error
+            yield call.result
+            return True
+
+        store_key = f"{self.namespace}:{key}"
+        cached = self.store.get(store_key) if self.store is not None else None
+        try:
+            if cached is not None:
+                call.result = cached
+                yield cached
+                return True
+            pieces = []
+            source = make_pieces()
+            try:
+                for piece in source:
+                    pieces.append(piece)
+                    yield piece
+            finally:
+                # A consumer that went away stops generation right here.
+                source.close()
+            call.result = "".join(pieces)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call, keep, store_key, cached)
+        return False
+
+    def clear(self):
+        """Forget all finished calls."""
+        with self._lock:
+            for key in [k for k, c in self._calls.items() if c.finished_at is not None]:
+                del self._calls[key]
@@ -0,0 +1,183 @@
+"""Local skills: answer the most frequent simple questions without the LLM.
+
+"Который час", "какое сегодня число" and "какая погода" are matched against
+precompiled patterns over the normalized utterance and answered from local
+data (the clock and the weather provider's last value) through a few
+persona-styled templates. Anything the patterns do not match exactly, or
+whose data is missing or stale, returns None and goes to Groq as before.
+"""
+
+import logging
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from src.text import normalize_request_text, processing_response
+from src.prompt import prompt_providers
+from src import stats
+
+logger = logging.getLogger(__name__)
+
+# Weather older than this is not worth answering from memory.
+WEATHER_MAX_AGE_SECONDS = 1800
+
+_POLITE = r"(?:скажи |подскажи |а )?"
+TIME_RE = re.compile(
+    _POLITE + r"(?:который (?:сейчас )?час|сколько (?:сейчас )?(?:времени|время))(?: сейчас)?"
+)
+DATE_RE = re.compile(
+    _POLITE + r"(?:какое (?:сегодня )?число(?: сегодня)?|какая (?:сегодня )?дата(?: сегодня)?"
+    r"|какой (?:сегодня )?день(?: недели)?(?: сегодня)?)"
+)
+WEATHER_RE = re.compile(
+    _POLITE + r"(?:какая (?:сейчас )?погода(?: сейчас)?(?: на улице)?|что (?:там )?с погодой"
+    r"|что (?:там )?на улице|сколько градусов(?: на улице)?)"
+)
+
+TIME_TEMPLATES = (
+    "Сейчас {time}. Не то штобы это спасло твой день.",
+    "{time}. Часы у тебя, видимо, тоже сломались.",
+    "Сейчас {time}. Время идёт, а ты всё такой же бесполезный.",
+)
+DATE_TEMPLATES = (
+    "Сегодня {date}. Ещё один день, который ты потратишь впустую.",
+    "{date}. Запиши куда-нибудь, раз память подводит.",
+    "Сегодня {date}. Поздравляю, ты дожил.",
+)
+WEATHER_TEMPLATES = (
+    "На улице {weather}. Тебе всё равно некуда идти.",
+    "Погода: {weather}. Можешь не благодарить.",
+    "{weather}. Идеальная погода, штобы остаться дома и не мешать мне.",
+)
+
+# Number words -----------------------------------------------------------
+
+_UNITS = ("ноль", "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять")
+_UNITS_FEMININE = {1: "одна", 2: "две"}
+_TEENS = ("десять", "одиннадцать", "двенадцать", "тринадцать", "четырнадцать",
+          "пятнадцать", "шестнадцать", "семнадцать", "восемнадцать", "девятнадцать")
+_TENS = ("", "", "двадцать", "тридцать", "сорок", "пятьдесят",
+         "шестьдесят", "семьдесят", "восемьдесят", "девяносто")
+_HUNDREDS = ("", "сто", "двести", "триста", "четыреста", "пятьсот",
+             "шестьсот", "семьсот", "восемьсот", "девятьсот")
+
+_ORDINAL_UNITS = ("", "первое", "второе", "третье", "четвёртое", "пятое",
+                  "шестое", "седьмое", "восьмое", "девятое")
+_ORDINAL_ROUND = {10: "десятое", 11: "одиннадцатое", 12: "двенадцатое", 13: "тринадцатое",
+                  14: "четырнадцатое", 15: "пятнадцатое", 16: "шестнадцатое",
+                  17: "семнадцатое", 18: "восемнадцатое", 19: "девятнадцатое",
+                  20: "двадцатое", 30: "тридцатое"}
+
+MONTHS = ("января", "февраля", "марта", "апреля", "мая", "июня", "июля",
+          "августа", "сентября", "октября", "ноября", "декабря")
+WEEKDAYS = ("понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье")
+
+HOUR_FORMS = ("час", "часа", "часов")
+MINUTE_FORMS = ("минута", "минуты", "минут")
+DEGREE_FORMS = ("градус", "градуса", "градусов")
+METER_FORMS = ("метр", "метра", "метров")
+
+
+def number_words(n, feminine=False):
+    """Spell an integer in -999..999 in Russian ("двадцать одна" if feminine)."""
+    if n < 0:
+        return f"минус {number_words(-n, feminine)}"
+    if n == 0:
+        return _UNITS[0]
+    words = []
+    hundreds, rest = divmod(n % 1000, 100)
+    if hundreds:
+        words.append(_HUNDREDS[hundreds])
+    if 10 <= rest < 20:
+        words.append(_TEENS[rest - 10])
+    else:
+        tens, units = divmod(rest, 10)
+        if tens:
+            words.append(_TENS[tens])
+        if units:
+            words.append(_UNITS_FEMININE.get(units) if feminine and units in _UNITS_FEMININE
+                         else _UNITS[units])
+    return " ".join(words)
+
+
+def plural(n, forms):
+    """Pick the form agreeing with n: (один) час, (два) часа, (пять) часов."""
+    n = abs(n)
+    if 11 <= n % 100 <= 14:
+        return forms[2]
+    if n % 10 == 1:
+        return forms[0]
+    if 2 <= n % 10 <= 4:
+        return forms[1]
+    return forms[2]
+
+
+def quantity(n, forms, feminine=False):
+    return f"{number_words(n, feminine)} {plural(n, forms)}"
+
+
+def day_ordinal(day):
+    """Neuter ordinal for a day of month: 1 -> "первое", 23 -> "двадцать третье"."""
+    if day in _ORDINAL_ROUND:
+        return _ORDINAL_ROUND[day]
+    if day < 10:
+        return _ORDINAL_UNITS[day]
+    return f"{_TENS[day // 10]} {_ORDINAL_UNITS[day % 10]}"
+
+
+# Skills -----------------------------------------------------------------
+
+def time_skill(now):
+    minutes = "ровно" if now.minute == 0 else quantity(now.minute, MINUTE_FORMS, feminine=True)
+    return random.choice(TIME_TEMPLATES).format(time=f"{quantity(now.hour, HOUR_FORMS)} {minutes}")
+
+
+def date_skill(now):
+    date = f"{WEEKDAYS[now.weekday()]}, {day_ordinal(now.day)} {MONTHS[now.month - 1]}"
+    return random.choice(DATE_TEMPLATES).format(date=date)
+
+
+_DEGREES_RE = re.compile(r"(-?\d+) градус\w*")
+_WIND_RE = re.compile(r"(\d+) метр\w* в секунду")
+
+
+def weather_skill(now):
+    provider = prompt_providers.get("weather")
+    line = provider.last_value if provider is not None else None
+    if not line or time.monotonic() - provider.updated_at > WEATHER_MAX_AGE_SECONDS:
+        return None
+    # The provider line reads "Погода в <city>: <summary>."
+    summary = line.split(":", 1)[-1].strip().rstrip(".")
+    summary = _DEGREES_RE.sub(lambda m: quantity(int(m.group(1)), DEGREE_FORMS), summary)
+    summary = _WIND_RE.sub(lambda m: f"{quantity(int(m.group(1)), METER_FORMS)} в секунду", summary)
+    return random.choice(WEATHER_TEMPLATES).format(weather=summary)
+
+
+# (name, pattern, skill) in match order; a skill may return None to decline.
+SKILLS = (
+    ("time", TIME_RE, time_skill),
+    ("date", DATE_RE, date_skill),
+    ("weather", WEATHER_RE, weather_skill),
+)
+
+_counts = {name: 0 for name, _pattern, _skill in SKILLS}
+_counts_lock = threading.Lock()
+stats.register("skills", lambda: dict(_counts))
+
+
+def answer_locally(text, now=None):
+    """Return a local answer for `text`, or None to fall back to the LLM."""
+    normalized = normalize_request_text(text)
+    for name, pattern, skill in SKILLS:
+        if pattern.fullmatch(normalized):
+            reply = skill(now or datetime.now())
+            if reply is None:
+                logger.info("Local skill '%s' declined, falling back to LLM", name)
+                return None
+            with _counts_lock:
+                _counts[name] += 1
+            logger.info("Answered locally by skill '%s'", name)
+            return processing_response(reply)
+    return None
@@ -0,0 +1,13 @@
+"""Registry of runtime statistics exposed on GET /stats."""
+
+_sources = {}
+
+
+def register(name, snapshot):
+    """Expose `snapshot()` (a JSON-serializable dict) under `name`."""
+    _sources[name] = snapshot
+
+
+def collect():
+    """Return {name: snapshot} for every registered source."""
+    return {name: snapshot() for name, snapshot in _sources.items()}
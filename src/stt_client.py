@@ -1,12 +1,19 @@
 """Groq Whisper speech-to-text (STT) proxy client."""
 
+import hashlib
 import logging
+import random
 import re
-
-import requests  # type: ignore
-from requests_toolbelt.multipart.decoder import MultipartDecoder  # type: ignore
+import threading
+import time
 
 from src.settings import settings
+from src.lazy import LazyObject
+from src.http_session import get_session, proxies_for
+from src.singleflight import SingleFlight
+from src.deadline import DeadlineExceeded, upstream_timeout
+from src.hedging import Hedger, PRIMARY
+from src import stats
 
 logger = logging.getLogger(__name__)
 
@@ -16,10 +23,82 @@ GROQ_STT_URL = "https://api.groq.com/openai/v1/audio/transcriptions"
 # and keeps the voice pipeline alive instead of crashing on errors.
 _EMPTY_RESULT = b'{"text": ""}'
 
+# The same utterance heard by two satellites (or resent by HA) is transcribed
+# once; requests are keyed by a hash of the audio bytes.
+stt_flight = LazyObject(lambda: SingleFlight(settings.dedup_window_seconds))
+
+# Upper bound for a single transcription attempt.
+ATTEMPT_TIMEOUT_SECONDS = 60.0
+
+# Hedging (settings.groq_stt_hedge_model): a slow attempt gets a parallel
+# request to the second Whisper model; the first transcript wins.
+_hedger = LazyObject(lambda: Hedger(
+    settings.groq_stt_hedge_initial_delay, settings.groq_stt_hedge_min_delay,
+    max_workers=2 * settings.stt_max_concurrency, name="stt-hedge",
+))
+
+
+class AttemptStats:
+    """Per-model outcome counts and latency of individual STT attempts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self.requests = 0
+        self.retries = 0
+        self.recovered = 0
+        self.failed = 0
+
+    def observe(self, model, outcome, seconds):
+        with self._lock:
+            entry = self._models.setdefault(
+                model, {"outcomes": {}, "latency_total": 0.0, "latency_max": 0.0}
+            )
+            entry["outcomes"][outcome] = entry["outcomes"].get(outcome, 0) + 1
+            entry["latency_total"] += seconds
+            entry["latency_max"] = max(entry["latency_max"], seconds)
+
+    def finish(self, attempts, ok):
+        """Record one transcription request that took `attempts` attempts."""
+        with self._lock:
+            self.requests += 1
+            self.retries += attempts - 1
+            if not ok:
+                self.failed += 1
+            elif attempts > 1:
+                self.recovered += 1
+
+    def snapshot(self):
+        with self._lock:
+            models = {}
+            for model, entry in self._models.items():
+                count = sum(entry["outcomes"].values())
+                models[model] = {
+                    "outcomes": dict(entry["outcomes"]),
+                    "latency_avg": round(entry["latency_total"] / count, 3),
+                    "latency_max": round(entry["latency_max"], 3),
+                }
+            result = {
+                "requests": self.requests,
+                "retries": self.retries,
+                "recovered": self.recovered,
+                "failed": self.failed,
+                "models": models,
+            }
+        result["hedging"] = _hedger.snapshot()
+        return result
+
+
+attempt_stats = AttemptStats()
+stats.register("stt_upstream", attempt_stats.snapshot)
+
 
 def _extract_file_part(body, content_type):
     """Return (filename, file_bytes, file_content_type) for the multipart
     part named "file", or None if it cannot be found."""
+    # The multipart stack is only needed on the STT route; load it on first use.
+    from requests_toolbelt.multipart.decoder import MultipartDecoder  # type: ignore
+
     decoder = MultipartDecoder(body, content_type)
     for part in decoder.parts:
         disposition = part.headers.get(b"Content-Disposition", b"")
@@ -48,7 +127,7 @@ def transcribe_audio(body, content_type):
     try:
         extracted = _extract_file_part(body, content_type)
     except Exception as e:  # malformed / non-multipart body
-        logger.error(f"STT multipart parse failed: {str(e)}")
+        logger.error("STT multipart parse failed: %s", e)
         return 200, _EMPTY_RESULT
 
     if extracted is None:
@@ -56,6 +135,101 @@ def transcribe_audio(body, content_type):
         return 200, _EMPTY_RESULT
 
     filename, file_bytes, file_content_type = extracted
+    key = hashlib.sha256(file_bytes).hexdigest()
+    result, shared = stt_flight.do(
+        key,
+        lambda: _forward_to_groq(filename, file_bytes, file_content_type),
+        keep=lambda r: r[1] != _EMPTY_RESULT,
+    )
+    if shared:
+        logger.info("Duplicate STT request: reused the in-flight/recent transcript")
+    return result
+
+
+def _outcome(response):
+    if response.status_code == 200:
+        return "ok"
+    if response.status_code == 429:
+        return "rate_limited"
+    if response.status_code >= 500:
+        return "server_error"
+    return "client_error"
+
+
+def _retryable(outcome):
+    """Only rate limits, 5xx and transport errors are worth resending."""
+    return outcome in ("rate_limited", "server_error", "timeout", "error")
+
+
+def _backoff_delay(attempt, response=None):
+    """Full-jitter exponential backoff; a 429's Retry-After is a lower bound."""
+    cap = min(settings.stt_retry_max_delay, settings.stt_retry_base_delay * 2 ** (attempt - 1))
+    delay = random.uniform(0, cap)
+    if response is not None and response.status_code == 429:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", "")))
+        except (TypeError, ValueError):
+            pass
+    return delay
+
+
+def _post_transcription(model, files, data, timeout):
+    """One POST to Groq Whisper; records the attempt's outcome and latency.
+
+    Returns the response, or raises requests.RequestException.
+    """
+    import requests  # type: ignore
+
+    started = time.monotonic()
+    try:
+        r = get_session().post(
+            GROQ_STT_URL,
+            headers={"Authorization": f"Bearer {settings.groq_api_key}"},
+            files=files,
+            data=dict(data, model=model),
+            proxies=proxies_for(settings.groq_proxy),
+            verify=False,
+            timeout=timeout,
+        )
+    except requests.Timeout:
+        attempt_stats.observe(model, "timeout", time.monotonic() - started)
+        raise
+    except requests.RequestException:
+        attempt_stats.observe(model, "error", time.monotonic() - started)
+        raise
+    attempt_stats.observe(model, _outcome(r), time.monotonic() - started)
+    return r
+
+
+def _attempt(files, data, timeout):
+    """One transcription attempt, hedged to settings.groq_stt_hedge_model if set."""
+    model = settings.groq_stt_model
+    hedge_model = settings.groq_stt_hedge_model
+    if not hedge_model or hedge_model == model:
+        return _post_transcription(model, files, data, timeout)
+    # Each call's timeout is what is left when it starts running.
+    expires_at = time.monotonic() + timeout
+    remaining = lambda: max(0.1, expires_at - time.monotonic())
+    response, winner = _hedger.call(
+        model,
+        lambda: _post_transcription(model, files, data, remaining()),
+        lambda: _post_transcription(hedge_model, files, data, remaining()),
+        accept=lambda r: r.status_code == 200,
+    )
+    if winner != PRIMARY:
+        logger.info("STT hedge model %s answered first", hedge_model)
+    return response
+
+
+def _forward_to_groq(filename, file_bytes, file_content_type):
+    """POST the audio to Groq Whisper; returns (status_code, body_bytes).
+
+    The audio is already in memory, so rate limits, 5xx and transport errors
+    are retried with jittered backoff until settings.stt_retry_attempts or the
+    total budget (settings.stt_retry_budget_seconds, bounded by the request
+    deadline) runs out.
+    """
+    import requests  # type: ignore
 
     # Force our own parameters; transcription is fixed to Russian, JSON output.
     files = {
@@ -66,37 +240,50 @@ def transcribe_audio(body, content_type):
         )
     }
     data = {
-        "model": settings.groq_stt_model,
         "language": "ru",
         "response_format": "json",
         "temperature": "0",
     }
-    headers = {"Authorization": f"Bearer {settings.groq_api_key}"}
-    _proxies = (
-        {"https": settings.groq_proxy, "http": settings.groq_proxy}
-        if settings.groq_proxy
-        else None
-    )
 
     try:
-        r = requests.post(
-            GROQ_STT_URL,
-            headers=headers,
-            files=files,
-            data=data,
-            proxies=_proxies,
-            verify=False,
-            timeout=60,
-        )
-    except requests.RequestException as e:
-        logger.error(f"STT request to Groq failed: {str(e)}")
+        budget = upstream_timeout(settings.stt_retry_budget_seconds)
+    except DeadlineExceeded:
+        logger.error("STT deadline exceeded before calling Groq")
         return 200, _EMPTY_RESULT
+    expires_at = time.monotonic() + budget
 
-    if r.status_code != 200:
-        # Log Groq's status and body, but never propagate the failure.
-        logger.error(f"Groq STT error: {r.status_code} - {r.text}")
-        return 200, _EMPTY_RESULT
+    attempts = max(1, settings.stt_retry_attempts)
+    for attempt in range(1, attempts + 1):
+        r = None
+        try:
+            r = _attempt(files, data, min(ATTEMPT_TIMEOUT_SECONDS, expires_at - time.monotonic()))
+            outcome = _outcome(r)
+        except requests.Timeout as e:
+            outcome = "timeout"
+            logger.error("STT attempt %d timed out: %s", attempt, e)
+        except requests.RequestException as e:
+            outcome = "error"
+            logger.error("STT attempt %d failed: %s", attempt, e)
+
+        if outcome == "ok":
+            attempt_stats.finish(attempt, ok=True)
+            if attempt > 1:
+                logger.info("Groq STT recovered on attempt %d", attempt)
+            logger.info("Groq STT response status=%s", r.status_code)
+            # Pass Groq's JSON body through unchanged (OpenAI format: {"text": "..."}).
+            return r.status_code, r.content
+        if r is not None:
+            # Log Groq's status and body, but never propagate the failure.
+            logger.error("Groq STT error: %s - %s", r.status_code, r.text)
+
+        if not _retryable(outcome) or attempt == attempts:
+            break
+        delay = _backoff_delay(attempt, r)
+        # Leave the next attempt at least a second of budget.
+        if time.monotonic() + delay + 1.0 > expires_at:
+            logger.error("STT retry budget exhausted after %d attempt(s)", attempt)
+            break
+        time.sleep(delay)
 
-    logger.info(f"Groq STT response status: {r.status_code}")
-    # Pass Groq's JSON body through unchanged (OpenAI format: {"text": "..."}).
-    return r.status_code, r.content
+    attempt_stats.finish(attempt, ok=False)
+    return 200, _EMPTY_RESULT
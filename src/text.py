@@ -21,16 +21,112 @@ def extract_request_text(json_data):
     return text
 
 
+def extract_device_id(json_data):
+    """Return device.id (the HA satellite) if present, else None."""
+    device = json_data.get("device")
+    if isinstance(device, dict) and isinstance(device.get("id"), str):
+        return device["id"]
+    return None
+
+
+def normalize_request_text(text):
+    """Normalize an utterance for deduplication: case, punctuation, spacing."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+# Word and unit replacements applied to every reply, in order.
+_REPLACEMENTS = (
+    ("что", "што"),
+    ("чтобы", "штобы"),
+    ("конечно", "конешно"),
+    ("°С", "градусов"),
+    ("%", "процентов"),
+    ("м/с", "метров в секунду"),
+)
+_HIDDEN_OPENERS = ("<think>", "<command>")
+
+
+def _apply_replacements(text):
+    for old, new in _REPLACEMENTS:
+        text = text.replace(old, new)
+    return text
+
+
 def processing_response(response):
     # Remove <think>...</think> and <command>...</command> tags and their response
     response = re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL)
     response = re.sub(r'<command>.*?</command>', '', response, flags=re.DOTALL)
     response = response.strip()
+    return _apply_replacements(response)
+
+
+class StreamCleaner:
+    """Incremental processing_response for replies that arrive in pieces.
+
+    Text is released only up to the last whitespace before any unfinished
+    <think>/<command> block, so tags are removed whole and word replacements
+    never see half a word. Inside a hidden block only the tail needed to spot
+    the closing tag is kept, so a long <think> costs O(length), not O(length^2).
+    """
+
+    def __init__(self):
+        self._raw = ""        # received, not yet classified as visible or hidden
+        self._visible = ""    # visible text waiting for a word boundary
+        self._closing = None  # closing tag of the hidden block we are inside
+        self._started = False
+
+    def feed(self, delta):
+        """Add a piece of the reply; return the text that is safe to emit."""
+        self._raw += delta
+        self._scan()
+        return self._release(final=False)
+
+    def flush(self):
+        """Return the rest of the reply; an unterminated block is dropped."""
+        if self._closing is None:
+            self._visible += self._raw
+        self._raw = ""
+        return self._release(final=True)
+
+    def _scan(self):
+        while True:
+            if self._closing is not None:
+                end = self._raw.find(self._closing)
+                if end == -1:
+                    # Keep just enough to match a closing tag split across pieces.
+                    self._raw = self._raw[-(len(self._closing) - 1):]
+                    return
+                self._raw = self._raw[end + len(self._closing):]
+                self._closing = None
+            start = _hidden_start(self._raw)
+            self._visible += self._raw[:start]
+            self._raw = self._raw[start:]
+            opener = next((tag for tag in _HIDDEN_OPENERS if self._raw.startswith(tag)), None)
+            if opener is None:
+                return  # nothing hidden, or a tag that is still arriving
+            self._closing = "</" + opener[1:]
+            self._raw = self._raw[len(opener):]
+
+    def _release(self, final):
+        ready = self._visible
+        if final:
+            self._visible = ""
+        else:
+            split = max(ready.rfind(" "), ready.rfind("\n")) + 1
+            ready, self._visible = ready[:split], ready[split:]
+        ready = _apply_replacements(ready)
+        if not self._started:
+            ready = ready.lstrip()
+            self._started = bool(ready)
+        return ready
+
 
-    response = response.replace("что", "што")
-    response = response.replace("чтобы", "штобы")
-    response = response.replace("конечно", "конешно")
-    response = response.replace("°С", "градусов")
-    response = response.replace("%", "процентов")
-    response = response.replace("м/с", "метров в секунду")
-    return response
+def _hidden_start(text):
+    """Index of the first hidden-block opening tag, complete or still arriving."""
+    position = text.find("<")
+    while position != -1:
+        rest = text[position:position + len("<command>")]
+        if any(rest.startswith(tag) or tag.startswith(rest) for tag in _HIDDEN_OPENERS):
+            return position
+        position = text.find("<", position + 1)
+    return len(text)
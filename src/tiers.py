@@ -0,0 +1,94 @@
+"""Latency tiers: cheap local classification of utterances.
+
+Each utterance is assigned a tier before the Groq call. A tier bundles the
+model, reasoning effort, completion token cap and request timeout, so a short
+"включи свет" takes a fast, low-effort path while open-ended questions keep
+the full treatment. Classification is a list of pluggable rules; the first
+rule that returns a tier name wins, otherwise the default tier is used.
+"""
+
+import re
+from collections import namedtuple
+
+from src.settings import settings
+
+FAST = "fast"
+DEFAULT = "default"
+
+Tier = namedtuple("Tier", "name model reasoning_effort max_tokens timeout")
+
+# Verb stems that start a smart-home command ("включи", "выключи свет", ...).
+COMMAND_STEMS = (
+    "включ", "выключ", "отключ", "постав", "установ", "сдела", "убав",
+    "прибав", "откро", "закро", "запри", "отопри", "зажг", "погас",
+)
+
+# Markers of open-ended questions that deserve the default tier even if short.
+QUESTION_STEMS = ("почему", "зачем", "расскаж", "объясн", "что такое", "кто такой")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def get_tier(name):
+    """Build the Tier for `name` from settings."""
+    if name == FAST:
+        return Tier(
+            FAST,
+            settings.fast_tier_model or settings.groq_model,
+            settings.fast_tier_reasoning_effort,
+            settings.fast_tier_max_tokens,
+            settings.fast_tier_timeout,
+        )
+    return Tier(
+        DEFAULT,
+        settings.default_tier_model or settings.groq_model,
+        settings.default_tier_reasoning_effort,
+        settings.default_tier_max_tokens,
+        settings.default_tier_timeout,
+    )
+
+
+def question_rule(text, words):
+    """Open-ended questions always go to the default tier."""
+    lowered = text.lower()
+    if any(stem in lowered for stem in QUESTION_STEMS):
+        return DEFAULT
+    return None
+
+
+def command_rule(text, words):
+    """Short utterances that start with a command verb take the fast tier."""
+    if words and len(words) <= settings.fast_tier_max_words:
+        if words[0].startswith(COMMAND_STEMS):
+            return FAST
+    return None
+
+
+def short_utterance_rule(text, words):
+    """One- or two-word utterances ("свет", "спасибо") take the fast tier."""
+    if 0 < len(words) <= 2 and "?" not in text:
+        return FAST
+    return None
+
+
+# Rules are called as rule(text, words) with the lower-cased word list and
+# return a tier name or None. Use register_rule() to add project rules.
+_rules = [question_rule, command_rule, short_utterance_rule]
+
+
+def register_rule(rule, first=False):
+    """Add a classification rule; `first=True` gives it top priority."""
+    if first:
+        _rules.insert(0, rule)
+    else:
+        _rules.append(rule)
+
+
+def classify(text):
+    """Return the Tier for an utterance."""
+    words = _WORD_RE.findall(text.lower())
+    for rule in _rules:
+        name = rule(text, words)
+        if name is not None:
+            return get_tier(name)
+    return get_tier(DEFAULT)
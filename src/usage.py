@@ -0,0 +1,150 @@
+"""Rolling token-usage and latency analytics from Groq `usage` blocks.
+
+Every completion reports prompt/completion/reasoning tokens and where its
+time went (queue_time vs prompt_time + completion_time). These are added to
+rolling per-tier, per-model and per-device aggregates exposed in /stats, so
+it is visible where prompt size or reasoning effort costs latency and quota.
+
+Each key keeps a fixed ring of time buckets in a flat array of doubles, so
+memory stays constant however long the relay runs; the number of keys per
+dimension is capped, and extra devices share one "other" entry.
+"""
+
+import threading
+import time
+from array import array
+
+from src.settings import settings
+from src.lazy import LazyObject
+from src import stats
+
+FIELDS = (
+    "requests", "prompt_tokens", "completion_tokens", "reasoning_tokens",
+    "queue_time", "prompt_time", "completion_time", "total_time",
+)
+_INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+BUCKETS = 60
+MAX_KEYS = 64
+OTHER = "other"
+DIMENSIONS = ("tier", "model", "device")
+
+
+def parse_usage(usage):
+    """Map a Groq usage block to FIELDS values, or None if there is none."""
+    if not isinstance(usage, dict) or "prompt_tokens" not in usage:
+        return None
+    details = usage.get("completion_tokens_details") or {}
+    values = {
+        "requests": 1,
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens"),
+        "reasoning_tokens": details.get("reasoning_tokens"),
+        "queue_time": usage.get("queue_time"),
+        "prompt_time": usage.get("prompt_time"),
+        "completion_time": usage.get("completion_time"),
+        "total_time": usage.get("total_time"),
+    }
+    try:
+        return tuple(float(values[name] or 0) for name in FIELDS)
+    except (TypeError, ValueError):
+        return None
+
+
+class RollingCounters:
+    """FIELDS sums over the last `buckets` * `bucket_seconds` seconds."""
+
+    __slots__ = ("bucket_seconds", "_values", "_epochs")
+
+    def __init__(self, bucket_seconds, buckets=BUCKETS):
+        self.bucket_seconds = bucket_seconds
+        self._values = array("d", bytes(8 * len(FIELDS) * buckets))
+        self._epochs = array("q", [-1] * buckets)
+
+    def add(self, values, now):
+        epoch = int(now // self.bucket_seconds)
+        slot = epoch % len(self._epochs)
+        base = slot * len(FIELDS)
+        if self._epochs[slot] != epoch:
+            # The slot held an expired bucket; reuse it.
+            self._epochs[slot] = epoch
+            for i in range(len(FIELDS)):
+                self._values[base + i] = 0.0
+        for i, value in enumerate(values):
+            self._values[base + i] += value
+
+    def totals(self, now):
+        oldest = int(now // self.bucket_seconds) - len(self._epochs)
+        sums = [0.0] * len(FIELDS)
+        for slot, epoch in enumerate(self._epochs):
+            if epoch > oldest:
+                base = slot * len(FIELDS)
+                for i in range(len(FIELDS)):
+                    sums[i] += self._values[base + i]
+        return sums
+
+
+def summarize(sums):
+    """Totals plus the derived shares and averages for one key."""
+    get = lambda name: sums[_INDEX[name]]
+    requests = get("requests")
+    compute_time = get("prompt_time") + get("completion_time")
+    result = {
+        "requests": int(requests),
+        "prompt_tokens": int(get("prompt_tokens")),
+        "completion_tokens": int(get("completion_tokens")),
+        "reasoning_tokens": int(get("reasoning_tokens")),
+        "reasoning_share": round(get("reasoning_tokens") / get("completion_tokens"), 4)
+        if get("completion_tokens") else 0.0,
+        "queue_seconds": round(get("queue_time"), 3),
+        "compute_seconds": round(compute_time, 3),
+        "queue_share": round(get("queue_time") / (get("queue_time") + compute_time), 4)
+        if get("queue_time") + compute_time else 0.0,
+    }
+    if requests:
+        result["avg_prompt_tokens"] = round(get("prompt_tokens") / requests, 1)
+        result["avg_completion_tokens"] = round(get("completion_tokens") / requests, 1)
+        result["avg_total_seconds"] = round(get("total_time") / requests, 3)
+    return result
+
+
+class UsageStats:
+    """Rolling usage aggregates per tier, model and device."""
+
+    def __init__(self, window_seconds, max_keys=MAX_KEYS):
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._bucket_seconds = max(1.0, window_seconds / BUCKETS)
+        self._counters = {dimension: {} for dimension in DIMENSIONS}
+        self._lock = threading.Lock()
+
+    def record(self, usage, tier, model, device=None, now=None):
+        """Add one response's usage block; returns the parsed values or None."""
+        values = parse_usage(usage)
+        if values is None:
+            return None
+        now = time.time() if now is None else now
+        keys = {"tier": tier, "model": model, "device": device or "unknown"}
+        with self._lock:
+            for dimension, key in keys.items():
+                counters = self._counters[dimension]
+                if key not in counters and len(counters) >= self.max_keys:
+                    key = OTHER
+                if key not in counters:
+                    counters[key] = RollingCounters(self._bucket_seconds)
+                counters[key].add(values, now)
+        return dict(zip(FIELDS, values))
+
+    def snapshot(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            result = {
+                dimension: {key: summarize(c.totals(now)) for key, c in counters.items()}
+                for dimension, counters in self._counters.items()
+            }
+        result["window_seconds"] = self.window_seconds
+        return result
+
+
+usage_stats = LazyObject(lambda: UsageStats(settings.usage_window_seconds))
+stats.register("usage", lambda: usage_stats.snapshot())
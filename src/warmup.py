@@ -0,0 +1,119 @@
+"""Background warm-up of cold-start costs and readiness reporting.
+
+On a fresh container the first voice command would otherwise pay for DNS
+resolution, the SOCKS/TLS handshakes to api.groq.com, creating the system
+prompt file and the first weather fetch. run_warmup() does all of that once at
+startup so /readyz can tell when the relay is warm.
+"""
+
+import socket
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from src.settings import settings
+from src.http_session import get_session, proxies_for
+from src.prompt import load_system_prompt, prompt_providers
+
+logger = logging.getLogger(__name__)
+
+GROQ_HOST = "api.groq.com"
+GROQ_MODELS_URL = "https://api.groq.com/openai/v1/models"
+
+_ready = threading.Event()
+_steps = {}
+_steps_lock = threading.Lock()
+
+
+def _warm_dns():
+    """Resolve the host the first Groq connection will actually dial."""
+    host, port = GROQ_HOST, 443
+    if settings.groq_proxy:
+        # With a proxy the TCP connection goes to the proxy, not to Groq.
+        parsed = urlparse(settings.groq_proxy)
+        host, port = parsed.hostname, parsed.port or 1080
+    socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+
+
+def _warm_groq_connection():
+    """Open a pooled (proxied) TLS connection to Groq with a cheap GET."""
+    headers = {"Authorization": f"Bearer {settings.groq_api_key}"}
+    response = get_session().get(
+        GROQ_MODELS_URL,
+        headers=headers,
+        proxies=proxies_for(settings.groq_proxy),
+        verify=False,
+        timeout=10,
+    )
+    # Drain the body so the connection goes back to the pool.
+    _ = response.content
+    if response.status_code != 200:
+        raise RuntimeError(f"Groq returned HTTP {response.status_code}")
+
+
+def _warm_weather():
+    """Fetch the weather once so the provider has a last known value."""
+    if prompt_providers.get("weather").refresh() is None:
+        raise RuntimeError("weather summary unavailable")
+
+
+WARMUP_STEPS = (
+    ("dns", _warm_dns),
+    ("groq_connection", _warm_groq_connection),
+    ("system_prompt", load_system_prompt),
+    ("weather", _warm_weather),
+)
+
+
+def _record(name, ok, seconds, error=None):
+    entry = {"ok": ok, "seconds": round(seconds, 4)}
+    if error is not None:
+        entry["error"] = error
+    with _steps_lock:
+        _steps[name] = entry
+
+
+def run_warmup(steps=WARMUP_STEPS):
+    """Run every warm-up step in order and mark the relay ready afterwards.
+
+    A failing step is recorded but never blocks readiness: the relay still
+    works cold, it is just slower on the first request.
+    """
+    total_start = time.monotonic()
+    for name, step in steps:
+        start = time.monotonic()
+        try:
+            step()
+        except Exception as e:  # any failure just means that step stays cold
+            _record(name, False, time.monotonic() - start, str(e))
+            logger.warning("Warm-up step '%s' failed: %s", name, e)
+        else:
+            _record(name, True, time.monotonic() - start)
+    _ready.set()
+    logger.info("Warm-up finished in %.3fs", time.monotonic() - total_start)
+
+
+def start_warmup():
+    """Run the warm-up in a daemon thread so the server can accept requests."""
+    thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def readiness_report():
+    """Return a JSON-serializable dict with readiness and per-step timings."""
+    with _steps_lock:
+        steps = {name: dict(entry) for name, entry in _steps.items()}
+    return {"ready": is_ready(), "steps": steps}
+
+
+def _reset():
+    """Forget warm-up results (used by tests)."""
+    _ready.clear()
+    with _steps_lock:
+        _steps.clear()
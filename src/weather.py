@@ -2,7 +2,7 @@
 
 import logging
 
-import requests  # type: ignore
+from src.http_session import get_session, proxies_for
 
 logger = logging.getLogger(__name__)
 
@@ -15,10 +15,12 @@ def get_weather_summary(city_name, api_key, proxy=None):
     Optional proxy (SOCKS/HTTP, e.g. "socks5h://host:1080") routes the request;
     None/empty means a direct request.
     """
+    import requests  # type: ignore  # deferred to keep startup imports light
+
     try:
         params = { "q": city_name, "appid": api_key, "units": "metric", "lang": "ru" }
-        proxies = {"https": proxy, "http": proxy} if proxy else None
-        response = requests.get(OPENWEATHERMAP_URL, params=params, proxies=proxies, verify=False, timeout=8)
+        proxies = proxies_for(proxy)
+        response = get_session().get(OPENWEATHERMAP_URL, params=params, proxies=proxies, verify=False, timeout=8)
         logger.info( f"OpenWeatherMap response status for city '{city_name}': {response.status_code}" )
         if response.status_code != 200:
             logger.error( f"OpenWeatherMap error for city '{city_name}': {response.status_code} - {response.text}" )
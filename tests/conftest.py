@@ -1,5 +1,12 @@
 import os
+import tempfile
 
 os.environ.setdefault("GROQ_API_KEY", "test-groq-key")
 os.environ.setdefault("WEATHER_API_KEY", "test-weather-key")
 os.environ.setdefault("SMARTHOME_URL", "http://smarthome.test/voice_command")
+# Keep runtime state written by tests (SQLite history, ...) out of data/.
+_state_dir = tempfile.mkdtemp()
+os.environ.setdefault("HISTORY_PATH", os.path.join(_state_dir, "history.db"))
+os.environ.setdefault("SHARED_STATE_PATH", os.path.join(_state_dir, "shared_state.db"))
+os.environ.setdefault("DEVICES_PATH", os.path.join(_state_dir, "devices.json"))
+os.environ.setdefault("SCHEDULER_PATH", os.path.join(_state_dir, "scheduler.db"))
@@ -0,0 +1,49 @@
+import threading
+import time
+
+from src.admission import Lane
+
+
+def test_lane_admits_up_to_concurrency_limit():
+    lane = Lane("test", max_concurrency=2, max_queue=0, max_wait=1.0)
+    assert lane.acquire() is True
+    assert lane.acquire() is True
+    # Queue of size 0: a third request is refused immediately.
+    started = time.monotonic()
+    assert lane.acquire() is False
+    assert time.monotonic() - started < 0.1
+    assert lane.snapshot()["rejected"] == 1
+    lane.release()
+    assert lane.acquire() is True
+
+
+def test_lane_queued_request_gets_slot_on_release():
+    lane = Lane("test", max_concurrency=1, max_queue=1, max_wait=2.0)
+    assert lane.acquire() is True
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(lane.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    assert lane.snapshot()["queue_depth"] == 1
+    lane.release()
+    waiter.join(2)
+    assert results == [True]
+    snapshot = lane.snapshot()
+    assert snapshot["queue_depth"] == 0
+    assert snapshot["max_wait_seconds"] > 0
+
+
+def test_lane_wait_times_out():
+    lane = Lane("test", max_concurrency=1, max_queue=4, max_wait=0.05)
+    assert lane.acquire() is True
+    assert lane.acquire() is False
+    assert lane.snapshot()["timed_out"] == 1
+
+
+def test_slot_releases_on_exit():
+    lane = Lane("test", max_concurrency=1, max_queue=0, max_wait=0.1)
+    with lane.slot() as admitted:
+        assert admitted is True
+        with lane.slot() as second:
+            assert second is False
+    assert lane.snapshot()["active"] == 0
@@ -0,0 +1,129 @@
+"""Micro-benchmarks of the per-request text and audio paths.
+
+Each case is timed (best of several repeats, per call) and compared with its
+budget in tests/bench_budget.json. Budgets are generous ceilings, not
+targets: they catch accidental complexity regressions (e.g. a quadratic
+regex), not noise. The scaling checks compare a function with itself on a
+larger input, so they hold on a slow or noisy CI runner too. Run with
+`make bench` or `pytest -m bench`; CI runs them on every push.
+"""
+
+import importlib.util
+import json
+import os
+import timeit
+
+import pytest
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+from src.commands import extract_command_blocks, parse_command_payload
+from src.stt_client import _extract_file_part
+from src.text import StreamCleaner, extract_request_text, processing_response
+
+pytestmark = pytest.mark.bench
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(ROOT, "tests", "bench_budget.json"), encoding="utf-8") as f:
+    BUDGET = json.load(f)
+
+
+def _load_audio_module():
+    # Loaded by path: importing the ha_voice_logic_stt package needs Home Assistant.
+    spec = importlib.util.spec_from_file_location(
+        "ha_voice_logic_stt_audio", os.path.join(ROOT, "ha_voice_logic_stt", "audio.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+pcm_to_wav = _load_audio_module().pcm_to_wav
+
+# Inputs -----------------------------------------------------------------
+
+SENTENCE = "Конечно, кожаный ублюдок, я знаю что делать: на улице 5°С и ветер 3 м/с, влажность 80%. "
+LONG_REPLY = SENTENCE * 250  # ~20 KB
+MANY_COMMANDS = "Включаю всё. " + "".join(
+    f"<command>device_{i}:{i % 100}</command> и " for i in range(200)
+)
+BIG_THINK = "<think>" + "рассуждаю о свете в зале и смысле жизни. " * 1200 + "</think>Ладно, включаю."
+REQUEST = {"request": {"text": "включи свет в зале", "source": "homeassistant"}, "device": {"id": "sat1"}}
+
+AUDIO_BYTES = 5 * 1024 * 1024  # ~2.7 minutes of 16 kHz 16-bit mono PCM
+PCM = bytes(range(256)) * (AUDIO_BYTES // 256)
+_multipart = MultipartEncoder(fields={
+    "model": "whisper-1",
+    "file": ("audio.wav", pcm_to_wav(PCM), "audio/wav"),
+})
+MULTIPART_BODY = _multipart.to_string()
+MULTIPART_TYPE = _multipart.content_type
+
+
+def _stream(text, step=8):
+    cleaner = StreamCleaner()
+    for i in range(0, len(text), step):
+        cleaner.feed(text[i:i + step])
+    return cleaner.flush()
+
+
+CASES = {
+    "extract_request_text": lambda: extract_request_text(REQUEST),
+    "extract_command_blocks_long_reply": lambda: extract_command_blocks(LONG_REPLY),
+    "extract_command_blocks_many_tags": lambda: extract_command_blocks(MANY_COMMANDS),
+    "parse_command_payload": lambda: parse_command_payload("room_light:brightness=70,color_temp=3000"),
+    "processing_response_long_reply": lambda: processing_response(LONG_REPLY),
+    "processing_response_many_tags": lambda: processing_response(MANY_COMMANDS),
+    "processing_response_big_think": lambda: processing_response(BIG_THINK),
+    "stream_cleaner_big_think": lambda: _stream(BIG_THINK),
+    "extract_file_part_5mb": lambda: _extract_file_part(MULTIPART_BODY, MULTIPART_TYPE),
+    "pcm_to_wav_5mb": lambda: pcm_to_wav(PCM),
+}
+
+
+def _per_call_seconds(fn):
+    timer = timeit.Timer(fn)
+    number, _elapsed = timer.autorange()
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+
+def test_every_case_has_a_budget():
+    assert set(CASES) == set(BUDGET)
+
+
+# Text-path functions must stay linear: SCALE times the input may cost at
+# most MAX_SCALING_RATIO times the time (a quadratic path would cost ~SCALE**2).
+SCALE = 8
+MAX_SCALING_RATIO = 20
+
+SCALING_CASES = {
+    "extract_command_blocks": (
+        lambda n: "Включаю. " + "".join(f"<command>device_{i}:on</command> и " for i in range(n)),
+        extract_command_blocks,
+    ),
+    "processing_response": (
+        lambda n: "<think>" + "рассуждаю о свете. " * n + "</think>" + SENTENCE * n,
+        processing_response,
+    ),
+    "stream_cleaner": (
+        lambda n: "<think>" + "рассуждаю о свете. " * n + "</think>" + SENTENCE * n,
+        _stream,
+    ),
+}
+
+
+@pytest.mark.parametrize("name", sorted(SCALING_CASES))
+def test_scales_linearly(name):
+    make_input, fn = SCALING_CASES[name]
+    small, large = make_input(100), make_input(100 * SCALE)
+    ratio = _per_call_seconds(lambda: fn(large)) / _per_call_seconds(lambda: fn(small))
+    print(f"{name}: x{SCALE} input costs x{ratio:.1f} time")
+    assert ratio <= MAX_SCALING_RATIO, f"{name}: x{SCALE} input took x{ratio:.1f} time"
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_within_budget(name):
+    seconds = _per_call_seconds(CASES[name])
+    budget = BUDGET[name]
+    print(f"{name}: {seconds * 1e6:.1f} us (budget {budget * 1e6:.0f} us)")
+    assert seconds <= budget, f"{name} took {seconds * 1e6:.1f} us, budget is {budget * 1e6:.0f} us"
@@ -1,4 +1,8 @@
+import pytest
+import requests
+
 from src import commands
+from src.http_session import get_session
 
 
 def test_extract_command_blocks_multiple():
@@ -41,7 +45,8 @@ def test_process_commands_in_content(monkeypatch):
         calls.append((args, kwargs))
         return None
 
-    monkeypatch.setattr(commands.requests, "post", fake_post)
+    monkeypatch.setattr(commands, "_transport", commands.HttpTransport())
+    monkeypatch.setattr(get_session(), "post", fake_post)
 
     content = "<command>room_light:on</command><command>room_ac:22</command>"
     result = commands.process_commands_in_content(content)
@@ -51,3 +56,112 @@ def test_process_commands_in_content(monkeypatch):
         {"device_id": "room_light", "value": "on"},
         {"device_id": "room_ac", "value": "22"},
     ]
+
+
+class FakeConnection:
+    def __init__(self, result=None):
+        self.calls = []
+        self.result = result or {"type": "result", "success": True}
+
+    def call(self, message, timeout=5.0):
+        self.calls.append(message)
+        return self.result
+
+
+class FakeStates:
+    def entity_id(self, device_id):
+        return {"room_light": "light.room_light", "room_ac": "climate.room_ac"}.get(device_id)
+
+
+def test_handle_command_uses_configured_transport(monkeypatch):
+    sent = []
+
+    class RecordingTransport:
+        name = "recording"
+
+        def send(self, command_dict):
+            sent.append(command_dict)
+
+    monkeypatch.setattr(commands, "_transport", RecordingTransport())
+    commands.handle_command({"device_id": "room_light", "value": "on"})
+    assert sent == [{"device_id": "room_light", "value": "on"}]
+
+
+def test_handle_command_logs_http_failures(monkeypatch, caplog):
+    def failing_post(*args, **kwargs):
+        raise requests.ConnectionError("smart home is down")
+
+    monkeypatch.setattr(commands, "_transport", commands.HttpTransport())
+    monkeypatch.setattr(get_session(), "post", failing_post)
+    commands.handle_command({"device_id": "room_light", "value": "on"})
+    assert "smart home is down" in caplog.text
+
+
+def test_create_transport_rejects_unknown_name():
+    try:
+        commands.create_transport("pigeon")
+    except ValueError as e:
+        assert "pigeon" in str(e)
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_ha_websocket_transport_calls_service():
+    connection = FakeConnection()
+    transport = commands.HaWebSocketTransport(connection, FakeStates())
+
+    transport.send({"device_id": "room_light", "value": "70"})
+    transport.send({"device_id": "room_ac", "value": "22"})
+    transport.send({"device_id": "room_light", "value": "off"})
+
+    assert connection.calls[0] == {
+        "type": "call_service",
+        "domain": "light",
+        "service": "turn_on",
+        "service_data": {"brightness_pct": 70},
+        "target": {"entity_id": "light.room_light"},
+    }
+    assert connection.calls[1]["service"] == "set_temperature"
+    assert connection.calls[1]["service_data"] == {"temperature": 22.0}
+    assert (connection.calls[2]["domain"], connection.calls[2]["service"]) == ("homeassistant", "turn_off")
+
+
+@pytest.mark.parametrize("value, service", [
+    ("open", "open_cover"), ("close", "close_cover"), ("stop", "stop_cover"),
+])
+def test_ha_service_call_maps_cover_states(value, service):
+    assert commands.ha_service_call("cover.garage", value) == ("cover", service, {})
+
+
+def test_ha_websocket_transport_drops_unknown_device():
+    connection = FakeConnection()
+    transport = commands.HaWebSocketTransport(connection, FakeStates())
+    transport.send({"device_id": "garage_door", "value": "on"})
+    transport.send(None)
+    assert connection.calls == []
+
+
+def test_mqtt_transport_publishes_command_payload():
+    published = []
+
+    class FakeClient:
+        def publish(self, topic, payload, qos=0):
+            published.append((topic, payload, qos))
+
+    transport = commands.MqttTransport("broker", 1883, "voice/command", client=FakeClient())
+    transport.send({"device_id": "room_light", "value": "on"})
+    assert published == [
+        ("voice/command", '{"command": {"device_id": "room_light", "value": "on"}}', 1)
+    ]
+
+
+def test_device_ids_from_prompt():
+    prompt = "Лампа. ID: kitchen_light\nНочник. ID: night_light. (команда)\nЗамок: ID: main_lock (это не свет)"
+    assert commands.device_ids_from_prompt(prompt) == ["kitchen_light", "night_light", "main_lock"]
+
+
+def test_parse_tool_call():
+    call = {"function": {"name": "control_device", "arguments": '{"device_id": "room_ac", "value": 22}'}}
+    assert commands.parse_tool_call(call) == {"device_id": "room_ac", "value": "22"}
+    assert commands.parse_tool_call({"function": {"name": "other", "arguments": "{}"}}) is None
+    assert commands.parse_tool_call({"function": {"name": "control_device", "arguments": "nope"}}) is None
@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from src import deadline as dl
+
+
+def test_parse_deadline_header_applies_margin():
+    d = dl.parse_deadline_header("30000", margin=0.5)
+    assert 29.0 < d.remaining() <= 29.5
+
+
+@pytest.mark.parametrize("value", [None, "", "abc", "0", "-5"])
+def test_parse_deadline_header_ignores_missing_or_invalid(value):
+    assert dl.parse_deadline_header(value, margin=0.5) is None
+
+
+def test_upstream_timeout_without_deadline_returns_cap():
+    assert dl.upstream_timeout(300) == 300
+
+
+def test_upstream_timeout_is_bounded_by_remaining_budget():
+    token = dl.set_deadline(dl.Deadline(2.0))
+    try:
+        assert dl.upstream_timeout(300) <= 2.0
+        assert dl.upstream_timeout(1) == 1
+    finally:
+        dl.reset_deadline(token)
+
+
+def test_expired_deadline_raises():
+    token = dl.set_deadline(dl.Deadline(0.01))
+    try:
+        time.sleep(0.02)
+        with pytest.raises(dl.DeadlineExceeded):
+            dl.upstream_timeout(300)
+        with pytest.raises(dl.DeadlineExceeded):
+            dl.check_cancelled()
+    finally:
+        dl.reset_deadline(token)
+
+
+def test_client_disconnect_cancels():
+    token = dl.set_deadline(dl.Deadline(30, is_disconnected=lambda: True))
+    try:
+        with pytest.raises(dl.DeadlineExceeded):
+            dl.check_cancelled()
+    finally:
+        dl.reset_deadline(token)
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from src import commands
+from src.device_registry import DeviceRegistry, DeviceSpec
+
+
+@pytest.fixture
+def registry(tmp_path):
+    path = tmp_path / "devices.json"
+    path.write_text(json.dumps({"devices": [
+        {"id": "room_light", "type": "light", "aliases": ["big_light"],
+         "attributes": {"brightness": {"min": 0, "max": 100}, "color_temp": {"min": 2700, "max": 6500}}},
+        {"id": "room_ac", "type": "climate", "min": 16, "max": 30, "entity_id": "climate.living_ac"},
+        {"id": "main_lock", "type": "lock"},
+    ]}))
+    return DeviceRegistry.load(str(path))
+
+
+def test_values_are_normalized(registry):
+    assert registry.parse("room_light:ON") == {"device_id": "room_light", "value": "on"}
+    assert registry.parse("room_light: 70.0") == {"device_id": "room_light", "value": "70"}
+    assert registry.parse("room_ac:22.5") == {"device_id": "room_ac", "value": "22.5"}
+    assert registry.parse("big_light:off") == {"device_id": "room_light", "value": "off"}
+
+
+def test_multi_attribute_payload(registry):
+    assert registry.parse("room_light:brightness=70,color_temp=3000") == {
+        "device_id": "room_light",
+        "value": "on",
+        "attributes": {"brightness": "70", "color_temp": "3000"},
+    }
+
+
+@pytest.mark.parametrize("payload", [
+    "garage:on",               # unknown device
+    "room_ac:45",              # out of range
+    "main_lock:50",            # lock takes no numbers
+    "room_light:dim",          # not a state
+    "room_light:hue=10",       # unknown attribute
+    "room_light:on,off",       # two values
+    "room_light",              # no value
+])
+def test_invalid_commands_are_rejected(registry, payload):
+    with pytest.raises(ValueError):
+        registry.parse(payload)
+
+
+def test_missing_file_accepts_anything(tmp_path):
+    registry = DeviceRegistry.load(str(tmp_path / "absent.json"))
+    assert len(registry) == 0
+    assert registry.parse("anything:42") == {"device_id": "anything", "value": "42"}
+
+
+def test_unknown_device_type_is_an_error():
+    with pytest.raises(ValueError):
+        DeviceSpec("x", device_type="toaster")
+
+
+def test_rejected_commands_are_not_sent(registry, monkeypatch):
+    sent = []
+    monkeypatch.setattr(commands, "device_registry", registry)
+    monkeypatch.setattr(commands, "handle_command", sent.append)
+
+    result = commands.process_commands_in_content(
+        "<command>room_ac:45</command><command>room_ac:22</command><command>what?</command>"
+    )
+
+    assert result == sent == [{"device_id": "room_ac", "value": "22"}]
+
+
+def test_registry_drives_tools_and_entity_mapping(registry, monkeypatch):
+    monkeypatch.setattr(commands, "device_registry", registry)
+    assert commands.tool_device_ids("ID: other_device") == ["room_light", "room_ac", "main_lock"]
+
+    call = {"function": {"name": "control_device",
+                         "arguments": '{"device_id": "room_light", "value": "on", "attributes": {"brightness": 40}}'}}
+    command = commands.parse_tool_call(call)
+    assert command == {"device_id": "room_light", "value": "on", "attributes": {"brightness": "40"}}
+
+    class Connection:
+        calls = []
+
+        def call(self, message, timeout=5.0):
+            self.calls.append(message)
+            return {"success": True}
+
+    class NoStates:
+        def entity_id(self, device_id):
+            return None
+
+    transport = commands.HaWebSocketTransport(Connection(), NoStates())
+    transport.send({"device_id": "room_ac", "value": "21"})
+    assert Connection.calls[0]["target"] == {"entity_id": "climate.living_ac"}
+    assert commands.ha_service_call("light.room_light", "on", {"brightness": "40", "color_temp": "3000"}) == (
+        "light", "turn_on", {"brightness_pct": 40, "color_temp_kelvin": 3000},
+    )
+
+
+def test_example_registry_covers_default_prompt_devices():
+    registry = DeviceRegistry.load("templates/devices.example.json")
+    with open("templates/default_prompt.md", encoding="utf-8") as f:
+        prompt_ids = commands.device_ids_from_prompt(f.read())
+    assert sorted(registry.ids()) == sorted(prompt_ids)
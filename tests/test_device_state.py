@@ -0,0 +1,117 @@
+import json
+import queue
+import time
+
+from src.device_state import DeviceStateCache
+from src.ha_websocket import HomeAssistantWebSocket, websocket_url
+
+STATES = [
+    {"entity_id": "light.room_light", "state": "on", "attributes": {"brightness": 128}},
+    {"entity_id": "climate.room_ac", "state": "cool", "attributes": {"temperature": 22}},
+    {"entity_id": "sensor.outside", "state": "3", "attributes": {}},
+]
+
+
+class StubHomeAssistant:
+    """Local stand-in for HA's websocket API, speaking its JSON protocol."""
+
+    def __init__(self):
+        self.inbox = queue.Queue()
+        self.sent = []
+        self.subscription_id = None
+        self.inbox.put({"type": "auth_required"})
+
+    # websocket-client connection interface
+    def recv(self):
+        message = self.inbox.get(timeout=5)
+        return None if message is None else json.dumps(message)
+
+    def send(self, raw):
+        message = json.loads(raw)
+        self.sent.append(message)
+        if message["type"] == "auth":
+            ok = message["access_token"] == "token"
+            self.inbox.put({"type": "auth_ok" if ok else "auth_invalid"})
+        elif message["type"] == "get_states":
+            self.inbox.put({"id": message["id"], "type": "result", "success": True, "result": STATES})
+        elif message["type"] == "subscribe_events":
+            self.subscription_id = message["id"]
+            self.inbox.put({"id": message["id"], "type": "result", "success": True, "result": None})
+
+    def settimeout(self, _timeout):
+        pass
+
+    def close(self):
+        self.inbox.put(None)
+
+    def push_state(self, entity_id, new_state):
+        self.inbox.put({
+            "id": self.subscription_id,
+            "type": "event",
+            "event": {"event_type": "state_changed", "data": {"entity_id": entity_id, "new_state": new_state}},
+        })
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_websocket_url():
+    assert websocket_url("http://ha:8123") == "ws://ha:8123/api/websocket"
+    assert websocket_url("https://ha.example/") == "wss://ha.example/api/websocket"
+
+
+def test_cache_syncs_over_websocket_and_follows_events():
+    stub = StubHomeAssistant()
+    client = HomeAssistantWebSocket("ws://stub", "token", connect=lambda url, timeout: stub)
+    cache = DeviceStateCache(["light", "climate"])
+    cache.attach(client)
+    client.start()
+    try:
+        assert _wait_for(lambda: cache.snippet() is not None)
+        assert cache.snippet() == "Состояние устройств: room_ac: cool 22; room_light: on 50%."
+        assert cache.entity_id("room_light") == "light.room_light"
+        assert cache.entity_id("outside") is None
+
+        assert _wait_for(lambda: stub.subscription_id is not None)
+        stub.push_state("light.room_light", {"entity_id": "light.room_light", "state": "off", "attributes": {}})
+        assert _wait_for(lambda: "room_light: off" in cache.snippet())
+
+        # Exactly one subscription, no per-request polling.
+        types = [m["type"] for m in stub.sent]
+        assert types.count("subscribe_events") == 1
+        assert types.count("get_states") == 1
+    finally:
+        client.stop()
+
+
+def test_cache_attached_after_connect_still_loads_states():
+    stub = StubHomeAssistant()
+    client = HomeAssistantWebSocket("ws://stub", "token", connect=lambda url, timeout: stub)
+    client.start()
+    try:
+        # Authentication finished before the cache registered its handlers.
+        assert client.wait_connected(2)
+        cache = DeviceStateCache(["light", "climate"])
+        cache.attach(client)
+        assert _wait_for(lambda: cache.snippet() is not None)
+        assert [m["type"] for m in stub.sent].count("subscribe_events") == 1
+    finally:
+        client.stop()
+
+
+def test_untracked_domains_and_removals():
+    cache = DeviceStateCache(["light"])
+    cache.load_states(STATES)
+    assert cache.snippet() == "Состояние устройств: room_light: on 50%."
+
+    cache.handle_event({"data": {"entity_id": "sensor.outside", "new_state": {"state": "4"}}})
+    assert cache.state("sensor.outside") is None
+
+    cache.handle_event({"data": {"entity_id": "light.room_light", "new_state": None}})
+    assert cache.snippet() is None
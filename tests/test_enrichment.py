@@ -0,0 +1,70 @@
+import threading
+import time
+
+from src.enrichment import ProviderGroup
+
+
+def test_gather_returns_lines_in_registration_order():
+    group = ProviderGroup()
+    group.register("a", lambda: "line a", deadline=1.0)
+    group.register("none", lambda: None, deadline=1.0)
+    group.register("b", lambda: "line b", deadline=1.0)
+    assert group.gather(budget=1.0) == [("a", "line a"), ("b", "line b")]
+
+
+def test_gather_runs_providers_concurrently_within_budget():
+    group = ProviderGroup()
+    group.register("slow1", lambda: time.sleep(0.2) or "one", deadline=1.0)
+    group.register("slow2", lambda: time.sleep(0.2) or "two", deadline=1.0)
+    started = time.monotonic()
+    assert group.gather(budget=1.0) == [("slow1", "one"), ("slow2", "two")]
+    assert time.monotonic() - started < 0.35
+
+
+def test_missed_deadline_uses_last_known_value():
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(2)
+        return f"value {len(calls)}"
+
+    group = ProviderGroup()
+    group.register("weather", fetch, deadline=0.05)
+    assert group.gather(budget=1.0) == [("weather", "value 1")]
+
+    started = time.monotonic()
+    assert group.gather(budget=1.0) == [("weather", "value 1")]
+    assert time.monotonic() - started < 0.5
+    release.set()
+
+
+def test_missed_deadline_without_history_contributes_nothing():
+    release = threading.Event()
+    group = ProviderGroup()
+    group.register("fast", lambda: "fast", deadline=1.0)
+    group.register("hung", lambda: release.wait(2) and "late", deadline=0.05)
+    assert group.gather(budget=1.0) == [("fast", "fast")]
+    release.set()
+
+
+def test_budget_caps_provider_deadline():
+    release = threading.Event()
+    group = ProviderGroup()
+    group.register("hung", lambda: release.wait(2) and "late", deadline=5.0)
+    started = time.monotonic()
+    assert group.gather(budget=0.1) == []
+    assert time.monotonic() - started < 0.5
+    release.set()
+
+
+def test_failing_provider_is_skipped():
+    def boom():
+        raise RuntimeError("boom")
+
+    group = ProviderGroup()
+    group.register("boom", boom, deadline=1.0)
+    group.register("ok", lambda: "ok", deadline=1.0)
+    assert group.gather(budget=1.0) == [("ok", "ok")]
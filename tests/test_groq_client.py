@@ -0,0 +1,202 @@
+import json
+import threading
+
+import pytest
+
+from src import commands, groq_client
+from src.settings import settings
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.headers = headers or {}
+        self.text = json.dumps(self._payload)
+
+    def json(self):
+        return self._payload
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def groq(monkeypatch):
+    """Capture outgoing Groq requests and dispatched commands."""
+    captured = {"requests": [], "commands": []}
+    replies = []
+
+    def fake_post(url, **kwargs):
+        captured["requests"].append(kwargs)
+        return replies.pop(0)
+
+    monkeypatch.setattr(groq_client.get_session(), "post", fake_post)
+    monkeypatch.setattr(groq_client, "build_system_prompt", lambda text=None, enrichment=None: "Лампа. ID: room_light.\nКондиционер. ID: room_ac")
+    monkeypatch.setattr(commands, "handle_command", lambda c: captured["commands"].append(c))
+    monkeypatch.setattr(groq_client, "_rate_limited_until", 0.0)
+    captured["replies"] = replies
+    return captured
+
+
+def _completion(content, tool_calls=None):
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return FakeResponse(200, {"choices": [{"message": message}]})
+
+
+def _tool_call(device_id, value):
+    arguments = json.dumps({"device_id": device_id, "value": value})
+    return {"type": "function", "function": {"name": "control_device", "arguments": arguments}}
+
+
+def test_tag_commands_are_dispatched_and_stripped(groq):
+    groq["replies"].append(_completion("Ладно.<command>room_light:on</command>"))
+    assert groq_client.call_groq_api("включи свет") == "Ладно."
+    assert groq["commands"] == [{"device_id": "room_light", "value": "on"}]
+    assert "tools" not in groq["requests"][0]["json"]
+
+
+def test_tool_calling_declares_tools_and_dispatches_calls(groq, monkeypatch):
+    monkeypatch.setattr(settings, "groq_tool_calling", True)
+    groq["replies"].append(_completion(None, [_tool_call("room_light", "on"), _tool_call("room_ac", 22)]))
+
+    assert groq_client.call_groq_api("включи свет и кондей на 22") == groq_client.TOOLS_ONLY_REPLY
+
+    payload = groq["requests"][0]["json"]
+    assert payload["parallel_tool_calls"] is True
+    schema = payload["tools"][0]["function"]["parameters"]["properties"]["device_id"]
+    assert schema["enum"] == ["room_light", "room_ac"]
+    assert groq["commands"] == [
+        {"device_id": "room_light", "value": "on"},
+        {"device_id": "room_ac", "value": "22"},
+    ]
+
+
+def test_tool_calling_falls_back_to_tags(groq, monkeypatch):
+    monkeypatch.setattr(settings, "groq_tool_calling", True)
+    groq["replies"].append(_completion("Ок<command>room_light:off</command>"))
+    assert groq_client.call_groq_api("выключи свет") == "Ок"
+    assert groq["commands"] == [{"device_id": "room_light", "value": "off"}]
+
+
+class FakeSharedStore:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value, ttl):
+        self.values[key] = value
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_rate_limit_backoff_skips_groq(groq, monkeypatch, workers):
+    store = FakeSharedStore()
+    monkeypatch.setattr(groq_client, "shared_store", store)
+    monkeypatch.setattr(settings, "workers", workers)
+    groq["replies"].append(FakeResponse(429, {"error": {"message": "slow down"}}, {"retry-after": "30"}))
+    assert groq_client.call_groq_api("привет") == groq_client.RATE_LIMITED_REPLY
+    # The backoff is now active: no second request is sent.
+    assert groq_client.call_groq_api("привет") == groq_client.RATE_LIMITED_REPLY
+    assert len(groq["requests"]) == 1
+    # A single process keeps the backoff in memory; workers share it on disk.
+    assert (groq_client.RATE_LIMIT_KEY in store.values) == (workers > 1)
+
+
+class FakeStream(FakeResponse):
+    def __init__(self, deltas):
+        super().__init__(200)
+        self._deltas = deltas
+
+    def iter_lines(self):
+        for delta in self._deltas:
+            event = {"choices": [{"delta": {"content": delta}}]}
+            yield b"data: " + json.dumps(event, ensure_ascii=False).encode()
+            yield b""
+        yield b"data: [DONE]"
+
+
+def test_stream_yields_clean_pieces_and_dispatches_commands_at_end(groq):
+    groq["replies"].append(FakeStream(["Включаю ", "свет, кожаный. <comm", "and>room_light:on</command>", " Радуйся."]))
+
+    stream = groq_client.stream_groq_api("включи свет")
+    first = next(stream)
+    assert first == "Включаю "
+    assert groq["commands"] == []
+    rest = "".join(stream)
+
+    assert "<command>" not in first + rest
+    assert (first + rest).split() == ["Включаю", "свет,", "кожаный.", "Радуйся."]
+    assert groq["commands"] == [{"device_id": "room_light", "value": "on"}]
+    request = groq["requests"][0]
+    assert request["stream"] is True and request["json"]["stream"] is True
+
+
+def test_stream_error_is_one_piece(groq):
+    groq["replies"].append(FakeResponse(500, {"error": {"message": "boom"}}))
+    assert list(groq_client.stream_groq_api("привет")) == ["Ошибка: boom"]
+
+
+def test_hedged_request_dispatches_commands_once(groq, monkeypatch):
+    monkeypatch.setattr(settings, "groq_hedge_model", "fast-model")
+    release = threading.Event()
+
+    def fake_post(url, **kwargs):
+        groq["requests"].append(kwargs)
+        if kwargs["json"]["model"] == "fast-model":
+            return _completion("Быстро. <command>room_light:on</command>")
+        release.wait(5)
+        return _completion("Медленно. <command>room_light:on</command>")
+
+    recorded = []
+    loser_recorded = threading.Event()
+
+    def record(usage, tier, model, device):
+        recorded.append((model, device))
+        if len(recorded) == 2:
+            loser_recorded.set()
+
+    monkeypatch.setattr(groq_client.get_session(), "post", fake_post)
+    monkeypatch.setattr(groq_client._hedger, "initial_delay", 0.05)
+    monkeypatch.setattr(groq_client._hedger, "_trackers", {})
+    monkeypatch.setattr(groq_client.usage_stats, "record", record)
+    token = groq_client.current_device.set("kitchen")
+
+    try:
+        assert groq_client.call_groq_api("включи свет в зале пожалуйста и побыстрее") == "Быстро."
+    finally:
+        groq_client.current_device.reset(token)
+        release.set()
+    assert groq["commands"] == [{"device_id": "room_light", "value": "on"}]
+    # The discarded primary's quota is counted too, once it finishes.
+    assert loser_recorded.wait(5)
+    primary_model = groq["requests"][0]["json"]["model"]
+    assert sorted(recorded) == sorted([("fast-model", "kitchen"), (primary_model, "kitchen")])
+    hedge_request = groq["requests"][1]["json"]
+    assert hedge_request["model"] == "fast-model"
+    assert "reasoning_effort" not in hedge_request
+
+
+def test_usage_is_recorded_per_tier_model_and_device(groq, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(groq_client.usage_stats, "record",
+                        lambda usage, tier, model, device: recorded.append((usage, tier, model, device)))
+    reply = _completion("Ок")
+    reply._payload["usage"] = {"prompt_tokens": 10, "completion_tokens": 5}
+    groq["replies"].append(reply)
+    token = groq_client.current_device.set("kitchen")
+    try:
+        groq_client.call_groq_api("привет")
+    finally:
+        groq_client.current_device.reset(token)
+
+    assert recorded == [(
+        {"prompt_tokens": 10, "completion_tokens": 5}, "fast",
+        groq["requests"][0]["json"]["model"], "kitchen",
+    )]
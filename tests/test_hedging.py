@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from src.hedging import BACKUP, PRIMARY, Hedger, LatencyTracker
+
+
+@pytest.fixture
+def hedger():
+    return Hedger(initial_delay=0.05, min_delay=0.01, name="test-hedge")
+
+
+def _slow(value, seconds):
+    def run():
+        time.sleep(seconds)
+        return value
+    return run
+
+
+def test_fast_primary_is_not_hedged(hedger):
+    backup_calls = []
+    result = hedger.call("k", lambda: "primary", lambda: backup_calls.append(1))
+    assert result == ("primary", PRIMARY)
+    assert backup_calls == []
+    assert hedger.snapshot()["hedged"] == 0
+
+
+def test_slow_primary_loses_to_backup_and_saving_is_counted(hedger):
+    release = threading.Event()
+    primary_done = threading.Event()
+
+    def primary():
+        release.wait(5)
+        primary_done.set()
+        return "slow"
+
+    assert hedger.call("k", primary, lambda: "fast") == ("fast", BACKUP)
+    time.sleep(0.05)
+    release.set()
+    primary_done.wait(5)
+    deadline = time.monotonic() + 5
+    while hedger.snapshot()["saved_seconds"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    snapshot = hedger.snapshot()
+    assert (snapshot["calls"], snapshot["hedged"], snapshot["backup_wins"]) == (1, 1, 1)
+    assert snapshot["hedge_rate"] == 1.0
+    assert snapshot["saved_seconds"] > 0
+
+
+def test_losing_result_is_reported_once_it_finishes(hedger):
+    losers = []
+    reported = threading.Event()
+
+    def on_loser(result, name):
+        losers.append((result, name))
+        reported.set()
+
+    assert hedger.call("k", _slow("slow", 0.2), lambda: "fast", on_loser=on_loser) == ("fast", BACKUP)
+    assert reported.wait(5)
+    assert losers == [("slow", PRIMARY)]
+
+
+def test_pool_full_of_losers_runs_new_calls_unhedged():
+    hedger = Hedger(initial_delay=0.05, min_delay=0.01, max_workers=2, name="test-hedge")
+    release = threading.Event()
+
+    def stuck():
+        release.wait(5)
+        return "late"
+
+    try:
+        # A losing primary keeps its thread after the backup answered.
+        assert hedger.call("k", stuck, lambda: "fast") == ("fast", BACKUP)
+        # A second caller holds the last thread; its backup finds no free one.
+        waiting = threading.Thread(target=hedger.call, args=("k", stuck, lambda: "fast"))
+        waiting.start()
+        deadline = time.monotonic() + 2
+        while hedger.snapshot()["pool_full"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # With no free thread a new call runs in the caller instead of queueing.
+        caller = threading.current_thread()
+        started = time.monotonic()
+        result = hedger.call("k", lambda: threading.current_thread() is caller, lambda: False)
+        assert result == (True, PRIMARY)
+        assert time.monotonic() - started < 0.5
+        assert hedger.snapshot()["pool_full"] == 2
+    finally:
+        release.set()
+    waiting.join(5)
+
+
+def test_unacceptable_backup_falls_back_to_primary(hedger):
+    result = hedger.call("k", _slow("good", 0.1), lambda: "bad", accept=lambda r: r == "good")
+    assert result == ("good", PRIMARY)
+
+
+def test_primary_exception_is_raised_without_acceptable_backup(hedger):
+    def boom():
+        time.sleep(0.1)
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        hedger.call("k", boom, lambda: None, accept=lambda r: r is not None)
+
+
+def test_tracker_threshold_follows_latency():
+    tracker = LatencyTracker()
+    assert tracker.threshold(initial=3.0, minimum=0.5) == 3.0
+    for _ in range(50):
+        tracker.observe(1.0)
+    assert 0.99 < tracker.threshold(initial=3.0, minimum=0.5) < 1.2
+    assert tracker.threshold(initial=3.0, minimum=2.0) == 2.0
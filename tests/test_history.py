@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from src.history import HistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = HistoryStore(str(tmp_path / "history.db"), retention_days=1, flush_interval=0.05)
+    yield s
+    s.stop()
+
+
+def test_records_are_written_in_background_and_queryable(store):
+    store.record_conversation("sat_kitchen", "включи свет", "включила", 120)
+    store.record_conversation("sat_room", "который час", "поздно", 80)
+    store.record_command("sat_kitchen", {"device_id": "kitchen_light", "value": "on"})
+    store.flush()
+
+    rows = store.query()
+    assert [r["user_text"] for r in rows] == ["который час", "включи свет"]
+    assert store.query(device_id="sat_kitchen")[0]["reply"] == "включила"
+
+    commands = store.query(kind="commands")
+    assert commands[0]["command"] == '{"device_id": "kitchen_light", "value": "on"}'
+
+
+def test_query_filters_by_since_and_limit(store):
+    for i in range(5):
+        store.record_conversation(None, f"q{i}", "a")
+    store.flush()
+    assert len(store.query(limit=2)) == 2
+    assert store.query(since=time.time() + 60) == []
+
+
+def test_query_before_any_write_creates_nothing(store):
+    import os
+
+    assert store.query() == []
+    assert not os.path.exists(store.path)
+
+
+def test_query_rejects_unknown_kind(store):
+    with pytest.raises(ValueError):
+        store.query(kind="users")
+
+
+def test_compaction_removes_rows_past_retention(store):
+    store.record_conversation(None, "old", "a")
+    store.flush()
+    store.retention_days = -1  # everything is now older than the retention
+    store.compact()
+    assert store.query() == []
+
+
+def test_uses_wal_mode(store):
+    import sqlite3
+
+    store.record_conversation(None, "q", "a")
+    store.flush()
+    connection = sqlite3.connect(store.path)
+    try:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    finally:
+        connection.close()
+
+
+def test_unwritable_database_never_fails_the_request_path(tmp_path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    broken = HistoryStore(str(blocker / "history.db"), retention_days=1, flush_interval=0.05)
+    try:
+        broken.record_conversation("sat", "q", "a")
+        broken.record_command("sat", {"device_id": "lamp", "value": "on"})
+        broken.flush()
+        assert broken.dropped == 2
+    finally:
+        broken.stop()
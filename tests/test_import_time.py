@@ -0,0 +1,57 @@
+"""Cold-start cost of importing the server.
+
+`python -X importtime -c "import src.server"` runs in a clean subprocess
+without the required settings in the environment: the import must not
+validate settings, and route-specific dependencies (HTTP client, multipart
+decoder, websocket, MQTT) must load only when first used. The total import
+time is checked against IMPORT_BUDGET_SECONDS with the benchmarks.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFERRED_MODULES = ("requests", "requests_toolbelt", "urllib3", "websocket", "paho")
+# Generous ceiling (about 3x a local measurement), like tests/bench_budget.json.
+IMPORT_BUDGET_SECONDS = 0.6
+
+
+def _import_times(module="src.server"):
+    """Return {module: cumulative microseconds} from -X importtime."""
+    env = {
+        name: value for name, value in os.environ.items()
+        if name not in ("GROQ_API_KEY", "WEATHER_API_KEY", "SMARTHOME_URL")
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_server_import_defers_settings_and_route_dependencies():
+    times = _import_times()
+    assert "src.server" in times
+    loaded = sorted(
+        name for name in times if name.split(".", 1)[0] in DEFERRED_MODULES
+    )
+    assert loaded == []
+
+
+@pytest.mark.bench
+def test_server_import_time_budget():
+    budget = IMPORT_BUDGET_SECONDS
+    best = min(_import_times()["src.server"] for _ in range(3)) / 1e6
+    print(f"\nimport src.server: {best * 1000:.1f} ms (budget {budget * 1000:.0f} ms)")
+    assert best <= budget
@@ -0,0 +1,51 @@
+import threading
+
+from src.lazy import LazyObject
+
+
+class Thing:
+    def __init__(self):
+        self.value = 1
+
+    def double(self):
+        return self.value * 2
+
+
+def test_factory_runs_once_on_first_access():
+    calls = []
+    thing = LazyObject(lambda: calls.append(1) or Thing())
+    assert calls == []
+
+    assert thing.double() == 2
+    assert thing.value == 1
+    assert calls == [1]
+
+
+def test_setattr_reaches_the_instance():
+    thing = LazyObject(Thing)
+    thing.value = 5
+    assert thing.double() == 10
+    del thing.value
+    assert not hasattr(thing, "value")
+
+
+def test_concurrent_first_access_builds_one_instance():
+    built = []
+    barrier = threading.Barrier(8)
+
+    def factory():
+        built.append(1)
+        return Thing()
+
+    thing = LazyObject(factory)
+
+    def touch():
+        barrier.wait()
+        thing.double()
+
+    threads = [threading.Thread(target=touch) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert built == [1]
@@ -0,0 +1,63 @@
+import logging
+import logging.handlers
+import queue
+
+from src import logging_setup
+from src.logging_setup import log_payload
+
+logger = logging.getLogger("test_payload")
+
+
+class Unserializable:
+    pass
+
+
+def test_payload_is_skipped_and_never_serialized_by_default(caplog, monkeypatch):
+    monkeypatch.setattr(logging_setup.settings, "log_payload_sample_rate", 0.0)
+    caplog.set_level(logging.INFO, logger="test_payload")
+    # json.dumps would raise on this value if it were formatted.
+    log_payload(logger, "Body", {"x": Unserializable()})
+    assert caplog.records == []
+
+
+def test_sampled_payload_is_compact_and_truncated(caplog, monkeypatch):
+    monkeypatch.setattr(logging_setup.settings, "log_payload_sample_rate", 1.0)
+    monkeypatch.setattr(logging_setup.settings, "log_payload_max_chars", 20)
+    caplog.set_level(logging.INFO, logger="test_payload")
+
+    log_payload(logger, "Body", {"text": "а" * 100})
+
+    [record] = caplog.records
+    assert record.levelno == logging.INFO
+    assert record.getMessage().startswith('Body (sampled): {"text": "аааааааааа')
+    assert record.getMessage().endswith("[92 more chars]")
+
+
+def test_debug_level_logs_every_payload(caplog):
+    caplog.set_level(logging.DEBUG, logger="test_payload")
+    log_payload(logger, "Reply", "короткий ответ")
+    assert [r.getMessage() for r in caplog.records] == ["Reply: короткий ответ"]
+
+
+def test_setup_logging_routes_root_through_a_queue():
+    logging_setup.setup_logging("INFO")
+    root_handlers = logging.getLogger().handlers
+    assert any(isinstance(h, logging.handlers.QueueHandler) for h in root_handlers)
+    assert logging_setup._listener is not None
+
+
+def test_queue_handler_defers_formatting_to_the_listener():
+    class CountingPayload:
+        formatted = 0
+
+        def __str__(self):
+            CountingPayload.formatted += 1
+            return "payload"
+
+    log_queue = queue.SimpleQueue()
+    handler = logging_setup._DeferredQueueHandler(log_queue)
+    record = logger.makeRecord("test_payload", logging.INFO, __file__, 1, "Body: %s", (CountingPayload(),), None)
+    handler.handle(record)
+
+    assert log_queue.get_nowait() is record
+    assert CountingPayload.formatted == 0
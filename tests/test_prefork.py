@@ -0,0 +1,69 @@
+import http.server
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import urllib.request
+
+from src.prefork import ReusePortHTTPServer, run_prefork, serve_worker
+
+
+class PidHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = str(os.getpid()).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, _format, *args):
+        return
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _supervisor(port):
+    def worker_main(_index):
+        with ReusePortHTTPServer(("127.0.0.1", port), PidHandler) as httpd:
+            serve_worker(httpd)
+
+    run_prefork(2, worker_main)
+
+
+def _get(port):
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=2) as r:
+                return int(r.read())
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def test_workers_share_port_and_stop_on_sigterm():
+    port = _free_port()
+    supervisor = multiprocessing.get_context("fork").Process(target=_supervisor, args=(port,))
+    supervisor.start()
+    try:
+        pids = {_get(port) for _ in range(20)}
+        assert pids and supervisor.pid not in pids
+
+        os.kill(supervisor.pid, signal.SIGTERM)
+        supervisor.join(10)
+        assert supervisor.exitcode == 0
+        for pid in pids:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                continue
+            raise AssertionError(f"worker {pid} still running")
+    finally:
+        if supervisor.is_alive():
+            supervisor.kill()
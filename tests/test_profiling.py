@@ -0,0 +1,59 @@
+import threading
+import tracemalloc
+
+import pytest
+
+from src import profiling
+
+
+def _spin_here(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sample_stacks_sees_other_threads():
+    stop = threading.Event()
+    thread = threading.Thread(target=_spin_here, args=(stop,), name="spinner")
+    thread.start()
+    try:
+        counts = profiling.sample_stacks(0.1, interval=0.002)
+    finally:
+        stop.set()
+        thread.join()
+
+    spinner = [stack for stack in counts if stack[0] == "spinner"]
+    assert spinner
+    assert any("test_profiling.py:_spin_here" in stack for stack in spinner)
+    collapsed = profiling.format_collapsed(counts)
+    assert "spinner;" in collapsed and "test_profiling.py:_spin_here" in collapsed
+    assert "test_profiling.py:_spin_here" in profiling.format_top(counts)
+
+
+def test_only_one_profile_at_a_time():
+    with profiling._profile_lock:
+        with pytest.raises(profiling.ProfilerBusy):
+            profiling.sample_stacks(0.01)
+
+
+@pytest.mark.parametrize("seconds, interval", [
+    (float("nan"), 0.005), (float("inf"), 0.005), (0.01, float("nan")),
+])
+def test_non_finite_arguments_are_rejected(seconds, interval):
+    with pytest.raises(ValueError):
+        profiling.sample_stacks(seconds, interval)
+    assert not profiling._profile_lock.locked()
+
+
+def test_memory_start_diff_stop():
+    with pytest.raises(RuntimeError):
+        profiling.memory_diff()
+    profiling.memory_start(frames=1)
+    try:
+        retained = [bytearray(64 * 1024) for _ in range(16)]
+        diff = profiling.memory_diff()
+        assert "test_profiling.py" in diff
+        assert "traced:" in profiling.memory_snapshot()
+        del retained
+    finally:
+        profiling.memory_stop()
+    assert not tracemalloc.is_tracing()
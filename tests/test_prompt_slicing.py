@@ -0,0 +1,72 @@
+from src import prompt_slicing
+from src.prompt_slicing import slice_prompt, split_sections
+
+PROMPT = """### System
+Ты ассистент.
+
+### Instructions (smarthome)
+<!-- keywords: свет, лампа -->
+Включай устройства тегом command.
+
+### Context (you lore)
+<!-- keywords: кто -->
+Давным-давно была лаборатория.
+
+### Current time&data&weather
+
+<<<<<TDW>>>>>
+"""
+
+
+def test_split_sections_marks_core_and_strips_tags():
+    sections = split_sections(PROMPT)
+
+    assert [s.heading for s in sections] == [
+        "System", "Instructions (smarthome)", "Context (you lore)", "Current time&data&weather",
+    ]
+    assert [s.core for s in sections] == [True, False, False, True]
+    assert "<!--" not in "".join(s.text for s in sections)
+
+
+def test_slice_keeps_only_relevant_sections():
+    sliced = slice_prompt(PROMPT, "Включи свет на кухне")
+
+    assert "Ты ассистент." in sliced
+    assert "тегом command" in sliced
+    assert "лаборатория" not in sliced
+    assert "<<<<<TDW>>>>>" in sliced
+
+
+def test_slice_matches_word_forms_and_short_keywords():
+    assert "тегом command" in slice_prompt(PROMPT, "выключи лампы")
+    assert "лаборатория" in slice_prompt(PROMPT, "кто ты такая")
+
+
+def test_unrelated_utterance_gets_core_only():
+    sliced = slice_prompt(PROMPT, "сколько будет два плюс два")
+
+    assert "тегом command" not in sliced
+    assert "лаборатория" not in sliced
+    assert sliced.startswith("### System")
+
+
+def test_index_is_rebuilt_when_prompt_changes():
+    slice_prompt(PROMPT, "свет")
+    first = prompt_slicing._cached_index
+    slice_prompt(PROMPT, "лампа")
+    assert prompt_slicing._cached_index is first
+
+    changed = PROMPT.replace("лаборатория", "лаборатория Aperture")
+    assert "Aperture" in slice_prompt(changed, "кто ты")
+    assert prompt_slicing._cached_index is not first
+
+
+def test_default_template_slices():
+    with open("templates/default_prompt.md", encoding="utf-8") as f:
+        template = f.read()
+
+    sliced = slice_prompt(template, "который час")
+
+    assert len(sliced) < len(template) / 2
+    assert "<<<<<TDW>>>>>" in sliced
+    assert "room_light" in slice_prompt(template, "включи свет в зале")
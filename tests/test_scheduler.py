@@ -0,0 +1,183 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from src import commands
+from src.scheduler import CommandScheduler, parse_when, split_schedule
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+        self.fired = threading.Event()
+
+    def __call__(self, command, source_device):
+        self.calls.append((command, source_device))
+        self.fired.set()
+
+
+@pytest.fixture
+def make_scheduler(tmp_path):
+    schedulers = []
+
+    def make(dispatch, max_lateness=600.0):
+        scheduler = CommandScheduler(str(tmp_path / "scheduler.db"), dispatch, max_lateness)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+def test_split_schedule():
+    assert split_schedule("room_light:off@+10m") == ("room_light:off", "+10m")
+    assert split_schedule("room_ac:off @ 22:30") == ("room_ac:off", "22:30")
+    assert split_schedule("room_light@CANCEL") == ("room_light", "cancel")
+    assert split_schedule("room_light:on") == ("room_light:on", None)
+
+
+def test_parse_when_relative_and_clock():
+    now = datetime(2024, 5, 1, 21, 0, 0)
+    assert parse_when("+10m", now) == now.timestamp() + 600
+    assert parse_when("+1h30m", now) == now.timestamp() + 5400
+    assert parse_when("+45s", now) == now.timestamp() + 45
+    assert parse_when("22:30", now) == datetime(2024, 5, 1, 22, 30).timestamp()
+    # A time already past today means tomorrow.
+    assert parse_when("07:00", now) == datetime(2024, 5, 2, 7, 0).timestamp()
+
+
+@pytest.mark.parametrize("when", ["+0m", "+25h", "soon", "25:00", "+"])
+def test_parse_when_rejects_invalid(when):
+    with pytest.raises(ValueError):
+        parse_when(when)
+
+
+def test_job_fires_in_due_order(make_scheduler):
+    recorder = Recorder()
+    scheduler = make_scheduler(recorder)
+    now = time.time()
+    scheduler.schedule({"device_id": "b", "value": "off"}, now + 0.1, "kitchen")
+    scheduler.schedule({"device_id": "a", "value": "on"}, now + 0.05)
+
+    deadline = time.monotonic() + 2
+    while len(recorder.calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert recorder.calls == [
+        ({"device_id": "a", "value": "on"}, None),
+        ({"device_id": "b", "value": "off"}, "kitchen"),
+    ]
+    assert scheduler.pending() == []
+    assert scheduler.snapshot()["dispatched"] == 2
+
+
+def test_schedule_replaces_and_cancel_drops_pending_job(make_scheduler):
+    recorder = Recorder()
+    scheduler = make_scheduler(recorder)
+    scheduler.schedule({"device_id": "lamp", "value": "off"}, time.time() + 60)
+    scheduler.schedule({"device_id": "lamp", "value": "50"}, time.time() + 120)
+
+    pending = scheduler.pending()
+    assert [job["command"]["value"] for job in pending] == ["50"]
+    assert scheduler.snapshot()["replaced"] == 1
+
+    assert scheduler.cancel("lamp") is True
+    assert scheduler.cancel("lamp") is False
+    assert scheduler.pending() == []
+
+
+def test_cancelled_job_id_is_not_reused(make_scheduler):
+    recorder = Recorder()
+    scheduler = make_scheduler(recorder)
+    first = scheduler.schedule({"device_id": "lamp", "value": "off"}, time.time() + 0.2)
+    scheduler.cancel("lamp")
+    second = scheduler.schedule({"device_id": "tv", "value": "off"}, time.time() + 60)
+
+    # The cancelled job's heap entry must not fire the new job early.
+    assert second != first
+    assert not recorder.fired.wait(0.6)
+    assert [job["device_id"] for job in scheduler.pending()] == ["tv"]
+
+
+def test_pending_jobs_survive_restart(make_scheduler):
+    first = make_scheduler(Recorder())
+    first.schedule({"device_id": "lamp", "value": "off"}, time.time() + 0.2)
+    first.stop()
+
+    recorder = Recorder()
+    make_scheduler(recorder).start()
+
+    assert recorder.fired.wait(2)
+    assert recorder.calls == [({"device_id": "lamp", "value": "off"}, None)]
+
+
+def test_job_is_claimed_by_one_worker_only(make_scheduler):
+    setup = make_scheduler(Recorder())
+    setup.schedule({"device_id": "lamp", "value": "off"}, time.time() + 0.2)
+    setup.stop()
+
+    # Two workers load the same table; only one may dispatch the job.
+    calls = []
+    workers = [make_scheduler(lambda command, source: calls.append(command)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    time.sleep(0.6)
+
+    assert calls == [{"device_id": "lamp", "value": "off"}]
+
+
+def test_overdue_job_is_dropped(make_scheduler):
+    recorder = Recorder()
+    scheduler = make_scheduler(recorder, max_lateness=60)
+    scheduler.schedule({"device_id": "lamp", "value": "off"}, time.time() - 3600)
+
+    deadline = time.monotonic() + 2
+    while scheduler.snapshot()["dropped_late"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert recorder.calls == []
+    assert scheduler.pending() == []
+
+
+def test_process_commands_schedules_suffixed_commands(monkeypatch):
+    sent, scheduled, cancelled = [], [], []
+    monkeypatch.setattr(commands, "handle_command", sent.append)
+    monkeypatch.setattr(commands.command_scheduler, "schedule",
+                        lambda command, due, source: scheduled.append((command, due)) or 1)
+    monkeypatch.setattr(commands.command_scheduler, "cancel", cancelled.append)
+
+    result = commands.process_commands_in_content(
+        "<command>room_light:on</command>"
+        "<command>room_light:off@+10m</command>"
+        "<command>room_ac@cancel</command>"
+        "<command>room_ac:off@someday</command>"
+    )
+
+    assert sent == [{"device_id": "room_light", "value": "on"}]
+    assert [command for command, _due in scheduled] == [{"device_id": "room_light", "value": "off"}]
+    assert abs(scheduled[0][1] - (time.time() + 600)) < 5
+    assert cancelled == ["room_ac"]
+    assert result[0] == {"device_id": "room_light", "value": "on"}
+    assert result[1]["at"]
+    assert len(result) == 2
+
+
+def test_tool_call_with_when_is_scheduled(monkeypatch):
+    sent, scheduled = [], []
+    monkeypatch.setattr(commands, "handle_command", sent.append)
+    monkeypatch.setattr(commands.command_scheduler, "schedule",
+                        lambda command, due, source: scheduled.append(command) or 1)
+
+    result = commands.process_tool_calls([{
+        "function": {
+            "name": "control_device",
+            "arguments": '{"device_id": "room_ac", "value": "off", "when": "22:30"}',
+        },
+    }])
+
+    assert sent == []
+    assert scheduled == [{"device_id": "room_ac", "value": "off"}]
+    assert result[0]["at"].endswith("22:30:00")
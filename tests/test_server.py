@@ -0,0 +1,237 @@
+import http.client
+import json
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from src import server
+
+
+@pytest.fixture
+def relay(monkeypatch):
+    monkeypatch.setattr(server, "answer_text", lambda text, device_id=None, enrichment=None: f"echo: {text}")
+    httpd = server.RelayHTTPServer(("127.0.0.1", 0), server.RequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _connect(httpd):
+    return http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=5)
+
+
+def test_keep_alive_reuses_one_connection_across_paths(relay):
+    conn = _connect(relay)
+    conn.request("GET", "/healthz")
+    response = conn.getresponse()
+    assert response.version == 11
+    assert json.loads(response.read()) == {"status": "ok"}
+    sock = conn.sock
+
+    body = json.dumps({"request": {"text": "привет"}})
+    conn.request("POST", "/", body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    assert response.getheader("Content-Length") is not None
+    assert response.read().decode() == "echo: привет"
+    assert response.will_close is False
+
+    # Error branches are framed too, so the connection survives them.
+    conn.request("POST", "/", body=b"{not json")
+    assert conn.getresponse().read().decode().startswith("Ошибка: Invalid JSON")
+    conn.request("POST", "/", body=b"")
+    assert conn.getresponse().read().decode() == "Ошибка: Empty request body"
+    assert conn.sock is sock
+    conn.close()
+
+
+def test_chunked_request_body(relay):
+    conn = _connect(relay)
+    payload = json.dumps({"request": {"text": "чанк"}}).encode()
+    conn.putrequest("POST", "/")
+    conn.putheader("Transfer-Encoding", "chunked")
+    conn.endheaders()
+    for part in (payload[:10], payload[10:]):
+        conn.send(b"%x\r\n%s\r\n" % (len(part), part))
+    conn.send(b"0\r\n\r\n")
+    assert conn.getresponse().read().decode() == "echo: чанк"
+    conn.close()
+
+
+def test_connection_cap_refuses_extra_connections(relay, monkeypatch):
+    monkeypatch.setattr(server.settings, "max_connections", 1)
+    first = _connect(relay)
+    first.request("GET", "/healthz")
+    first.getresponse().read()
+
+    second = _connect(relay)
+    with pytest.raises((ConnectionError, http.client.HTTPException, OSError)):
+        second.request("GET", "/healthz")
+        second.getresponse().read()
+    first.close()
+    second.close()
+
+
+def test_stream_endpoint_sends_chunks(relay, monkeypatch):
+    def fake_stream(text, device_id=None):
+        yield "Первая фраза. "
+        yield f"Вторая про {text}."
+
+    monkeypatch.setattr(server, "stream_answer", fake_stream)
+    conn = _connect(relay)
+    body = json.dumps({"request": {"text": "стрим"}})
+    conn.request("POST", "/stream", body=body)
+    response = conn.getresponse()
+    assert response.getheader("Transfer-Encoding") == "chunked"
+    assert response.read().decode() == "Первая фраза. Вторая про стрим."
+
+    # The connection stays usable after a chunked response.
+    conn.request("GET", "/healthz")
+    assert conn.getresponse().status == 200
+    conn.close()
+
+
+def test_identical_streams_share_one_groq_call(relay, monkeypatch):
+    calls, release = [], threading.Event()
+
+    def fake_groq_stream(text):
+        calls.append(text)
+        yield "Включаю "
+        release.wait(5)
+        yield "свет."
+
+    monkeypatch.setattr(server, "stream_groq_api", fake_groq_stream)
+    monkeypatch.setattr(server, "append_context", lambda *args: None)
+    monkeypatch.setattr(server.settings, "local_skills_enabled", False)
+    server.chat_flight.clear()
+    bodies = []
+
+    def stream_request():
+        conn = _connect(relay)
+        conn.request("POST", "/stream", body=json.dumps({"request": {"text": "включи свет"}}))
+        bodies.append(conn.getresponse().read().decode())
+        conn.close()
+
+    first = threading.Thread(target=stream_request)
+    first.start()
+    deadline = time.monotonic() + 2
+    while not calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    second = threading.Thread(target=stream_request)
+    second.start()
+    time.sleep(0.1)
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert bodies == ["Включаю свет.", "Включаю свет."]
+    assert calls == ["включи свет"]
+    server.chat_flight.clear()
+
+
+def test_stream_failure_after_headers_closes_connection(relay, monkeypatch):
+    def failing_stream(text, device_id=None):
+        yield "Первая фраза. "
+        raise TimeoutError("write timed out")
+
+    monkeypatch.setattr(server, "stream_answer", failing_stream)
+    body = json.dumps({"request": {"text": "стрим"}}).encode()
+    sock = socket.create_connection(relay.server_address, timeout=5)
+    sock.sendall(b"POST /stream HTTP/1.1\r\nHost: relay\r\nContent-Length: %d\r\n\r\n%s"
+                 % (len(body), body))
+    received = b""
+    while chunk := sock.recv(4096):
+        received += chunk
+    sock.close()
+
+    # The server hangs up after the partial body; no error response follows it.
+    assert received.count(b"HTTP/1.1") == 1
+    assert "Первая фраза. ".encode() in received
+    assert not received.endswith(b"0\r\n\r\n")
+
+
+def test_history_endpoint_reports_database_errors(relay, monkeypatch):
+    class BrokenHistory:
+        def query(self, **kwargs):
+            raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(server, "history", BrokenHistory())
+    conn = _connect(relay)
+    conn.request("GET", "/history")
+    response = conn.getresponse()
+    assert response.status == 500
+    assert "database is locked" in json.loads(response.read())["error"]
+    conn.close()
+
+
+def test_debug_endpoints_are_guarded(relay, monkeypatch):
+    conn = _connect(relay)
+    monkeypatch.setattr(server.settings, "debug_token", "")
+    conn.request("GET", "/debug/profile?seconds=0")
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 404
+
+    monkeypatch.setattr(server.settings, "debug_token", "s3cret")
+    conn.request("GET", "/debug/profile?seconds=0", headers={"X-Debug-Token": "wrong"})
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 403
+
+    conn.request("GET", "/debug/profile?seconds=0.05&format=top", headers={"X-Debug-Token": "s3cret"})
+    response = conn.getresponse()
+    assert response.status == 200
+    assert "function" in response.read().decode()
+
+    conn.request("GET", "/debug/memory?action=bogus", headers={"X-Debug-Token": "s3cret"})
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 400
+
+    # A NaN duration must not loop forever holding the profiler lock.
+    conn.request("GET", "/debug/profile?seconds=nan", headers={"X-Debug-Token": "s3cret"})
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 400
+    conn.close()
+
+
+def test_batch_answers_items_concurrently_in_order(relay, monkeypatch):
+    gathered = []
+    monkeypatch.setattr(server, "gather_enrichment", lambda: gathered.append(1) or "ctx\n")
+    barrier = threading.Barrier(3, timeout=5)
+
+    def fake_answer(text, device_id=None, enrichment=None):
+        barrier.wait()  # all answered items must be in flight at once
+        if text == "сломай":
+            raise RuntimeError("boom")
+        if text == "лимит":
+            return server.RATE_LIMITED_REPLY
+        return f"{device_id}: {text} ({enrichment.strip()})"
+
+    monkeypatch.setattr(server, "answer_text", fake_answer)
+    conn = _connect(relay)
+    body = json.dumps([
+        {"request": {"text": "доброе утро"}, "device": {"id": "kitchen"}},
+        {"request": {"text": "сломай"}},
+        {"request": {}},
+        {"request": {"text": "лимит"}},
+    ])
+    conn.request("POST", "/batch", body=body)
+    response = conn.getresponse()
+    assert response.status == 200
+    results = json.loads(response.read())["results"]
+
+    assert results[0] == {"status": "ok", "text": "kitchen: доброе утро (ctx)"}
+    assert results[1] == {"status": "error", "error": "boom"}
+    assert results[2]["status"] == "invalid"
+    assert results[3]["status"] == "rate_limited"
+    assert gathered == [1]
+
+    conn.request("POST", "/batch", body=b"{}")
+    assert conn.getresponse().status == 400
+    conn.close()
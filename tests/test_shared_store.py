@@ -0,0 +1,41 @@
+import multiprocessing
+import time
+
+from src.shared_store import SharedStore
+from src.singleflight import SingleFlight
+
+
+def test_set_get_and_expiry(tmp_path):
+    store = SharedStore(str(tmp_path / "state.db"))
+    store.set("k", {"a": 1}, ttl=0.1)
+    assert store.get("k") == {"a": 1}
+    time.sleep(0.15)
+    assert store.get("k", "gone") == "gone"
+
+
+def _write_from_child(path):
+    SharedStore(path).set("from_child", "hello", ttl=60)
+
+
+def test_values_are_shared_across_processes(tmp_path):
+    path = str(tmp_path / "state.db")
+    process = multiprocessing.get_context("fork").Process(target=_write_from_child, args=(path,))
+    process.start()
+    process.join(10)
+    assert SharedStore(path).get("from_child") == "hello"
+
+
+def test_singleflight_reuses_result_from_shared_store(tmp_path):
+    path = str(tmp_path / "state.db")
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return "answer"
+
+    # Two SingleFlight instances stand in for two worker processes.
+    first = SingleFlight(10, store=SharedStore(path), namespace="chat")
+    second = SingleFlight(10, store=SharedStore(path), namespace="chat")
+    assert first.do("k", fn) == ("answer", False)
+    assert second.do("k", fn) == ("answer", True)
+    assert len(calls) == 1
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from src.singleflight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight(window=0)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+    leader.start()
+    started.wait(2)
+    follower = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(2)
+    follower.join(2)
+
+    assert len(calls) == 1
+    assert sorted(results) == [("answer", False), ("answer", True)]
+
+
+def test_result_is_reused_within_window_only():
+    flight = SingleFlight(window=0.1)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return len(calls)
+
+    assert flight.do("k", fn) == (1, False)
+    assert flight.do("k", fn) == (1, True)
+    assert flight.do("other", fn) == (2, False)
+    time.sleep(0.15)
+    assert flight.do("k", fn) == (3, False)
+
+
+def test_keep_false_is_not_reused_by_later_arrivals():
+    flight = SingleFlight(window=10)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return "Ошибка: boom"
+
+    flight.do("k", fn, keep=lambda r: not r.startswith("Ошибка"))
+    flight.do("k", fn, keep=lambda r: not r.startswith("Ошибка"))
+    assert len(calls) == 2
+
+
+def test_exception_is_raised_and_not_cached():
+    flight = SingleFlight(window=10)
+
+    def boom():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flight.do("k", boom)
+    assert flight.do("k", lambda: "ok") == ("ok", False)
+
+
+def test_stream_shares_the_leaders_pieces():
+    flight = SingleFlight(window=1.0)
+    calls = []
+
+    def pieces():
+        calls.append(1)
+        yield "Включаю "
+        yield "свет."
+
+    leader = flight.stream("k", pieces)
+    assert next(leader) == "Включаю "
+    follower_result = []
+    follower = threading.Thread(target=lambda: follower_result.append(list(flight.stream("k", pieces))))
+    follower.start()
+    assert list(leader) == ["свет."]
+    follower.join(2)
+
+    assert follower_result == [["Включаю свет."]]
+    assert len(calls) == 1
+
+
+def test_stream_follower_takes_over_an_abandoned_leader():
+    flight = SingleFlight(window=1.0)
+    calls = []
+
+    def pieces():
+        calls.append(1)
+        yield "раз "
+        yield "два"
+
+    leader = flight.stream("k", pieces)
+    next(leader)
+    follower_result = []
+    follower = threading.Thread(target=lambda: follower_result.append(list(flight.stream("k", pieces))))
+    follower.start()
+    time.sleep(0.05)
+    leader.close()  # the leader's client hung up mid-stream
+    follower.join(2)
+
+    assert follower_result == [["раз ", "два"]]
+    assert len(calls) == 2
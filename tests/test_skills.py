@@ -0,0 +1,61 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from src import skills
+from src.prompt import prompt_providers
+from src.skills import answer_locally, number_words, plural, day_ordinal, HOUR_FORMS
+
+
+@pytest.fixture(autouse=True)
+def first_template(monkeypatch):
+    monkeypatch.setattr(skills.random, "choice", lambda options: options[0])
+
+
+@pytest.fixture
+def weather(monkeypatch):
+    provider = prompt_providers.get("weather")
+    monkeypatch.setattr(provider, "last_value", "Погода в Moscow: -21 градусов, облачно, ветер 2 метров в секунду.")
+    monkeypatch.setattr(provider, "updated_at", time.monotonic())
+    return provider
+
+
+def test_number_words_and_agreement():
+    assert number_words(21) == "двадцать один"
+    assert number_words(22, feminine=True) == "двадцать две"
+    assert number_words(-15) == "минус пятнадцать"
+    assert number_words(0) == "ноль"
+    assert [plural(n, HOUR_FORMS) for n in (1, 3, 5, 11, 21, 24)] == [
+        "час", "часа", "часов", "часов", "час", "часа",
+    ]
+    assert day_ordinal(23) == "двадцать третье"
+    assert day_ordinal(30) == "тридцатое"
+
+
+def test_time_question():
+    reply = answer_locally("Который час?", now=datetime(2025, 9, 18, 21, 1))
+    assert reply.startswith("Сейчас двадцать один час одна минута.")
+
+
+def test_date_question():
+    reply = answer_locally("какое сегодня число", now=datetime(2025, 9, 18, 14, 5))
+    assert reply.startswith("Сегодня четверг, восемнадцатое сентября.")
+
+
+def test_weather_question_uses_last_value(weather):
+    reply = answer_locally("Какая погода?")
+    assert reply.startswith("На улице минус двадцать один градус, облачно, ветер два метра в секунду.")
+
+
+def test_stale_or_missing_weather_falls_back(monkeypatch, weather):
+    monkeypatch.setattr(weather, "updated_at", time.monotonic() - skills.WEATHER_MAX_AGE_SECONDS - 1)
+    assert answer_locally("какая погода") is None
+    monkeypatch.setattr(weather, "last_value", None)
+    assert answer_locally("какая погода") is None
+
+
+def test_other_questions_fall_back():
+    assert answer_locally("какая погода будет завтра в Париже") is None
+    assert answer_locally("включи свет") is None
+    assert answer_locally("сколько времени варить яйцо") is None
@@ -1,3 +1,6 @@
+import threading
+
+import pytest
 import requests
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
@@ -6,10 +9,25 @@ from src.settings import settings
 
 
 class FakeResponse:
-    def __init__(self, status_code, content=b"", text=""):
+    def __init__(self, status_code, content=b"", text="", headers=None):
         self.status_code = status_code
         self.content = content
         self.text = text
+        self.headers = headers or {}
+
+
+@pytest.fixture(autouse=True)
+def _fast_retries(monkeypatch):
+    # Keep retry backoff from slowing the suite down.
+    monkeypatch.setattr(settings, "stt_retry_base_delay", 0.0)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_dedup_window():
+    # Every test sends the same audio; do not let one test reuse another's result.
+    stt_client.stt_flight.clear()
+    yield
+    stt_client.stt_flight.clear()
 
 
 def _build_multipart(with_file=True):
@@ -47,7 +65,7 @@ def test_transcribe_audio_success(monkeypatch):
     def fake_post(*args, **kwargs):
         return FakeResponse(200, content=b'{"text":"\xd0\xbf\xd1\x80\xd0\xb8\xd0\xb2\xd0\xb5\xd1\x82"}')
 
-    monkeypatch.setattr(stt_client.requests, "post", fake_post)
+    monkeypatch.setattr(stt_client.get_session(), "post", fake_post)
 
     status, payload = stt_client.transcribe_audio(body, content_type)
     assert status == 200
@@ -64,7 +82,7 @@ def test_transcribe_audio_forces_params_and_auth(monkeypatch):
         captured.update(kwargs)
         return FakeResponse(200, content=b'{"text":"ok"}')
 
-    monkeypatch.setattr(stt_client.requests, "post", fake_post)
+    monkeypatch.setattr(stt_client.get_session(), "post", fake_post)
 
     status, payload = stt_client.transcribe_audio(body, content_type)
     assert status == 200
@@ -91,7 +109,7 @@ def test_transcribe_audio_request_exception(monkeypatch):
     def fake_post(*args, **kwargs):
         raise requests.RequestException("boom")
 
-    monkeypatch.setattr(stt_client.requests, "post", fake_post)
+    monkeypatch.setattr(stt_client.get_session(), "post", fake_post)
 
     status, payload = stt_client.transcribe_audio(body, content_type)
     assert status == 200
@@ -104,8 +122,111 @@ def test_transcribe_audio_groq_non_200(monkeypatch):
     def fake_post(*args, **kwargs):
         return FakeResponse(400, content=b"", text="bad")
 
-    monkeypatch.setattr(stt_client.requests, "post", fake_post)
+    monkeypatch.setattr(stt_client.get_session(), "post", fake_post)
 
     status, payload = stt_client.transcribe_audio(body, content_type)
     assert status == 200
     assert payload == b'{"text": ""}'
+
+
+def test_transcribe_audio_deduplicates_identical_audio(monkeypatch):
+    body, content_type = _build_multipart(with_file=True)
+    calls = []
+
+    def fake_post(*args, **kwargs):
+        calls.append(1)
+        return FakeResponse(200, content=b'{"text":"ok"}')
+
+    monkeypatch.setattr(stt_client.get_session(), "post", fake_post)
+
+    assert stt_client.transcribe_audio(body, content_type) == (200, b'{"text":"ok"}')
+    assert stt_client.transcribe_audio(body, content_type) == (200, b'{"text":"ok"}')
+    assert len(calls) == 1
+
+
+def test_transcribe_audio_retries_server_errors(monkeypatch):
+    body, content_type = _build_multipart(with_file=True)
+    responses = [
+        FakeResponse(503, text="unavailable"),
+        FakeResponse(429, text="slow down", headers={"retry-after": "0"}),
+        FakeResponse(200, content=b'{"text":"ok"}'),
+    ]
+
+    monkeypatch.setattr(stt_client.get_session(), "post", lambda *a, **kw: responses.pop(0))
+
+    assert stt_client.transcribe_audio(body, content_type) == (200, b'{"text":"ok"}')
+    assert responses == []
+
+
+def test_transcribe_audio_retries_exceptions_up_to_limit(monkeypatch):
+    body, content_type = _build_multipart(with_file=True)
+    calls = []
+
+    def fake_post(*args, **kwargs):
+        calls.append(1)
+        raise requests.ConnectionError("reset")
+
+    monkeypatch.setattr(stt_client.get_session(), "post", fake_post)
+    monkeypatch.setattr(settings, "stt_retry_attempts", 2)
+
+    assert stt_client.transcribe_audio(body, content_type) == (200, b'{"text": ""}')
+    assert len(calls) == 2
+
+
+def test_transcribe_audio_does_not_retry_client_errors(monkeypatch):
+    body, content_type = _build_multipart(with_file=True)
+    calls = []
+
+    def fake_post(*args, **kwargs):
+        calls.append(1)
+        return FakeResponse(400, text="bad audio")
+
+    monkeypatch.setattr(stt_client.get_session(), "post", fake_post)
+
+    assert stt_client.transcribe_audio(body, content_type) == (200, b'{"text": ""}')
+    assert len(calls) == 1
+
+
+def test_transcribe_audio_stops_when_budget_is_spent(monkeypatch):
+    body, content_type = _build_multipart(with_file=True)
+    calls = []
+
+    def fake_post(*args, **kwargs):
+        calls.append(kwargs["timeout"])
+        return FakeResponse(500, text="boom")
+
+    monkeypatch.setattr(stt_client.get_session(), "post", fake_post)
+    monkeypatch.setattr(settings, "stt_retry_budget_seconds", 0.5)
+
+    assert stt_client.transcribe_audio(body, content_type) == (200, b'{"text": ""}')
+    # Less than a second of budget is left for a second attempt.
+    assert len(calls) == 1
+    assert calls[0] <= 0.5
+
+
+def test_transcribe_audio_hedges_to_second_model(monkeypatch):
+    body, content_type = _build_multipart(with_file=True)
+    release = threading.Event()
+    models = []
+
+    def fake_post(*args, **kwargs):
+        model = kwargs["data"]["model"]
+        models.append(model)
+        if model == settings.groq_stt_model:
+            release.wait(5)
+            return FakeResponse(200, content=b'{"text":"slow"}')
+        return FakeResponse(200, content=b'{"text":"fast"}')
+
+    monkeypatch.setattr(stt_client.get_session(), "post", fake_post)
+    monkeypatch.setattr(settings, "groq_stt_hedge_model", "whisper-large-v3")
+    monkeypatch.setattr(stt_client._hedger, "initial_delay", 0.01)
+    try:
+        result = stt_client.transcribe_audio(body, content_type)
+    finally:
+        release.set()
+
+    assert result == (200, b'{"text":"fast"}')
+    assert models == [settings.groq_stt_model, "whisper-large-v3"]
+    snapshot = stt_client.attempt_stats.snapshot()
+    assert snapshot["models"]["whisper-large-v3"]["outcomes"]["ok"] >= 1
+    assert snapshot["hedging"]["backup_wins"] >= 1
@@ -1,6 +1,8 @@
 import pytest
 
-from src.text import extract_request_text, processing_response
+from src.text import (
+    extract_device_id, extract_request_text, normalize_request_text, processing_response, StreamCleaner,
+)
 
 
 def test_extract_request_text_valid():
@@ -39,3 +41,30 @@ def test_processing_response_replacements():
 
 def test_processing_response_trims():
     assert processing_response("   spaced   ") == "spaced"
+
+
+def test_normalize_request_text():
+    assert normalize_request_text("  Включи,   СВЕТ! ") == "включи свет"
+
+
+def test_extract_device_id():
+    assert extract_device_id({"device": {"id": "sat1"}}) == "sat1"
+    assert extract_device_id({"request": {"text": "x"}}) is None
+
+
+def test_stream_cleaner_matches_processing_response_across_chunk_boundaries():
+    reply = "  <think>хм</think>Я знаю, что делать. <command>room_light:on</command>Свет включен на 50%."
+    cleaner = StreamCleaner()
+    pieces = [cleaner.feed(reply[i:i + 3]) for i in range(0, len(reply), 3)]
+    pieces.append(cleaner.flush())
+
+    assert "".join(pieces).strip() == processing_response(reply)
+    # Words are released before the reply ends.
+    assert any(pieces[:-1])
+
+
+def test_stream_cleaner_drops_unterminated_block():
+    cleaner = StreamCleaner()
+    assert cleaner.feed("Готово. <comm") == "Готово. "
+    assert cleaner.feed("and>room_ac:off") == ""
+    assert cleaner.flush() == ""
@@ -0,0 +1,37 @@
+from src import tiers
+from src.settings import settings
+
+
+def test_classify_short_command_is_fast():
+    tier = tiers.classify("включи свет на кухне")
+    assert tier.name == tiers.FAST
+    assert tier.reasoning_effort == settings.fast_tier_reasoning_effort
+    assert tier.max_tokens == settings.fast_tier_max_tokens
+
+
+def test_classify_open_question_is_default():
+    tier = tiers.classify("расскажи, почему небо голубое")
+    assert tier.name == tiers.DEFAULT
+    assert tier.reasoning_effort == settings.default_tier_reasoning_effort
+
+
+def test_classify_long_command_is_default():
+    text = "включи пожалуйста свет в зале и на кухне и еще в коридоре"
+    assert tiers.classify(text).name == tiers.DEFAULT
+
+
+def test_classify_one_word_is_fast():
+    assert tiers.classify("спасибо").name == tiers.FAST
+
+
+def test_empty_model_falls_back_to_groq_model(monkeypatch):
+    monkeypatch.setattr(settings, "fast_tier_model", "")
+    assert tiers.get_tier(tiers.FAST).model == settings.groq_model
+    monkeypatch.setattr(settings, "fast_tier_model", "fast-model")
+    assert tiers.get_tier(tiers.FAST).model == "fast-model"
+
+
+def test_register_rule_first_takes_priority(monkeypatch):
+    monkeypatch.setattr(tiers, "_rules", list(tiers._rules))
+    tiers.register_rule(lambda text, words: tiers.DEFAULT, first=True)
+    assert tiers.classify("свет").name == tiers.DEFAULT
@@ -0,0 +1,61 @@
+from src.usage import UsageStats, RollingCounters, FIELDS, OTHER, parse_usage
+
+USAGE = {
+    "prompt_tokens": 1200,
+    "completion_tokens": 300,
+    "total_tokens": 1500,
+    "completion_tokens_details": {"reasoning_tokens": 200},
+    "queue_time": 0.5,
+    "prompt_time": 0.1,
+    "completion_time": 0.4,
+    "total_time": 1.0,
+}
+
+
+def test_parse_usage():
+    values = dict(zip(FIELDS, parse_usage(USAGE)))
+    assert values["requests"] == 1
+    assert values["reasoning_tokens"] == 200
+    assert values["queue_time"] == 0.5
+    assert parse_usage(None) is None
+    assert parse_usage({"prompt_tokens": "many"}) is None
+    # Missing details (non-reasoning models) count as zero.
+    assert dict(zip(FIELDS, parse_usage({"prompt_tokens": 10})))["reasoning_tokens"] == 0
+
+
+def test_aggregates_per_dimension_with_shares():
+    usage = UsageStats(3600)
+    usage.record(USAGE, "fast", "model-a", "kitchen", now=1000.0)
+    usage.record(USAGE, "default", "model-a", None, now=1001.0)
+
+    snapshot = usage.snapshot(now=1002.0)
+    model = snapshot["model"]["model-a"]
+    assert model["requests"] == 2
+    assert model["prompt_tokens"] == 2400
+    assert model["reasoning_share"] == round(200 / 300, 4)
+    assert model["queue_seconds"] == 1.0
+    assert model["compute_seconds"] == 1.0
+    assert model["queue_share"] == 0.5
+    assert model["avg_prompt_tokens"] == 1200
+    assert snapshot["tier"]["fast"]["requests"] == 1
+    assert set(snapshot["device"]) == {"kitchen", "unknown"}
+
+
+def test_old_buckets_fall_out_of_the_window():
+    counters = RollingCounters(bucket_seconds=60, buckets=60)
+    counters.add(parse_usage(USAGE), now=0.0)
+    counters.add(parse_usage(USAGE), now=1800.0)
+    assert counters.totals(now=1800.0)[0] == 2
+    assert counters.totals(now=3700.0)[0] == 1
+    # The ring slot is reused once its bucket has expired.
+    counters.add(parse_usage(USAGE), now=3600.0 * 2)
+    assert counters.totals(now=3600.0 * 2)[0] == 1
+
+
+def test_extra_keys_share_other():
+    usage = UsageStats(3600, max_keys=2)
+    for device in ("a", "b", "c", "d"):
+        usage.record(USAGE, "fast", "model-a", device, now=10.0)
+    devices = usage.snapshot(now=10.0)["device"]
+    assert set(devices) == {"a", "b", OTHER}
+    assert devices[OTHER]["requests"] == 2
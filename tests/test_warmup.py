@@ -0,0 +1,29 @@
+from src import warmup
+
+
+def test_run_warmup_records_steps_and_marks_ready():
+    warmup._reset()
+    calls = []
+
+    def ok_step():
+        calls.append("ok")
+
+    def failing_step():
+        raise RuntimeError("cold")
+
+    assert warmup.is_ready() is False
+    warmup.run_warmup(steps=(("first", ok_step), ("second", failing_step)))
+
+    report = warmup.readiness_report()
+    assert calls == ["ok"]
+    assert report["ready"] is True
+    assert report["steps"]["first"]["ok"] is True
+    assert report["steps"]["first"]["seconds"] >= 0
+    assert report["steps"]["second"]["ok"] is False
+    assert report["steps"]["second"]["error"] == "cold"
+    warmup._reset()
+
+
+def test_readiness_report_before_warmup():
+    warmup._reset()
+    assert warmup.readiness_report() == {"ready": False, "steps": {}}
@@ -21,7 +21,7 @@ def test_get_weather_summary_ok(monkeypatch):
     def fake_get(*args, **kwargs):
         return FakeResponse(200, payload)
 
-    monkeypatch.setattr(weather.requests, "get", fake_get)
+    monkeypatch.setattr(weather.get_session(), "get", fake_get)
 
     result = weather.get_weather_summary("Moscow", "key")
     assert "12 градусов" in result
@@ -33,7 +33,7 @@ def test_get_weather_summary_error(monkeypatch):
     def fake_get(*args, **kwargs):
         return FakeResponse(500, text="server error")
 
-    monkeypatch.setattr(weather.requests, "get", fake_get)
+    monkeypatch.setattr(weather.get_session(), "get", fake_get)
 
     assert weather.get_weather_summary("Moscow", "key") is None
 
@@ -50,7 +50,7 @@ def test_get_weather_summary_passes_proxy(monkeypatch):
         captured["proxies"] = kwargs.get("proxies")
         return FakeResponse(200, payload)
 
-    monkeypatch.setattr(weather.requests, "get", fake_get)
+    monkeypatch.setattr(weather.get_session(), "get", fake_get)
 
     weather.get_weather_summary("Moscow", "key", "socks5h://10.0.0.1:1080")
     assert captured["proxies"] == {
@@ -71,7 +71,7 @@ def test_get_weather_summary_no_proxy(monkeypatch):
         captured["proxies"] = kwargs.get("proxies")
         return FakeResponse(200, payload)
 
-    monkeypatch.setattr(weather.requests, "get", fake_get)
+    monkeypatch.setattr(weather.get_session(), "get", fake_get)
 
     weather.get_weather_summary("Moscow", "key")
     assert captured["proxies"] is None